@@ -1,40 +1,7 @@
 def to_ohlcv_df(raw):
-    import pandas as pd
-    if isinstance(raw, list) and raw and isinstance(raw[0], (list, tuple)) and len(raw[0]) >= 6:
-        df = pd.DataFrame(raw, columns=["timestamp","open","high","low","close","volume"])
-    elif isinstance(raw, list) and raw and isinstance(raw[0], dict):
-        df = pd.DataFrame(raw)
-        rename_map = {
-            "time":"timestamp","ts":"timestamp",
-            "o":"open","h":"high","l":"low","c":"close","v":"volume"
-        }
-        df = df.rename(columns=rename_map)
-    elif 'pandas' in str(type(raw)):
-        df = raw.copy()
-    else:
-        raise ValueError(f"Unsupported OHLCV format: {type(raw)} -> cannot normalize")
-    for col in ["timestamp","open","high","low","close","volume"]:
-        if col not in df.columns:
-            df[col] = None
-    df = df.sort_values("timestamp").drop_duplicates("timestamp")
-    for col in ["open","high","low","close","volume"]:
-        df[col] = pd.to_numeric(df[col], errors="coerce")
-    df = df.dropna(subset=["open","high","low","close"]).reset_index(drop=True)
-    try:
-        df["timestamp"] = pd.to_datetime(df["timestamp"], unit="ms", utc=True, errors="coerce").fillna(
-            pd.to_datetime(df["timestamp"], utc=True, errors="coerce")
-        )
-    except Exception:
-        pass
-    return df
-
-def assert_ohlcv_schema(df):
-    need = {"timestamp","open","high","low","close","volume"}
-    if 'pandas' not in str(type(df)):
-        raise TypeError(f"OHLCV must be DataFrame, got {type(df)}")
-    miss = need - set(df.columns)
-    if miss:
-        raise KeyError(f"OHLCV missing columns: {sorted(miss)}")
+    # 统一走 ohlcv.canonical_ohlcv：int64 毫秒索引 + float64 只读列；已是 canonical 时原样返回
+    from ohlcv import ensure_canonical
+    return ensure_canonical(raw)
 #!/usr/bin/env python3
 """
 熬鹰计划 API服务器
@@ -55,8 +22,20 @@ from collections import deque
 
 # 导入真实策略算法（强制要求成功）
 try:
-    from strategies import STRATEGY_REGISTRY, vegas_tunnel, chan_simplified, macd, set_relax_mode
+    from strategies import STRATEGY_REGISTRY, SERIES_REGISTRY, series_signal, vegas_tunnel, chan_simplified, macd, set_relax_mode
+    from strategies import evaluate_gates, gate_rejection
+    from strategies import STRICT, RELAXED, current_config, evaluate, evaluate_variants
     from strategies_top15 import REGISTRY as TOP15_REGISTRY
+    from strategies_batch import last_bar_signals, recent_bar_signals, tail_columns
+    from planner import plan as plan_strategies
+    from indicator_cache import IndicatorCache, frame_id, indicator_scope
+    from strategy_budget import StrategyBudget
+    from strategy_reload import reload_strategies
+    from correlation import CorrelationBook, correlated_pairs
+    from regime import RegimeEngine
+    from preview import PreviewBook
+    from scheduler import BarCloseScheduler, SnapshotStore, bar_open_ms
+    from ohlcv import canonical_ohlcv, bar_time, merge_ohlcv
     print("✅ All strategy modules loaded successfully")
 except Exception as e:
     print(f"❌ Strategy module load failed: {e}")
@@ -91,6 +70,18 @@ def _cache_get_corr(key: str, ttl_sec: int = 86400):
 def _cache_set_corr(key: str, payload: dict):
     _corr_cache[key] = { 'ts': time.time(), 'payload': payload }
 
+# -------------------- Indicator cache（按 symbol/tf/末根K线 共享指标） --------------------
+INDICATOR_CACHE = IndicatorCache(max_entries=8192)
+
+# -------------------- 币种间滚动相关（增量更新，按末根K线缓存） --------------------
+CORRELATION_BOOK = CorrelationBook()
+
+# -------------------- 未收盘K线盘中试算（pending 信号，流式指标 fork 后试算） --------------------
+PREVIEW_BOOK = PreviewBook()
+
+# -------------------- 信号快照（K线收盘后后台预计算一次，/api/signals 直接返回） --------------------
+SIGNAL_SNAPSHOTS = SnapshotStore()
+
 # 配置数据
 try:
     with open('config.json', 'r', encoding='utf-8') as f:
@@ -103,6 +94,21 @@ try:
     # 是否使用真实交易所数据（缺省也强制为 true）
     USE_REAL_BINANCE_DATA = bool(config.get('use_real_data', True))
     RELAX_MODE = bool(config.get('relax', False))
+    # 紧凑指标缓存（float32 历史 + float64 末尾两根），小内存部署时打开
+    INDICATOR_CACHE.compact = bool(config.get('compact_indicators', False))
+    # 信号计算中每个策略的时间预算（毫秒，<=0 不限时）；超时策略 skip 或 reuse 上一根结果
+    STRATEGY_BUDGET = StrategyBudget(
+        budget_ms=config.get('strategy_budget_ms', 1000),
+        overrides=config.get('strategy_budgets'),
+        on_timeout=config.get('strategy_timeout_policy', 'skip'))
+    # 市场形态分类（趋势/震荡）；regime_filter 打开时信号计算只跑适用于当前形态的策略
+    REGIME_ENGINE = RegimeEngine(INDICATOR_CACHE, rules=config.get('regime_rules'))
+    REGIME_FILTER = bool(config.get('regime_filter', False))
+    # 盘中试算：每次刷新行情把实时价并进未收盘K线，给出 pending 信号（不影响已收盘信号）
+    INTRABAR_PREVIEW = bool(config.get('intrabar_preview', False))
+    # 信号预计算：4h K线收盘 + signal_settle_sec 秒后刷新K线并算一次信号，接口返回快照（关闭则每次请求现算）
+    SIGNAL_SCHEDULER = bool(config.get('signal_scheduler', True))
+    SIGNAL_SETTLE_SEC = float(config.get('signal_settle_sec', 5))
 except Exception as e:
     print(f"❌ Failed to load config.json: {e}")
     # 缺省也强制真实模式，但若没有配置符号/策略，退出
@@ -153,6 +159,9 @@ class MockDataGenerator:
         self.trends = {}
         self.last_update = time.time()
         self.price_history = {}  # 存储价格历史用于策略计算
+        self.forming = {}  # 正在形成的K线（未收盘K线并入实时价）：symbol -> bar dict
+        self.pending = {}  # 盘中试算结果：symbol -> {策略名: {...}}
+        self.pending_at = None
         self.binance_exchange = None
 
         # 初始化交易所（强制真实模式）
@@ -213,7 +222,7 @@ class MockDataGenerator:
             self.prices[symbol] = base_price
             self.trends[symbol] = random.choice([1, -1])
             # 初始化历史价格（用于策略计算）
-            self.price_history[symbol] = self._fetch_real_history(symbol)
+            self.price_history[symbol] = self._fetch_real_history(symbol, limit=self._history_limit())
 
         # 应用放松模式（可选）
         try:
@@ -223,6 +232,14 @@ class MockDataGenerator:
         except Exception:
             pass
 
+    @staticmethod
+    def _history_limit(default=300):
+        """拉取K线数：不少于原来的 300 根；启用的策略声明需要更长历史时按 planner 加长（+1 为未收盘K线）"""
+        try:
+            return max(default, plan_strategies(STRATEGIES)["history"] + 1)
+        except Exception:
+            return default
+
     def _fetch_real_history(self, symbol, timeframe='4h', limit=300):
         """从Binance获取真实历史数据"""
         try:
@@ -232,17 +249,8 @@ class MockDataGenerator:
             print(f"Fetching real history for {symbol}...")
             ohlcv = self.binance_exchange.fetch_ohlcv(symbol, timeframe, limit=limit)
 
-            history = []
-            for candle in ohlcv:
-                timestamp, open_price, high, low, close, volume = candle
-                history.append({
-                    'ts': datetime.fromtimestamp(timestamp / 1000),
-                    'open': open_price,
-                    'high': high,
-                    'low': low,
-                    'close': close,
-                    'volume': volume
-                })
+            # 入口处规范化一次（见 ohlcv.py），之后各处按引用使用
+            history = canonical_ohlcv(ohlcv)
 
             print(f"Fetched {len(history)} candles for {symbol}")
             return history
@@ -251,6 +259,29 @@ class MockDataGenerator:
             print(f"❌ Failed to fetch {symbol}: {e}")
             raise
 
+    def refresh_history(self, timeframe='4h', bar_ms=None, recent=10):
+        """
+        K线收盘后刷新各币种历史：只拉最后 recent 根接到已有历史末尾（未收盘K线以新数据为准），
+        两段接不上时整段重拉。bar_ms 为应已收盘的那根K线开盘时间 → 返回还没拿到这根K线的币种
+        """
+        limit = self._history_limit()
+        lagging = []
+        for symbol in SYMBOLS:
+            try:
+                old = self.price_history.get(symbol)
+                new = canonical_ohlcv(self.binance_exchange.fetch_ohlcv(symbol, timeframe, limit=recent))
+                merged = merge_ohlcv(old if old is not None else [], new, keep=limit)
+                if merged is None:
+                    merged = self._fetch_real_history(symbol, timeframe, limit=limit)
+                self.price_history[symbol] = merged
+                # 最后一根是正在形成的K线，其前一根才是已收盘的
+                if bar_ms is not None and (len(merged) < 2 or int(merged.index[-2]) < bar_ms):
+                    lagging.append(symbol)
+            except Exception as e:
+                print(f"刷新 {symbol} K线失败: {e}")
+                lagging.append(symbol)
+        return lagging
+
     def _update_real_prices(self):
         """更新真实价格数据"""
         if not self.binance_exchange:
@@ -262,9 +293,72 @@ class MockDataGenerator:
             for symbol in SYMBOLS[:8]:
                 if symbol in tickers:
                     self.prices[symbol] = float(tickers[symbol]['last'])
+                    if INTRABAR_PREVIEW:
+                        self._fold_tick(symbol, self.prices[symbol])
         except Exception as e:
             print(f"❌ Failed to update real-time prices: {e}")
             raise
+        if INTRABAR_PREVIEW:
+            try:
+                self._preview_tick()
+            except Exception as e:
+                print(f"盘中试算失败: {e}")
+
+    def _fold_tick(self, symbol, last):
+        """
+        实时价并入未收盘K线（价格历史最后一根）：高低点随价格扩展，收盘为最新价。
+        最后一根须是按时钟算出的当前4h K线（开盘 = floor(now, 4h)）；历史还没拉到新K线（或停在更早）时
+        最后一根其实已收盘，不做试算。
+        """
+        raw = self.price_history.get(symbol)
+        if raw is None or not len(raw) or not last or last <= 0:
+            return
+        df = to_ohlcv_df(raw)
+        ts = int(df.index[-1])
+        if ts != bar_open_ms(time.time() * 1000, '4h'):
+            self.forming.pop(symbol, None)
+            return
+        bar = self.forming.get(symbol)
+        if bar is None or bar['ts_ms'] != ts:
+            row = df.iloc[-1]
+            bar = {'ts_ms': ts, 'open': float(row['open']), 'high': float(row['high']), 'low': float(row['low']),
+                   'close': float(row['close']), 'volume': float(row['volume'])}
+        bar = {**bar, 'high': max(bar['high'], last), 'low': min(bar['low'], last), 'close': last}
+        self.forming[symbol] = bar
+
+    def _preview_tick(self):
+        """在正在形成的K线上试算 TOP15 策略（已收盘状态只在新K线收盘时推进一步）"""
+        names = [n for n in STRATEGIES if n in TOP15_REGISTRY]
+        frames = {}
+        for symbol in self.forming:
+            raw = self.price_history.get(symbol)
+            df = to_ohlcv_df(raw if raw is not None else [])
+            if len(df) > 1:
+                frames[symbol] = df.iloc[:-1]
+        self.pending = PREVIEW_BOOK.pending(frames, self.forming, names)
+        self.pending_at = datetime.now()
+
+    def get_pending_signals(self):
+        """盘中试算出的 pending 信号（格式同 get_signals_data，status 为 pending）"""
+        self.update_prices()
+        signals = []
+        for symbol, hits in self.pending.items():
+            bar = self.forming.get(symbol, {})
+            for name, r in hits.items():
+                signals.append({
+                    'symbol': symbol.replace('/USDT', ''),
+                    'strategy': STRATEGY_NAMES.get(name, name),
+                    'side': 'BUY' if r['signal'] > 0 else 'SELL',
+                    'entry': round(float(r['entry']), 6),
+                    'target': round(float(r['tp']), 6),
+                    'stop': round(float(r['sl']), 6),
+                    'confidence': 40,
+                    'tf': '4h',
+                    'status': 'pending',
+                    'bar': bar.get('ts_ms'),
+                    'time': self.pending_at.strftime('%H:%M:%S') if self.pending_at else None,
+                })
+        return signals
 
     def _generate_initial_history(self, base_price, periods=300):
         """生成初始历史数据用于策略计算"""
@@ -356,8 +450,34 @@ class MockDataGenerator:
             print(f"❌ fetch_tickers error: {e}")
             raise
 
-    def get_signals_data(self):
-        """获取交易信号数据（使用真实策略计算）"""
+    def _closed_frames(self, names):
+        """
+        各币种已收盘K线与 planner 定出的可运行策略
+        → (frames {symbol: df_closed}, orders {symbol: [策略...]}, skipped {symbol: {策略: 原因}})
+        """
+        frames, orders, skipped = {}, {}, {}
+        for symbol in SYMBOLS:
+            try:
+                raw = self.price_history.get(symbol)
+                df = to_ohlcv_df(raw if raw is not None else [])
+                # 最后一根未收盘剔除（只读视图，不复制）
+                df_closed = df.iloc[:-1] if len(df) > 1 else df
+                plan = plan_strategies(names, bars=len(df_closed))
+                skipped[symbol] = plan["skipped"]
+                if not plan["order"]:
+                    continue
+                frames[symbol], orders[symbol] = df_closed, plan["order"]
+            except Exception as e:
+                print(f"币种 {symbol} 数据处理失败: {e}")
+                continue
+        return frames, orders, skipped
+
+    def get_signals_data(self, cfg=None, exclude=()):
+        """
+        获取交易信号数据（使用真实策略计算）；cfg 为本次请求的策略配置（StrategyConfig，缺省为进程配置），
+        exclude 中的币种不计算（如还没拿到新收盘K线的币种，免得按上一根K线报信号）
+        """
+        cfg = cfg or current_config()
         self.update_prices()
         signals = []
 
@@ -369,76 +489,181 @@ class MockDataGenerator:
         except Exception:
             effective_registry = STRATEGY_REGISTRY
 
-        # 使用真实策略计算信号（覆盖全部符号）
-        for symbol in SYMBOLS:
+        # 先整理各币种已收盘K线，并按 planner 定出各币种可运行的策略（历史不足的剔除，便宜的先跑）
+        names = [n for n in STRATEGIES if n in effective_registry]
+        frames, orders, _ = self._closed_frames(names)
+        for symbol in exclude:
+            frames.pop(symbol, None)
+            orders.pop(symbol, None)
+        if REGIME_FILTER:
             try:
-                raw = self.price_history.get(symbol) or []
-                if isinstance(raw, pd.DataFrame):
-                    df = raw.copy()
-                else:
-                    df = to_ohlcv_df(raw)
-                # 统一时间列
-                if 'ts' in df.columns and 'timestamp' not in df.columns:
-                    df = df.rename(columns={'ts': 'timestamp'})
-                assert_ohlcv_schema(df)
-                if len(df) < 80:
-                    continue
-                # 最后一根未收盘剔除
-                df_closed = df.iloc[:-1] if len(df) > 1 else df
-
-                for strategy_name in STRATEGIES:
-                    if strategy_name not in effective_registry:
-                        continue
-                    try:
-                        fn = effective_registry[strategy_name]
-                        result_dict = None
+                regimes = REGIME_ENGINE.regimes(frames, '4h', names)
+                orders = {s: [n for n in order if n in regimes[s]['strategies']] for s, order in orders.items()}
+            except Exception as e:
+                print(f"形态分类失败，按全部策略计算: {e}")
+
+        # TOP15 批量计算：同一时间轴的币种按 (symbols × bars) 矩阵一次算完最后一根；
+        # 只算各币种实际要跑的策略（形态过滤、planner 剔除之后的），要跑的策略相同的币种成一批；
+        # 每个策略的批量调用各按自己的预算限时，超时的策略只它自己回退逐币种
+        groups = {}
+        for symbol, order in orders.items():
+            top15 = [n for n in order if n in TOP15_REGISTRY]
+            if top15:
+                groups.setdefault(frozenset(top15), (top15, {}))[1][symbol] = frames[symbol]
+        batch = {}
+        for group_names, group_frames in groups.values():
+            try:
+                out, _ = last_bar_signals(
+                    group_frames, group_names,
+                    on_error=lambda name, e: print(f"批量策略 {name} 计算失败，回退逐币种: {e}"),
+                    budget=STRATEGY_BUDGET)
+                batch.update(out)
+            except Exception as e:
+                print(f"批量计算失败，回退逐币种: {e}")
 
-                        # 基础策略：签名 (symbol, df, tf) -> dict
-                        if strategy_name in STRATEGY_REGISTRY:
-                            result = fn(symbol, df_closed, '4h')
-                            result_dict = result if result else None
-                        else:
-                            # TOP15：签名 (df) -> DataFrame(signal/entry/sl/tp)
-                            out = fn(df_closed)
-                            if out is not None and isinstance(out, pd.DataFrame) and len(out):
-                                last = out.iloc[-1]
-                                sig = int(last.get('signal') or 0)
-                                if sig != 0:
-                                    side = 'BUY' if sig > 0 else 'SELL'
-                                    entry = float(last.get('entry')) if last.get('entry') is not None else float(df_closed['close'].iloc[-1])
-                                    tp = float(last.get('tp')) if last.get('tp') is not None else entry
-                                    sl = float(last.get('sl')) if last.get('sl') is not None else entry
-                                    result_dict = {
-                                        'side': side,
-                                        'entry': entry,
-                                        'target': tp,
-                                        'stop': sl,
-                                        'confidence': 40
-                                    }
-
-                        if result_dict:
-                            signals.append({
-                                'symbol': symbol.replace('/USDT', ''),
-                                'strategy': STRATEGY_NAMES.get(strategy_name, strategy_name),
-                                'side': result_dict['side'],
-                                'entry': round(float(result_dict['entry']), 6),
-                                'target': round(float(result_dict['target']), 6),
-                                'stop': round(float(result_dict['stop']), 6),
-                                'confidence': result_dict.get('confidence', 50),
-                                'tf': '4h',
-                                'time': datetime.now().strftime('%H:%M')
-                            })
-                            # 每币种只取一个信号即可，避免灌水
-                            break
-                    except Exception as e:
-                        print(f"策略 {strategy_name} 计算失败: {e}")
-                        continue
+        # 使用真实策略计算信号（覆盖全部符号）
+        for symbol, df_closed in frames.items():
+            try:
+                symbol_batch = batch.get(symbol, {})
+                # 超时回退 reuse 时只复用同一根K线上的结果，上一根的信号不会当新信号再报一次
+                frame = frame_id(df_closed)
+                with indicator_scope(INDICATOR_CACHE, symbol, '4h'):
+                    for strategy_name in orders[symbol]:
+                        try:
+                            fn = effective_registry[strategy_name]
+                            result_dict = None
+
+                            # 基础策略：签名 (symbol, df, tf) -> dict；共享 gate（ADX/ATR%）不过直接跳过
+                            # 结果按配置进指标缓存，strict / relaxed 请求各自命中、互不覆盖
+                            if strategy_name in STRATEGY_REGISTRY:
+                                if gate_rejection(strategy_name, evaluate_gates(df_closed, '4h', cfg)):
+                                    continue
+                                result, _ = STRATEGY_BUDGET.run(strategy_name, (symbol, cfg.name), evaluate,
+                                                                strategy_name, symbol, df_closed, '4h', cfg,
+                                                                frame=frame)
+                                result_dict = result if result else None
+                            else:
+                                # TOP15：优先取批量结果，否则 last_only 只算最后一根
+                                last = symbol_batch.get(strategy_name)
+                                if last is None:
+                                    out, _ = STRATEGY_BUDGET.run(strategy_name, symbol, fn, df_closed, last_only=True,
+                                                                 frame=frame)
+                                    if out is not None and isinstance(out, pd.DataFrame) and len(out):
+                                        last = out.iloc[-1]
+                                if last is not None:
+                                    sig = int(last.get('signal') or 0)
+                                    if sig != 0:
+                                        side = 'BUY' if sig > 0 else 'SELL'
+                                        entry = float(last.get('entry')) if last.get('entry') is not None else float(df_closed['close'].iloc[-1])
+                                        tp = float(last.get('tp')) if last.get('tp') is not None else entry
+                                        sl = float(last.get('sl')) if last.get('sl') is not None else entry
+                                        result_dict = {
+                                            'side': side,
+                                            'entry': entry,
+                                            'target': tp,
+                                            'stop': sl,
+                                            'confidence': 40
+                                        }
+
+                            if result_dict:
+                                signals.append({
+                                    'symbol': symbol.replace('/USDT', ''),
+                                    'strategy': STRATEGY_NAMES.get(strategy_name, strategy_name),
+                                    'side': result_dict['side'],
+                                    'entry': round(float(result_dict['entry']), 6),
+                                    'target': round(float(result_dict['target']), 6),
+                                    'stop': round(float(result_dict['stop']), 6),
+                                    'confidence': result_dict.get('confidence', 50),
+                                    'tf': '4h',
+                                    'time': datetime.now().strftime('%H:%M')
+                                })
+                                # 每币种只取一个信号即可，避免灌水
+                                break
+                        except Exception as e:
+                            print(f"策略 {strategy_name} 计算失败: {e}")
+                            continue
             except Exception as e:
                 print(f"币种 {symbol} 数据处理失败: {e}")
                 continue
 
         return signals
 
+    def get_signal_tensor(self, bars=5, names=None):
+        """
+        names 缺省为全部已注册策略（不限于已启用的）。
+        全部策略 × 全部币种 × 最后 bars 根已收盘K线的信号张量（不像 get_signals_data 那样每币种命中一个就停）。
+        TOP15 走批量面板（整段矩阵本来就算出，取最后 bars 列），基础策略走全序列版本，
+        批量失败或无法并入面板的币种回退逐币种整段计算。
+        """
+        self.update_prices()
+        registry = {**STRATEGY_REGISTRY, **TOP15_REGISTRY}
+        names = [n for n in (names or registry) if n in registry]
+        frames, orders, skipped = self._closed_frames(names)
+        errors = {}
+
+        def _error(symbol, name, e):
+            errors.setdefault(symbol, {})[name] = f"{type(e).__name__}: {e}"
+
+        def _batch_error(name, e):
+            print(f"批量策略 {name} 计算失败，回退逐币种: {e}")
+
+        try:
+            batch, _ = recent_bar_signals(frames, [n for n in names if n in TOP15_REGISTRY], bars, on_error=_batch_error)
+        except Exception as e:
+            print(f"批量计算失败，回退逐币种: {e}")
+            batch = {}
+
+        symbols = list(frames)
+        shape = (len(symbols), len(names), bars)
+        signal = np.zeros(shape, dtype=np.int8)
+        levels = {k: np.full(shape, np.nan) for k in ('entry', 'sl', 'tp')}
+        times = []
+        for i, symbol in enumerate(symbols):
+            df_closed = frames[symbol]
+            times.append([None if t is None else int(t) for t in
+                          tail_columns(np.asarray(df_closed.index, dtype=object), bars, None)])
+            symbol_batch = batch.get(symbol, {})
+            with indicator_scope(INDICATOR_CACHE, symbol, '4h'):
+                for j, name in enumerate(names):
+                    if name not in orders[symbol]:
+                        continue
+                    got = symbol_batch.get(name)
+                    if got is None:
+                        try:
+                            if name in SERIES_REGISTRY:
+                                out = SERIES_REGISTRY[name](symbol, df_closed, '4h', tail=bars)
+                            else:
+                                out = TOP15_REGISTRY[name](df_closed)
+                        except Exception as e:
+                            _error(symbol, name, e)
+                            continue
+                        got = {'signal': tail_columns(out['signal'].to_numpy(), bars, 0)}
+                        for k in levels:
+                            got[k] = tail_columns(out[k].to_numpy(dtype=float), bars, np.nan)
+                    signal[i, j] = got['signal']
+                    for k in levels:
+                        levels[k][i, j] = got[k]
+        # 无信号处价位无意义，统一置空
+        for k in levels:
+            levels[k][signal == 0] = np.nan
+        return {
+            'symbols': [s.replace('/USDT', '') for s in symbols],
+            'strategies': names,
+            'bars': bars,
+            'time': times,
+            'signal': signal,
+            'entry': levels['entry'],
+            'sl': levels['sl'],
+            'tp': levels['tp'],
+            'confluence': {
+                'long': (signal > 0).sum(axis=1),
+                'short': (signal < 0).sum(axis=1),
+                'net': signal.sum(axis=1, dtype=np.int64),
+            },
+            'skipped': {s.replace('/USDT', ''): v for s, v in skipped.items() if v},
+            'errors': {s.replace('/USDT', ''): v for s, v in errors.items()},
+        }
+
     # 删除 fallback：严格真实
 
     def get_learning_stats(self, has_strategies_enabled=True):
@@ -464,6 +689,37 @@ class MockDataGenerator:
 # 创建数据生成器实例
 data_generator = MockDataGenerator()
 
+# -------------------- K线收盘驱动的信号预计算 --------------------
+def _signal_configs():
+    """预计算的策略配置：进程缺省配置 + strict / relaxed（带 ?relax= 的请求同样命中快照）"""
+    out = {}
+    for cfg in (current_config(), STRICT, RELAXED):
+        out.setdefault(cfg.name, cfg)
+    return list(out.values())
+
+def _precompute_signals(tf, bar_ms):
+    """
+    刷新K线 → 每个配置算一次信号并发布快照；还没拿到新收盘K线的币种不计算，列在快照的 lagging 里，
+    并返回 False 让调度器稍后重试（补齐后重新发布）
+    """
+    lagging = data_generator.refresh_history(tf, bar_ms)
+    for cfg in _signal_configs():
+        t0 = time.perf_counter()
+        items = data_generator.get_signals_data(cfg, exclude=lagging)
+        SIGNAL_SNAPSHOTS.publish(cfg.name, tf, bar_ms, items, (time.perf_counter() - t0) * 1000.0,
+                                 extra={'config': cfg.name, 'lagging': [s.replace('/USDT', '') for s in lagging]})
+    if lagging:
+        print(f"[scheduler] {tf} 收盘K线未就绪: {', '.join(lagging)}")
+        return False
+    return True
+
+SIGNAL_PRECOMPUTE = BarCloseScheduler({'4h': _precompute_signals}, settle=SIGNAL_SETTLE_SEC)
+
+def _ensure_signal_scheduler():
+    """首个请求时启动后台预计算（debug 重载器的父进程不处理请求，不会多起一份）"""
+    if SIGNAL_SCHEDULER and not SIGNAL_PRECOMPUTE.running:
+        SIGNAL_PRECOMPUTE.start()
+
 @app.route('/')
 def index():
     """API首页"""
@@ -472,7 +728,14 @@ def index():
         'version': '1.0.0',
         'endpoints': [
             'GET /api/quotes - 获取实时行情',
-            'GET /api/signals - 获取交易信号',
+            'GET /api/signals?relax=0|1 - 获取交易信号（relax 只作用于本次请求；K线收盘后预计算的快照）',
+            'GET /api/signals/schedule - 信号预计算的调度状态与各快照信息',
+            'GET /api/signals/timings - 各策略耗时（p50/p99）与超时计数',
+            'GET /api/signals/pending - 未收盘K线上的盘中试算信号（需 intrabar_preview）',
+            'GET /api/signals/tensor?bars=N - 全部策略×币种×最近N根的信号张量与共振计数',
+            'POST /api/strategies/reload - 热加载策略模块（保留已预热的缓存）',
+            'GET /api/correlation?windows=30,90 - 币种间收益率滚动相关矩阵',
+            'GET /api/regime - 各币种市场形态（趋势/震荡）与适用策略',
             'GET /api/learning-stats - 获取学习成绩',
             'GET /api/config - 获取配置信息',
             'GET /api/backtest/<symbol>?days=N&tf=4h|1d|1w&strategy=name - 回测'
@@ -483,7 +746,10 @@ def index():
 
 @app.route('/api/signals/diagnose')
 def diagnose_signals():
-    """诊断：逐个币种在最后一根已收K上跑所有策略，返回命中情况。支持 ?relax=1 临时放松阈值。"""
+    """
+    诊断：逐个币种在最后一根已收K上跑所有策略，返回命中情况。?relax=1 按放松配置报告（只作用于本次请求）；
+    基础策略的 strict / relaxed 两种配置在同一遍指标上一起求值，variants 给出两者各自的命中。
+    """
     try:
         if not USE_REAL_BINANCE_DATA:
             raise RuntimeError('Real data mode required')
@@ -496,68 +762,147 @@ def diagnose_signals():
         except Exception:
             effective_registry = STRATEGY_REGISTRY
 
-        # 可选临时 relax
-        relax_flag = request.args.get('relax')
-        restore_relax = None
-        try:
-            if relax_flag in ('1', 'true', 'True'):
-                restore_relax = True
-                set_relax_mode(True)
-        except Exception:
-            pass
+        cfg = RELAXED if request.args.get('relax') in ('1', 'true', 'True') else current_config()
+        variant_cfgs = (STRICT, RELAXED) if cfg in (STRICT, RELAXED) else (STRICT, RELAXED, cfg)
 
         report = []
+        gate_totals = {}  # gate 名 -> 被它拒掉的 (币种, 策略) 次数
         for symbol in SYMBOLS:
-            df = pd.DataFrame(data_generator.price_history.get(symbol) or [])
-            # 标准化
-            if not isinstance(df, pd.DataFrame) or df.empty:
-                try:
-                    df = to_ohlcv_df(data_generator.price_history.get(symbol) or [])
-                except Exception:
-                    df = pd.DataFrame()
+            raw = data_generator.price_history.get(symbol)
+            try:
+                df = to_ohlcv_df(raw if raw is not None else [])
+            except Exception as e:
+                report.append({ 'symbol': symbol, 'history': 0, 'triggered': [], 'errors': [f'schema:{e}'] })
+                continue
             if df.empty:
                 report.append({ 'symbol': symbol, 'history': 0, 'triggered': [], 'errors': ['no_history'] })
                 continue
             # 最后一根（已收），统一用 4h
             tf = '4h'
-            if 'ts' in df.columns and 'timestamp' not in df.columns:
-                df = df.rename(columns={'ts': 'timestamp'})
-            try:
-                assert_ohlcv_schema(df)
-            except Exception as e:
-                report.append({ 'symbol': symbol, 'history': int(len(df)), 'triggered': [], 'errors': [f'schema:{e}'] })
-                continue
             df_closed = df.iloc[:-1] if len(df) > 1 else df
             triggered = []
             errors = []
-            for sname, fn in effective_registry.items():
+            rejected = {}
+            plan = plan_strategies(list(effective_registry), bars=len(df_closed))
+            with indicator_scope(INDICATOR_CACHE, symbol, tf):
+                base = [n for n in plan['order'] if n in STRATEGY_REGISTRY]
                 try:
-                    if sname in STRATEGY_REGISTRY:
-                        res = fn(symbol, df_closed, tf)
-                        if res:
-                            triggered.append(sname)
-                    else:
-                        out = fn(df_closed)
-                        if out is not None and isinstance(out, pd.DataFrame) and len(out):
-                            last = out.iloc[-1]
-                            sig = int(last.get('signal') or 0)
-                            if sig != 0:
-                                triggered.append(sname)
+                    variants = evaluate_variants(symbol, df_closed, tf, base, variant_cfgs)
                 except Exception as e:
-                    errors.append(f"{sname}:{e}")
-            report.append({ 'symbol': symbol, 'history': int(len(df)), 'triggered': triggered, 'errors': errors })
-
-        # 恢复 relax（若需要可改为读取全局状态）
-        try:
-            if restore_relax:
-                set_relax_mode(False)
-        except Exception:
-            pass
+                    variants = {}
+                    errors.append(f"variants:{e}")
+                for sname in plan['order']:
+                    fn = effective_registry[sname]
+                    try:
+                        if sname in STRATEGY_REGISTRY:
+                            gate = gate_rejection(sname, evaluate_gates(df_closed, tf, cfg))
+                            if gate:
+                                rejected[sname] = gate
+                                gate_totals[gate] = gate_totals.get(gate, 0) + 1
+                                continue
+                            res = evaluate(sname, symbol, df_closed, tf, cfg)
+                            if res:
+                                triggered.append(sname)
+                        else:
+                            out = fn(df_closed, last_only=True)
+                            if out is not None and isinstance(out, pd.DataFrame) and len(out):
+                                last = out.iloc[-1]
+                                sig = int(last.get('signal') or 0)
+                                if sig != 0:
+                                    triggered.append(sname)
+                    except Exception as e:
+                        errors.append(f"{sname}:{e}")
+            report.append({ 'symbol': symbol, 'history': int(len(df)), 'triggered': triggered, 'errors': errors,
+                            'skipped': plan['skipped'], 'rejected': rejected,
+                            'variants': {k: [n for n, r in v.items() if r] for k, v in variants.items()} })
 
-        return jsonify({ 'success': True, 'data': report })
+        return jsonify({ 'success': True, 'config': cfg.name, 'data': report, 'gateRejections': gate_totals })
     except Exception as e:
         return jsonify({ 'success': False, 'error': str(e) }), 500
 
+@app.route('/api/signals/timings')
+def get_signal_timings():
+    """各策略在信号计算中的耗时分位数与超时/复用计数"""
+    return jsonify({
+        'success': True,
+        'data': STRATEGY_BUDGET.stats(),
+        'timestamp': datetime.now().isoformat()
+    })
+
+def _tensor_json(a, digits=None):
+    # NaN → null；价位按 digits 位小数
+    if digits is None:
+        return a.tolist()
+    return [[[None if v != v else round(v, digits) for v in row] for row in m] for m in a.tolist()]
+
+@app.route('/api/signals/tensor')
+def get_signal_tensor():
+    """信号张量：[币种][策略][最近 N 根] 的方向与价位 + 每根的多空共振计数。?bars=N（默认 5，最多 200）&strategies=a,b"""
+    try:
+        bars = min(max(int(request.args.get('bars', 5)), 1), 200)
+        names = [s for s in (request.args.get('strategies') or '').split(',') if s] or None
+        t = data_generator.get_signal_tensor(bars, names)
+        data = {k: t[k] for k in ('symbols', 'strategies', 'bars', 'time', 'skipped', 'errors')}
+        data['signal'] = _tensor_json(t['signal'])
+        for k in ('entry', 'sl', 'tp'):
+            data[k] = _tensor_json(t[k], 6)
+        data['confluence'] = {k: v.tolist() for k, v in t['confluence'].items()}
+        return jsonify({'success': True, 'data': data, 'timestamp': datetime.now().isoformat()})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/correlation')
+def get_symbol_correlation():
+    """交易池各币种对数收益率的滚动相关矩阵；?windows=30,90（每个 2~500）&threshold=0.8（列出高相关币种对）"""
+    try:
+        windows = [int(w) for w in (request.args.get('windows') or '30,90').split(',') if w.strip()]
+        if not windows or any(w < 2 or w > 500 for w in windows):
+            return jsonify({'success': False, 'error': 'windows must be integers in [2, 500]'}), 400
+        threshold = float(request.args.get('threshold', 0.8))
+        data_generator.update_prices()
+        frames = {}
+        for symbol in SYMBOLS:
+            raw = data_generator.price_history.get(symbol)
+            df = to_ohlcv_df(raw if raw is not None else [])
+            if len(df) > 2:
+                frames[symbol.replace('/USDT', '')] = df.iloc[:-1]  # 剔除未收盘K线
+        out = {}
+        for w in windows:
+            res = CORRELATION_BOOK.matrix(frames, w, '4h')
+            m = res['matrix']
+            out[str(w)] = {
+                'symbols': res['symbols'],
+                'time': res['time'],
+                'matrix': None if m is None else [[None if v != v else round(v, 4) for v in row] for row in m.tolist()],
+                'pairs': [{'a': a, 'b': b, 'corr': round(c, 4)} for a, b, c in correlated_pairs(res, threshold)],
+            }
+        return jsonify({'success': True, 'data': out, 'timestamp': datetime.now().isoformat()})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/regime')
+def get_market_regime():
+    """各币种的市场形态（trend_up / trend_down / range / unknown）、分类特征与适用策略"""
+    try:
+        data_generator.update_prices()
+        registry = {**STRATEGY_REGISTRY, **TOP15_REGISTRY}
+        names = list(registry)
+        frames, _, _ = data_generator._closed_frames(names)
+        result = REGIME_ENGINE.regimes(frames, '4h', names)
+        data, groups = {}, {}
+        for symbol, r in result.items():
+            sym = symbol.replace('/USDT', '')
+            data[sym] = {
+                'regime': r['regime'],
+                'features': {k: (None if v != v else round(v, 4)) for k, v in r['features'].items()},
+                'strategies': r['strategies'],
+                'strategyNames': [STRATEGY_NAMES.get(n, n) for n in r['strategies']],
+            }
+            groups.setdefault(r['regime'], []).append(sym)
+        return jsonify({'success': True, 'data': data, 'byRegime': groups, 'timestamp': datetime.now().isoformat()})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/quotes')
 def get_quotes():
     """获取实时行情数据"""
@@ -576,9 +921,20 @@ def get_quotes():
 
 @app.route('/api/signals')
 def get_signals():
-    """获取交易信号数据 - 修复前端期望的数据结构"""
+    """获取交易信号数据 - 修复前端期望的数据结构；?relax=1/0 只对本次请求生效"""
     try:
-        signals = data_generator.get_signals_data()
+        relax = request.args.get('relax')
+        cfg = None if relax is None else (RELAXED if relax in ('1', 'true', 'True') else STRICT)
+        if SIGNAL_SCHEDULER:
+            _ensure_signal_scheduler()
+            snap = SIGNAL_SNAPSHOTS.get((cfg or current_config()).name)
+            if snap is not None:
+                resp = app.response_class(snap.body, mimetype='application/json')
+                resp.set_etag(snap.etag)
+                resp.headers['Cache-Control'] = 'no-cache'
+                return resp.make_conditional(request)
+        # 未开启预计算或首个快照还没出来（冷启动）时现算
+        signals = data_generator.get_signals_data(cfg)
         # 前端期望的是 {items: [...]} 结构
         return jsonify({
             'items': signals,
@@ -593,6 +949,35 @@ def get_signals():
             'timestamp': datetime.now().isoformat()
         }), 200
 
+@app.route('/api/signals/schedule')
+def get_signal_schedule():
+    """信号预计算：各周期上次 / 下次运行时间、失败计数，以及各配置快照的版本与对应K线"""
+    return jsonify({
+        'success': True,
+        'enabled': SIGNAL_SCHEDULER,
+        'scheduler': SIGNAL_PRECOMPUTE.status(),
+        'snapshots': SIGNAL_SNAPSHOTS.info(),
+        'timestamp': datetime.now().isoformat()
+    })
+
+@app.route('/api/signals/pending')
+def get_pending_signals():
+    """未收盘K线上的 pending 信号；intrabar_preview 关闭时返回空列表"""
+    try:
+        items = data_generator.get_pending_signals() if INTRABAR_PREVIEW else []
+        return jsonify({
+            'success': True,
+            'enabled': INTRABAR_PREVIEW,
+            'items': items,
+            'unsupported': [n for n in STRATEGIES if n in TOP15_REGISTRY and n not in PREVIEW_BOOK.names],
+            'timestamp': datetime.now().isoformat()
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @app.route('/api/learning-stats')
 def get_learning_stats():
     """获取学习成绩数据"""
@@ -1277,6 +1662,8 @@ def set_strategies():
         # 热更新内存启用列表
         global STRATEGIES
         STRATEGIES = [name for name in allowed if name in enabled]
+        if SIGNAL_SCHEDULER:
+            SIGNAL_PRECOMPUTE.trigger()  # 快照按新的启用列表重算
 
         return jsonify({
             'success': True,
@@ -1288,6 +1675,20 @@ def set_strategies():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/strategies/reload', methods=['POST'])
+def reload_strategy_modules():
+    """从磁盘重新加载策略模块；K线历史与未受影响的指标缓存保留，只失效改动策略用到的指标"""
+    try:
+        result = reload_strategies(cache=INDICATOR_CACHE, budget=STRATEGY_BUDGET)
+        # 试算簿在构造时按策略函数的默认参数建好了流式指标，热加载后按新代码重建（下次试算时重新从历史同步）
+        global PREVIEW_BOOK
+        PREVIEW_BOOK = PreviewBook()
+        if SIGNAL_SCHEDULER:
+            SIGNAL_PRECOMPUTE.trigger()
+        return jsonify({'success': True, 'data': result, 'cache': INDICATOR_CACHE.stats()})
+    except Exception as e:
+        return jsonify({'success': False, 'error': f'{type(e).__name__}: {e}'}), 500
+
 @app.route('/api/fred/<series_id>')
 def get_fred_data(series_id):
     """获取FRED数据，避免CORS问题"""
@@ -1437,10 +1838,7 @@ def get_backtest(symbol):
 
         # 拉取历史
         ohlcv = data_generator.binance_exchange.fetch_ohlcv(f"{symbol}/USDT", tf, limit=limit)
-        rows = []
-        for ts, o, h, l, c, v in ohlcv:
-            rows.append({'ts': datetime.fromtimestamp(ts/1000), 'open': o, 'high': h, 'low': l, 'close': c, 'volume': v})
-        df = pd.DataFrame(rows)
+        df = canonical_ohlcv(ohlcv)
         if len(df) < 60:
             raise RuntimeError('Insufficient history for backtest')
 
@@ -1478,7 +1876,7 @@ def get_backtest(symbol):
                         'stop': float(res.get('stop', ep)),
                     }
                 else:
-                    out = fn(window_df)
+                    out = fn(window_df, last_only=True)
                     if out is None or not hasattr(out, 'iloc') or len(out) == 0:
                         return None
                     last = out.iloc[-1]
@@ -1493,31 +1891,50 @@ def get_backtest(symbol):
             except Exception:
                 return None
 
-        # 统一滚动回测
-        trades = []
-        for sname in strategies_to_test:
-            fn = effective_registry.get(sname)
-            if not fn:
+        # 逐根先算信号（同一窗口内各策略共享指标缓存），再按策略独立模拟持仓
+        active = [(sname, effective_registry[sname]) for sname in strategies_to_test if effective_registry.get(sname)]
+        bar_signals = {sname: {} for sname, _ in active}
+        # 基础策略有全序列版本：整段一次算完，第 i 根窗口 df[:i] 对应第 i-1 行
+        per_bar = []
+        for sname, fn in active:
+            series_fn = SERIES_REGISTRY.get(sname)
+            if series_fn is None:
+                per_bar.append((sname, fn))
                 continue
+            try:
+                frame = series_fn(f"{symbol}/USDT", df, tf)
+                bar_signals[sname] = {i: series_signal(frame, i - 1) for i in range(60, len(df))}
+            except Exception:
+                per_bar.append((sname, fn))
+        bt_cache = IndicatorCache(max_entries=256)
+        with indicator_scope(bt_cache, f"{symbol}/USDT", tf):
+            for i in (range(60, len(df)) if per_bar else ()):
+                window = df.iloc[:i]
+                for sname, fn in per_bar:
+                    bar_signals[sname][i] = _call_strategy_unified(sname, fn, f"{symbol}/USDT", window, tf)
+
+        # 统一滚动回测（第 i 根窗口 df[:i] 的最后一根即第 i-1 根）
+        trades = []
+        closes = df['close'].to_numpy()
+        for sname, fn in active:
             position = None
             entry_price = None
             entry_time = None
             last_targets = None
 
             for i in range(60, len(df)):
-                window = df.iloc[:i].copy()
-                sigdict = _call_strategy_unified(sname, fn, f"{symbol}/USDT", window, tf)
+                sigdict = bar_signals[sname][i]
 
                 if sigdict and position is None:
                     position = sigdict['side']
-                    entry_price = float(window['close'].iloc[-1])
-                    entry_time = window['ts'].iloc[-1]
+                    entry_price = float(closes[i - 1])
+                    entry_time = bar_time(df, i - 1)
                     last_targets = {'tp': float(sigdict['target']), 'sl': float(sigdict['stop'])}
                     continue
 
                 if position is not None:
-                    px = float(window['close'].iloc[-1])
-                    cur_time = window['ts'].iloc[-1]
+                    px = float(closes[i - 1])
+                    cur_time = bar_time(df, i - 1)
                     if position == 'BUY':
                         if px >= last_targets['tp'] or px <= last_targets['sl']:
                             pnl = (px - entry_price) / entry_price * 100.0
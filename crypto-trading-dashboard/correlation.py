@@ -0,0 +1,158 @@
+# correlation.py — 交易池内各币种收益率的滚动相关矩阵
+# RollingCorrelation 维护窗口内的 Σx（n）与 Σx·xᵀ（n×n）：新K线加一个外积、移出最老一根的外积，
+# 每根 O(n²)，与窗口长度无关；每滚过 window 根从环形缓冲重算一次和，避免加减累积的舍入误差。
+# CorrelationBook 按 (tf, window) 各维护一个，对齐各币种已收盘K线后只喂新增的K线，结果按末根K线缓存。
+import threading
+
+import numpy as np
+import pandas as pd
+
+
+class RollingCorrelation:
+    """n 个序列最近 window 个观测的 Pearson 相关矩阵（与 pandas rolling(window).corr() 同口径，ddof=1）"""
+
+    def __init__(self, n: int, window: int):
+        if window < 2:
+            raise ValueError(f"window must be >= 2, got {window}")
+        self.n = int(n)
+        self.window = int(window)
+        self._buf = np.zeros((self.window, self.n))  # 未填满的行为 0，不影响求和
+        self._pos = 0
+        self._since = 0  # 距上次重算的根数
+        self.count = 0
+        self._s = np.zeros(self.n)
+        self._ss = np.zeros((self.n, self.n))
+
+    @property
+    def ready(self) -> bool:
+        return self.count >= self.window
+
+    def update(self, x):
+        """追加一根（长度 n 的收益率向量，需全部有限）→ 相关矩阵；不足 window 根时为 None"""
+        x = np.asarray(x, dtype=np.float64)
+        old = self._buf[self._pos]
+        self._s -= old
+        self._ss -= np.outer(old, old)
+        self._buf[self._pos] = x
+        self._s += x
+        self._ss += np.outer(x, x)
+        self._pos = (self._pos + 1) % self.window
+        self.count += 1
+        self._since += 1
+        if self._since >= self.window:
+            self._s = self._buf.sum(axis=0)
+            self._ss = self._buf.T @ self._buf
+            self._since = 0
+        return self.value
+
+    @property
+    def value(self):
+        if not self.ready:
+            return None
+        w = self.window
+        cov = (self._ss - np.outer(self._s, self._s) / w) / (w - 1)
+        var = np.clip(np.diag(cov), 0.0, None)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            corr = cov / np.sqrt(np.outer(var, var))
+        corr = np.clip(corr, -1.0, 1.0)
+        # 方差为 0（窗口内价格不动）的币种与任何币种的相关都无定义
+        flat = var <= 1e-300
+        corr[flat, :] = np.nan
+        corr[:, flat] = np.nan
+        np.fill_diagonal(corr, np.where(flat, np.nan, 1.0))
+        return corr
+
+
+def _closes(df: pd.DataFrame) -> pd.Series:
+    close = df["close"]
+    return close[np.isfinite(close.to_numpy(dtype=float)) & (close.to_numpy(dtype=float) > 0)]
+
+
+def aligned_log_returns(frames: dict, bars: int = None) -> pd.DataFrame:
+    """{symbol: df} → 只保留各币种都有收盘价的K线，计算对数收益率（行 = 时间，列 = symbol）；bars 只取最后若干根"""
+    closes = pd.concat({s: _closes(df) for s, df in frames.items()}, axis=1, join="inner").sort_index()
+    if bars is not None:
+        closes = closes.iloc[-(bars + 1):]
+    return np.log(closes).diff().iloc[1:]
+
+
+class CorrelationBook:
+    """
+    按 (tf, window) 维护 RollingCorrelation。matrix() 每次只把上次之后新收盘、且各币种都有的K线喂进去；
+    币种集合变化、新K线对不齐（有币种缺这一根或价格无效）时，从对齐后的最近 window 根重建。
+    同一根K线上重复请求直接返回缓存结果。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = {}  # (tf, window) -> {"symbols", "last_ts", "tracker", "result"}
+
+    def _rebuild(self, frames, symbols, window):
+        rets = aligned_log_returns(frames, window)
+        tracker = RollingCorrelation(len(symbols), window)
+        for row in rets[symbols].to_numpy():
+            tracker.update(row)
+        last_ts = rets.index[-1] if len(rets) else None
+        return {"symbols": symbols, "last_ts": last_ts, "tracker": tracker, "result": None}
+
+    def _advance(self, state, frames):
+        # 各币种在 last_ts 之后的新K线；时间戳完全一致才增量更新，否则返回 False 让调用方重建
+        last_ts = state["last_ts"]
+        if last_ts is None:
+            return False
+        news = {}
+        for s in state["symbols"]:
+            close = frames[s]["close"]
+            i = close.index.searchsorted(last_ts, side="right")
+            if i == 0 or close.index[i - 1] != last_ts:
+                return False
+            tail = close.iloc[i - 1:]
+            v = tail.to_numpy(dtype=float)
+            if not (np.isfinite(v).all() and (v > 0).all()):
+                return False
+            news[s] = tail
+        idx = news[state["symbols"][0]].index
+        if any(not v.index.equals(idx) for v in news.values()):
+            return False
+        if len(idx) > 1:
+            rets = np.diff(np.log(np.column_stack([news[s].to_numpy(dtype=float) for s in state["symbols"]])), axis=0)
+            for row in rets:
+                state["tracker"].update(row)
+            state["last_ts"] = idx[-1]
+            state["result"] = None
+        return True
+
+    def matrix(self, frames: dict, window: int, tf: str = "4h") -> dict:
+        """
+        frames: {symbol: 已剔除未收盘K线的 OHLCV DataFrame}
+        → {"symbols", "window", "time"（末根K线）, "bars"（累计喂入根数）, "matrix"（n×n ndarray，窗口未满时为 None）}
+        """
+        symbols = sorted(s for s, df in frames.items() if df is not None and len(df))
+        key = ((tf or "").lower(), int(window))
+        with self._lock:
+            state = self._state.get(key)
+            if state is None or state["symbols"] != symbols or not self._advance(state, frames):
+                state = self._state[key] = self._rebuild({s: frames[s] for s in symbols}, symbols, int(window))
+            if state["result"] is None:
+                tracker = state["tracker"]
+                state["result"] = {
+                    "symbols": symbols,
+                    "window": int(window),
+                    "time": None if state["last_ts"] is None else int(state["last_ts"]),
+                    "bars": tracker.count,
+                    "matrix": tracker.value,
+                }
+            return state["result"]
+
+
+def correlated_pairs(result: dict, threshold: float = 0.8) -> list:
+    """|相关| ≥ threshold 的币种对，按 |相关| 从高到低 → [(a, b, corr)]"""
+    m = result.get("matrix")
+    if m is None:
+        return []
+    symbols = result["symbols"]
+    i, j = np.triu_indices(len(symbols), k=1)
+    c = m[i, j]
+    keep = np.flatnonzero(np.abs(np.nan_to_num(c)) >= threshold)
+    keep = keep[np.argsort(-np.abs(c[keep]), kind="stable")]
+    return [(symbols[i[k]], symbols[j[k]], float(c[k])) for k in keep]
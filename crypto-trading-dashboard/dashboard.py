@@ -12,10 +12,13 @@ from collections import defaultdict
 from datetime import datetime, timezone
 
 from utils import fmt_price, to_ohlcv_df
-from strategies import STRATEGY_REGISTRY
+from strategies import STRATEGY_REGISTRY, SERIES_REGISTRY, series_signal
 from strategies_top15 import REGISTRY as TOP15_REGISTRY
 from strategies import strategy_diag
-from strategies import set_relax_mode
+from strategies import RELAXED, STRICT, use_config
+from indicator_cache import IndicatorCache, indicator_scope
+from regime import RegimeEngine
+from ohlcv import bar_time
 
 # 合并 TOP15 策略到全局注册表（确保不少于15个策略可用）
 try:
@@ -27,9 +30,19 @@ except Exception:
 import numpy as np
 import pandas as pd
 
+# 指标缓存跨 rerun 保留：同一根K线上的指标各策略/各区块只算一次
+@st.cache_resource
+def _indicator_cache():
+    return IndicatorCache(max_entries=8192, compact=bool(cfg.get("compact_indicators", False)))
+
+# 形态分类跨 rerun 保留：K线未变时直接复用
+@st.cache_resource
+def _regime_engine():
+    return RegimeEngine(_indicator_cache(), rules=cfg.get("regime_rules"))
+
 def _first_hit_future(df_slice, start_i, lookahead, entry, target, stop, side):
-    highs = df_slice["high"].astype(float).iloc[start_i+1:start_i+1+lookahead].tolist()
-    lows  = df_slice["low"].astype(float).iloc[start_i+1:start_i+1+lookahead].tolist()
+    highs = df_slice["high"].iloc[start_i+1:start_i+1+lookahead].tolist()
+    lows  = df_slice["low"].iloc[start_i+1:start_i+1+lookahead].tolist()
     if side == "BUY":
         for h, l in zip(highs, lows):
             if l <= stop:  return "SL"
@@ -40,6 +53,19 @@ def _first_hit_future(df_slice, start_i, lookahead, entry, target, stop, side):
             if l <= target:return "TP"
     return None
 
+def _series_frames(symbol: str, df: pd.DataFrame, tf: str, names: list) -> dict:
+    """有全序列版本的策略整段算一次；失败的留给逐根路径"""
+    frames = {}
+    for name in names:
+        series_fn = SERIES_REGISTRY.get(name)
+        if series_fn is None:
+            continue
+        try:
+            frames[name] = series_fn(symbol, df, tf)
+        except Exception:
+            pass
+    return frames
+
 def backtest_symbol_with_strategies(df_full: pd.DataFrame, tf: str, enabled: list, symbol: str, lookahead=12):
     """
     逐根将 df[:i] 丢给策略函数，只有"当根触发"的策略才会返回信号；
@@ -49,31 +75,35 @@ def backtest_symbol_with_strategies(df_full: pd.DataFrame, tf: str, enabled: lis
     wins=0; losses=0; opens=0
     # 预留足够warmup
     warmup = 220  # 覆盖最长的EMA200
+    with indicator_scope(_indicator_cache(), symbol, tf):
+        frames = _series_frames(symbol, df_full, tf, enabled)
+    bt_cache = IndicatorCache(max_entries=256)  # 回放窗口逐根变化，单独用小缓存避免挤掉实时缓存
     for i in range(max(warmup, 60), len(df_full)-1):
-        df_slice = df_full.iloc[:i+1].copy()
-        for name in enabled:
-            fn = STRATEGY_REGISTRY.get(name)
-            if not fn:
-                continue
-            sig = None
-            try:
-                sig = fn(symbol, df_slice, tf)
-            except Exception:
+        df_slice = df_full.iloc[:i+1]
+        with indicator_scope(bt_cache, symbol, tf):
+            for name in enabled:
+                fn = STRATEGY_REGISTRY.get(name)
+                if not fn:
+                    continue
                 sig = None
-            if not sig:
-                continue
-            entry = float(sig["entry"]) if sig["entry"] is not None else float(df_slice["close"].iloc[-1])
-            target= float(sig["target"]); stop=float(sig["stop"]); side=sig["side"]
-            outcome = _first_hit_future(df_full, i, lookahead, entry, target, stop, side)
-            if outcome == "TP": wins += 1
-            elif outcome == "SL": losses += 1
-            else: opens += 1
-            results.append({
-                "Time": str(df_slice["ts"].iloc[-1]),
-                "TF": tf, "Strategy": name, "Side": side,
-                "Entry": entry, "Target": target, "Stop": stop,
-                "Outcome": outcome or "None", "R/R": 1 if outcome=="TP" else (-1 if outcome=="SL" else None)
-            })
+                try:
+                    sig = series_signal(frames[name], i) if name in frames else fn(symbol, df_slice, tf)
+                except Exception:
+                    sig = None
+                if not sig:
+                    continue
+                entry = float(sig["entry"]) if sig["entry"] is not None else float(df_slice["close"].iloc[-1])
+                target= float(sig["target"]); stop=float(sig["stop"]); side=sig["side"]
+                outcome = _first_hit_future(df_full, i, lookahead, entry, target, stop, side)
+                if outcome == "TP": wins += 1
+                elif outcome == "SL": losses += 1
+                else: opens += 1
+                results.append({
+                    "Time": str(bar_time(df_full, i)),
+                    "TF": tf, "Strategy": name, "Side": side,
+                    "Entry": entry, "Target": target, "Stop": stop,
+                    "Outcome": outcome or "None", "R/R": 1 if outcome=="TP" else (-1 if outcome=="SL" else None)
+                })
     total = wins + losses
     winrate = (wins/total*100) if total>0 else 0.0
     avg_r = float(np.nan) if total==0 else np.nanmean([r["R/R"] for r in results if r["R/R"] is not None])
@@ -109,9 +139,9 @@ def drop_unclosed_last_bar(df: pd.DataFrame, tf: str) -> pd.DataFrame:
     sec = TF_SEC.get((tf or "").lower())
     if not sec:
         return df
-    last_ts = int(pd.to_datetime(df["ts"].iloc[-1]).tz_localize("UTC").timestamp())
+    last_ts = int(df.index[-1]) // 1000
     now = int(datetime.now(timezone.utc).timestamp())
-    return df.iloc[:-1].copy() if (now - last_ts) < sec else df
+    return df.iloc[:-1] if (now - last_ts) < sec else df
 
 def last_closed_index(df: pd.DataFrame, tf: str) -> int:
     return len(df) - 1 if len(df) else -1
@@ -119,7 +149,7 @@ def last_closed_index(df: pd.DataFrame, tf: str) -> int:
 def signal_at(symbol: str, df: pd.DataFrame, tf: str, strat_name: str, i: int):
     if i < 0 or i >= len(df):
         return None
-    view = df.iloc[: i + 1].copy()
+    view = df.iloc[: i + 1]
     fn = STRATEGY_REGISTRY.get(strat_name)
     if not fn:
         return None
@@ -127,7 +157,7 @@ def signal_at(symbol: str, df: pd.DataFrame, tf: str, strat_name: str, i: int):
         sig = fn(symbol, view, tf)
         if sig:
             sig["strategy"] = strat_name
-            sig["ts"] = pd.to_datetime(df["ts"].iloc[i])
+            sig["ts"] = bar_time(df, i)
             return sig
     except Exception:
         return None
@@ -141,18 +171,26 @@ def latest_live_and_recent(symbol_to_df: dict, tf: str, strategies: list, lookah
         i_last = last_closed_index(df, tf)
         if i_last < 0:
             continue
-        # 当根触发
-        for strat in strategies:
-            s = signal_at(sym, df, tf, strat, i_last)
-            if s:
-                live_signals.append(s)
-        # 近窗口逐根
-        start = max(0, i_last - int(lookahead) + 1)
-        for i in range(start, i_last + 1):
+        with indicator_scope(_indicator_cache(), sym, tf):
+            # 全序列先扫一遍，只在命中的根上调用单根函数拿完整信号（含 reason）
+            frames = _series_frames(sym, df, tf, strategies)
+            def _signal(strat, i):
+                fr = frames.get(strat)
+                if fr is not None and int(fr["signal"].iloc[i]) == 0:
+                    return None
+                return signal_at(sym, df, tf, strat, i)
+            # 当根触发
             for strat in strategies:
-                s = signal_at(sym, df, tf, strat, i)
+                s = _signal(strat, i_last)
                 if s:
-                    recent_window_signals.append(s)
+                    live_signals.append(s)
+            # 近窗口逐根
+            start = max(0, i_last - int(lookahead) + 1)
+            for i in range(start, i_last + 1):
+                for strat in strategies:
+                    s = _signal(strat, i)
+                    if s:
+                        recent_window_signals.append(s)
     # 去重并排序
     live_keys = {(s.get("symbol"), s.get("strategy"), s.get("ts")) for s in live_signals}
     recent_window_signals = [r for r in recent_window_signals if (r.get("symbol"), r.get("strategy"), r.get("ts")) not in live_keys]
@@ -225,7 +263,7 @@ with st.sidebar.expander("回测工具", expanded=False):
     run_bt = st.button("运行快回测")
 diag_mode = st.sidebar.checkbox("诊断模式（显示 ADX / ATR% / 交叉等）", value=False)
 relax = st.sidebar.checkbox("放松过滤（先出信号，后再收紧）", value=True)
-set_relax_mode(relax)
+use_config(RELAXED if relax else STRICT)  # 只作用于本会话这次 rerun，不影响其他会话
 
 # 统一启用策略状态（多选）— 默认全开；允许本地持久化
 def _load_user_state():
@@ -294,6 +332,10 @@ def fetch_df(symbol: str, timeframe: str, limit=500) -> pd.DataFrame:
     return to_ohlcv_df(raw)
 
 def compute_signals(symbol: str, df: pd.DataFrame, timeframe: str):
+    with indicator_scope(_indicator_cache(), symbol, timeframe):
+        return _compute_signals(symbol, df, timeframe)
+
+def _compute_signals(symbol: str, df: pd.DataFrame, timeframe: str):
     out = []
     for name, fn in STRATEGY_REGISTRY.items():
         if name not in st.session_state.get("active_strategies", ENABLED):
@@ -332,7 +374,7 @@ for sym in SYMBOLS:
             "Close": fmt_price(last["close"]),
             "High": fmt_price(last["high"]),
             "Low": fmt_price(last["low"]),
-            "Time": str(last["ts"])
+            "Time": str(bar_time(df, -1))
         })
         # 计算信号（仅 4h/1d/1w）
         signals_all.extend(compute_signals(sym, df, tf))
@@ -340,7 +382,8 @@ for sym in SYMBOLS:
         # 诊断模式
         if diag_mode:
             try:
-                diag = strategy_diag(df, tf)
+                with indicator_scope(_indicator_cache(), sym, tf):
+                    diag = strategy_diag(df, tf)
                 if diag:
                     with st.expander(f"📊 诊断 · {sym}", expanded=False):
                         st.write(diag)
@@ -397,16 +440,26 @@ err_box.write(str(err_count))
 qdf = pd.DataFrame(quotes)
 st.dataframe(qdf.head(8), height=240, use_container_width=True)
 
-st.subheader("🧭 当前形态与推荐策略（简版）")
-st.caption("说明：此处按简单指标展示'震荡/趋势'倾向与建议策略名称，仅作演示。")
+st.subheader("🧭 当前形态与推荐策略")
+st.caption("说明：按 ADX / EMA 斜率 / +DI-DI 判定趋势上行、趋势下行或震荡（见 regime.RULES），推荐适用于该形态的策略类型。")
 # 自检探针：用当前 signals_all 检查覆盖
 probe_signals_from_list(signals_all)
 if len(quotes):
     sym_pick = st.selectbox("选择标的查看推荐", [q["Symbol"] for q in quotes])
-    # 简单从已算的 signals_all 里找该标的策略名
-    rec = [s["strategy"] for s in signals_all if s["symbol"] == sym_pick]
-    rec = list(dict.fromkeys(rec))[:3] if rec else ["—"]
-    st.write(f"**{sym_pick}** · 推荐：", ", ".join(rec))
+    REGIME_LABELS = {"trend_up": "趋势上行", "trend_down": "趋势下行", "range": "震荡", "unknown": "历史不足"}
+    try:
+        closed = {s: drop_unclosed_last_bar(d, tf) for s, d in symbol_to_df.items()}
+        regimes = _regime_engine().regimes(closed, tf, list(STRATEGY_REGISTRY))
+        r = regimes.get(sym_pick)
+    except Exception as e:
+        r = None
+        st.caption(f"形态分类失败：{e}")
+    if r is not None:
+        f = r["features"]
+        st.write(f"**{sym_pick}** · 形态：{REGIME_LABELS.get(r['regime'], r['regime'])}"
+                 f"（ADX {f['adx']:.1f} · ATR% {f['atrp']:.2f} · 布林带宽% {f['bbw']:.2f} · EMA斜率 {f['slope']:.2f} ATR）")
+        st.write("推荐：", ", ".join(r["strategies"]) or "—")
+        st.caption("全部币种：" + " · ".join(f"{s} {REGIME_LABELS.get(v['regime'], v['regime'])}" for s, v in regimes.items()))
 
 st.subheader("🔔 当根信号（收盘确认）")
 live_signals, recent_window_signals = latest_live_and_recent(symbol_to_df, tf, st.session_state.get("active_strategies", ENABLED), st.session_state.get("lookahead", int(la) if 'la' in locals() else 12))
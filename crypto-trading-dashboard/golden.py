@@ -0,0 +1,782 @@
+# golden.py — 指标 / 策略内核的逐根等价校验（golden harness）
+# 参考实现：录制的参考结果（见下）、pandas 原生写法；没有录制结果的数据退回 strategies_top15 的整段计算、
+# strategies.py 单根函数逐根喂前缀（STRICT / RELAXED 各一遍）与已安装的 pandas_ta。
+# 备选引擎（整段计算、last_only、批量面板、盘中试算、全序列版本、流式指标…）
+# 在同一批K线上逐根对照 signal / entry / sl / tp 与指标值，报告首个分歧K线、信号不一致根数与数值漂移；
+# 另核对紧凑指标缓存下全部策略的结果与 float64 缓存一致（check_compact）。
+# 数据：内置合成K线（4h / 1d / 1w，短 / 长历史，含缺口）+ 录制的K线文件（见 load_recorded）。
+# 录制的参考结果：数据目录下 reference/<数据名>.json，由锁定版本的 pandas_ta 与改写前的 strategies_top15 / strategies.py
+# （直接调用 pandas_ta 的版本）跑出 TOP15 与基础策略的信号、pandas_ta 指标值，校验时不需要安装 pandas_ta（见 record_reference）。
+# 用法：pytest test_golden.py（环境变量 GOLDEN_DATA 缺省为 golden_data/），或
+#   python golden.py [--data DIR] [--engine top15.batch ...] [--bars 200] [--json]
+#   python golden.py --plugin my_engines   # import 后往 ENGINES / INDICATOR_ENGINES 注册的引擎一并校验
+#   python golden.py --record golden_data --baseline 旧版strategies_top15.py --baseline-strategies 旧版strategies.py
+#                                                                                # 重新录制参考结果
+import argparse
+import hashlib
+import importlib
+import importlib.util
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+import strategies as S
+import strategies_top15 as T
+import ta_kernels as K
+from indicator_cache import validate_compact
+from ohlcv import anchor_keys, canonical_ohlcv, ts_ms
+from preview import _FACTORIES, PreviewBook, _bars
+from strategies_batch import recent_bar_signals
+
+BARS = 200  # 逐根对照的窗口（最后 BARS 根）；单根参考实现每根都要整段重算，窗口过大会很慢
+RTOL = 1e-9
+ATOL = 1e-9
+FIELDS = ("signal", "entry", "sl", "tp")
+CONFIGS = (S.STRICT, S.RELAXED)  # 基础策略两种配置都校验
+GOLDEN_DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden_data")  # 缺省数据目录
+REFERENCE_DIR = "reference"  # 数据目录下存放录制参考结果的子目录
+TIE_SCALES = (1 + 2.0 ** -40, 1 - 2.0 ** -40)  # 录制时价格整体缩放 ~1e-12 后信号会翻转的K线视为舍入平局
+
+_FREQ = {"4h": "4h", "1d": "1D", "1w": "W-MON"}
+_TF_MS = {"4h": 4 * 3_600_000, "1d": 86_400_000, "1w": 7 * 86_400_000}
+_VOL = {"4h": 0.015, "1d": 0.035, "1w": 0.08}  # 每根收益率的波动
+
+# 内置合成数据：(tf, 根数, 随机种子, 缺口比例)。短历史卡在部分策略的 warmup 附近，缺口为整根 OHLC 缺失
+SYNTHETIC = [
+    ("4h", 200, 1, 0.0),
+    ("4h", 1500, 2, 0.0),
+    ("4h", 1500, 3, 0.02),
+    ("1d", 120, 4, 0.0),
+    ("1d", 900, 5, 0.0),
+    ("1d", 900, 6, 0.02),
+    ("1w", 100, 7, 0.0),
+    ("1w", 400, 8, 0.0),
+]
+
+
+class Skipped(Exception):
+    """引擎在该数据上不可用（依赖未安装等）"""
+
+
+class FixtureError(Exception):
+    """录制的参考结果与当前数据对不上（K线变了，需要重新录制）"""
+
+
+class Dataset:
+    """
+    一组校验用K线（canonical）；参考结果按 (类别, 策略, 窗口) 缓存在实例上，多个引擎共用。
+    fixture 为录制的参考结果（load_fixture），没有时为 None。
+    """
+
+    def __init__(self, name, symbol, tf, df, fixture=None):
+        self.name = name
+        self.symbol = symbol
+        self.tf = tf
+        self.df = df
+        self.fixture = fixture
+        self._refs = {}
+
+    def __repr__(self):
+        return f"Dataset({self.name}, {self.symbol}, {self.tf}, bars={len(self.df)})"
+
+    def start(self, bars=BARS) -> int:
+        """窗口首根的位置（至少从第 2 根起：交叉类条件需要前一根）"""
+        return max(len(self.df) - int(bars), 1)
+
+    def reference(self, kind, names, start) -> dict:
+        key = (kind, tuple(names), start)
+        if key not in self._refs:
+            self._refs[key] = REFERENCES[kind](self, names, start)
+        return self._refs[key]
+
+
+# ---------- 数据 ----------
+def _holes(rng, n, frac):
+    """随机挑若干段（每段 1~6 根）作为缺口，合计约 frac 比例"""
+    mask = np.zeros(n, dtype=bool)
+    for i in np.flatnonzero(rng.random(n) < frac / 3.5):
+        mask[i:i + int(rng.integers(1, 7))] = True
+    mask[0] = mask[-1] = False
+    return mask
+
+
+def synthetic(tf="4h", n=1000, seed=0, gaps=0.0, symbol="SYN/USDT") -> Dataset:
+    """带分段趋势的几何随机游走；gaps > 0 时把部分K线的 OHLC 置为 NaN（canonical_ohlcv 会丢掉，形成时间缺口）"""
+    rng = np.random.default_rng(seed)
+    vol = _VOL[tf]
+    r = rng.normal(0.0, vol, n) + np.repeat(rng.normal(0.0, vol / 5, n // 50 + 1), 50)[:n]
+    close = 100.0 * np.exp(np.cumsum(r))
+    open_ = np.r_[close[0], close[:-1]]
+    raw = pd.DataFrame({
+        "ts": pd.date_range("2022-01-03", periods=n, freq=_FREQ[tf]),
+        "open": open_,
+        "high": np.maximum(open_, close) * (1 + rng.uniform(0, vol / 2, n)),
+        "low": np.minimum(open_, close) * (1 - rng.uniform(0, vol / 2, n)),
+        "close": close,
+        "volume": rng.uniform(1e3, 1e4, n),
+    })
+    if gaps:
+        raw.loc[_holes(rng, n, gaps), ["open", "high", "low", "close"]] = np.nan
+    name = f"synthetic-{tf}-{n}" + ("-gaps" if gaps else "")
+    return Dataset(name, symbol, tf, canonical_ohlcv(raw))
+
+
+def synthetic_sets() -> list:
+    return [synthetic(tf, n, seed, gaps) for tf, n, seed, gaps in SYNTHETIC]
+
+
+def _infer_tf(df):
+    step = float(np.median(np.diff(ts_ms(df)))) if len(df) > 1 else 0.0
+    return min(_TF_MS, key=lambda tf: abs(_TF_MS[tf] - step))
+
+
+def load_recorded(path) -> list:
+    """
+    目录或单个文件 → [Dataset]。CSV（ts / timestamp 列 + OHLCV 列）或 JSON（ccxt 的 [[ts, o, h, l, c, v], ...]）。
+    文件名形如 BTC-USDT_4h.csv：最后一段为周期（认不出时按K线间隔推断），前面为币种（- 换成 /）。
+    """
+    if os.path.isdir(path):
+        files = sorted(os.path.join(path, f) for f in os.listdir(path) if f.lower().endswith((".csv", ".json")))
+    else:
+        files = [path]
+    out = []
+    for f in files:
+        stem = os.path.splitext(os.path.basename(f))[0]
+        try:
+            if f.lower().endswith(".json"):
+                with open(f, "r", encoding="utf-8") as fh:
+                    df = canonical_ohlcv(json.load(fh))
+            else:
+                df = canonical_ohlcv(pd.read_csv(f))
+        except Exception as e:
+            print(f"[golden] 跳过 {f}: {e}")
+            continue
+        symbol, _, tf = stem.rpartition("_")
+        tf = tf.lower()
+        if not symbol or tf not in _TF_MS:
+            symbol, tf = stem, _infer_tf(df)
+        out.append(Dataset(f"recorded-{stem}", symbol.replace("-", "/"), tf, df))
+    return out
+
+
+def datasets(data=None) -> list:
+    """内置合成数据 + data（目录 / 文件，可为 None）里的录制数据；data 为目录时挂上 reference/ 下的录制参考结果"""
+    return attach_fixtures(synthetic_sets() + (load_recorded(data) if data else []), data)
+
+
+def attach_fixtures(sets, data) -> list:
+    """data 为目录时给 sets 挂上 data/reference/ 下的录制参考结果"""
+    if data and os.path.isdir(data):
+        for ds in sets:
+            ds.fixture = load_fixture(fixture_path(data, ds.name))
+    return sets
+
+
+# ---------- 录制的参考结果 ----------
+def digest(df) -> str:
+    """K线（时间轴 + OHLCV）的 sha256，用来确认参考结果录制自同一批数据"""
+    h = hashlib.sha256(np.ascontiguousarray(ts_ms(df), dtype=np.int64).tobytes())
+    h.update(np.ascontiguousarray(df[["open", "high", "low", "close", "volume"]].to_numpy(dtype=np.float64)).tobytes())
+    return h.hexdigest()
+
+
+def fixture_path(data, name) -> str:
+    return os.path.join(data, REFERENCE_DIR, f"{name}.json")
+
+
+def load_fixture(path):
+    """参考结果文件 → dict（不存在时 None）；JSON 里的 null 还原成 NaN"""
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as fh:
+        fx = json.load(fh)
+    for series in list(fx["top15"].values()) + list(fx.get("base", {}).values()) + [fx.get("pandas_ta", {})]:
+        for k, v in series.items():
+            series[k] = np.array([np.nan if x is None else x for x in v],
+                                 dtype=np.int64 if k == "signal" else np.float64)
+    return fx
+
+
+def _fixture(ds, start=None):
+    """ds 的参考结果（没有时 None）；K线对不上或不覆盖第 start 根起的窗口时抛 FixtureError"""
+    fx = ds.fixture
+    if fx is None:
+        return None
+    if fx["digest"] != digest(ds.df):
+        raise FixtureError(f"recorded reference {ds.name} was made from different bars, re-record it")
+    if start is not None and start < fx["start"]:
+        raise FixtureError(f"recorded reference {ds.name} starts at bar {fx['start']}, requested {start}")
+    return fx
+
+
+def _json_list(a):
+    return [None if v != v else (int(v) if isinstance(v, (int, np.integer)) else float(v)) for v in a.tolist()]
+
+
+def _file_sha256(path) -> str:
+    with open(path, "rb") as fh:
+        return hashlib.sha256(fh.read()).hexdigest()
+
+
+def _load_baseline(path, name="golden_baseline_top15"):
+    spec = importlib.util.spec_from_file_location(name, path)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def _legacy_frame(df):
+    """canonical → 改写前 strategies.py 的输入（ts 为 datetime 列，RangeIndex，同旧版 to_ohlcv_df）"""
+    out = df.reset_index(drop=True)
+    out.insert(0, "ts", pd.to_datetime(ts_ms(df), unit="ms"))
+    return out
+
+
+def _record_base(ds, baseline, frame, start) -> dict:
+    """改写前 strategies.py 的单根函数逐根喂前缀；STRICT / RELAXED 用旧版的全局 set_relax_mode 切换"""
+    out = {}
+    try:
+        for cfg in CONFIGS:
+            baseline.set_relax_mode(cfg.relax)
+            for n, fn in baseline.STRATEGY_REGISTRY.items():
+                out[_label(n, cfg)] = _from_results([fn(ds.symbol, frame.iloc[:i + 1], ds.tf)
+                                                     for i in range(start, len(frame))])
+    finally:
+        baseline.set_relax_mode(False)
+    return out
+
+
+def _unstable(run, frame, ref, start) -> dict:
+    """价格整体缩放 TIE_SCALES 后信号翻转的K线：{名称: [K线位置...]}（只列出有的）"""
+    unstable = {n: set() for n in ref}
+    for scale in TIE_SCALES:
+        scaled = frame.copy()
+        scaled[["open", "high", "low", "close"]] *= scale
+        for n, res in run(scaled).items():
+            unstable[n].update((start + np.flatnonzero(res["signal"] != ref[n]["signal"])).tolist())
+    return {n: sorted(b) for n, b in unstable.items() if b}
+
+
+def record_reference(ds, baseline, bars=BARS, base_baseline=None) -> dict:
+    """
+    用 baseline（改写前、直接调用 pandas_ta 的 strategies_top15 模块）、base_baseline（改写前的 strategies.py，可为 None）
+    与当前安装的 pandas_ta 录制 ds 最后 bars 根的参考结果：TOP15 与基础策略（STRICT / RELAXED）各自的 signal / entry / sl / tp、
+    价格整体缩放 TIE_SCALES 后信号翻转的K线（unstable / base_unstable，对照时不计信号差异），以及 pandas_ta_cases 的各列指标值。
+    """
+    import pandas_ta as ta
+    start = ds.start(bars)
+    df = ds.df.copy()
+    df.index = pd.to_datetime(ts_ms(ds.df), unit="ms")
+
+    def run(frame):
+        return {n: _fields(baseline.run_strategy(n, frame).reset_index(drop=True), start) for n in baseline.REGISTRY}
+
+    top15 = run(df)
+    unstable = _unstable(run, df, top15, start)
+    base, base_unstable = {}, {}
+    if base_baseline is not None:
+        legacy = _legacy_frame(ds.df)
+        base = _record_base(ds, base_baseline, legacy, start)
+        base_unstable = _unstable(lambda frame: _record_base(ds, base_baseline, frame, start), legacy, base, start)
+    indicators = {}
+    for name, call in K.pandas_ta_cases(df).items():
+        ref = call(ta)
+        for col in ([ref] if not hasattr(ref, "columns") else [ref[c] for c in ref.columns]):
+            indicators[f"{name}:{col.name}"] = np.asarray(col, dtype=np.float64)[start:]
+    return {
+        "dataset": ds.name,
+        "bars": len(ds.df),
+        "digest": digest(ds.df),
+        "start": start,
+        "source": {"baseline": os.path.basename(baseline.__file__), "baseline_sha256": _file_sha256(baseline.__file__),
+                   **({"base_baseline": os.path.basename(base_baseline.__file__),
+                       "base_baseline_sha256": _file_sha256(base_baseline.__file__)} if base_baseline else {}),
+                   "pandas_ta": ta.version,
+                   "pandas": pd.__version__, "numpy": np.__version__},
+        "unstable": unstable,
+        "base_unstable": base_unstable,
+        "top15": {n: {k: _json_list(v) for k, v in res.items()} for n, res in top15.items()},
+        "base": {n: {k: _json_list(v) for k, v in res.items()} for n, res in base.items()},
+        "pandas_ta": {k: _json_list(v) for k, v in indicators.items()},
+    }
+
+
+def write_references(sets, out_dir, baseline_path, bars=BARS, base_baseline_path=None) -> list:
+    """为 sets 录制参考结果，写到 out_dir/reference/<数据名>.json，返回写出的文件"""
+    baseline = _load_baseline(baseline_path)
+    base_baseline = _load_baseline(base_baseline_path, "golden_baseline_strategies") if base_baseline_path else None
+    os.makedirs(os.path.join(out_dir, REFERENCE_DIR), exist_ok=True)
+    paths = []
+    for ds in sets:
+        path = fixture_path(out_dir, ds.name)
+        fx = record_reference(ds, baseline, bars, base_baseline)
+        with open(path, "w", encoding="utf-8") as fh:
+            json.dump(fx, fh, ensure_ascii=False, separators=(",", ":"))
+            fh.write("\n")
+        paths.append(path)
+    return paths
+
+
+# ---------- 参考实现 ----------
+# 策略结果统一成 {策略名: {"signal": int[m], "entry"/"sl"/"tp": float[m]}}，覆盖第 start 根到最后一根
+def _fields(frame, start) -> dict:
+    return {k: np.asarray(frame[k].to_numpy()[start:], dtype=np.int64 if k == "signal" else np.float64)
+            for k in FIELDS}
+
+
+def _from_results(rows) -> dict:
+    """单根函数的结果列表（dict 或 None）→ 数组；无信号时价位为 NaN"""
+    out = {k: np.full(len(rows), np.nan) for k in FIELDS[1:]}
+    sig = np.zeros(len(rows), dtype=np.int64)
+    for j, r in enumerate(rows):
+        if r:
+            sig[j] = 1 if r["side"] == "BUY" else -1
+            out["entry"][j], out["sl"][j], out["tp"][j] = r["entry"], r["stop"], r["target"]
+    return {"signal": sig, **out}
+
+
+def _label(name, cfg):
+    return name if cfg is S.STRICT else f"{name}@{cfg.name}"
+
+
+def _base_names(names):
+    return [n for n in (S.STRATEGY_REGISTRY if names is None else names) if n in S.STRATEGY_REGISTRY]
+
+
+def _top15_names(names):
+    return [n for n in (T.REGISTRY if names is None else names) if n in T.REGISTRY]
+
+
+def _top15_reference(ds, names, start):
+    """录制的参考结果（unstable 的K线带上 "tie" 掩码）；没有录制的数据或策略用 strategies_top15 整段计算"""
+    fx = _fixture(ds, start)
+    out = {}
+    for n in names:
+        if fx is None or n not in fx["top15"]:
+            out[n] = _fields(T.run_strategy(n, ds.df), start)
+            continue
+        j = start - fx["start"]
+        out[n] = {k: v[j:] for k, v in fx["top15"][n].items()}
+        out[n]["tie"] = np.isin(np.arange(start, len(ds.df)), fx["unstable"].get(n, []))
+    return out
+
+
+def _base_bar(ds, names, start):
+    """strategies.py 单根函数：第 i 根的结果 = 把 df.iloc[:i+1] 交给函数"""
+    df, fns = ds.df, S.STRATEGY_REGISTRY
+    return {_label(n, cfg): _from_results([fns[n](ds.symbol, df.iloc[:i + 1], ds.tf, cfg=cfg)
+                                           for i in range(start, len(df))])
+            for cfg in CONFIGS for n in names}
+
+
+def _base_reference(ds, names, start):
+    """录制的改写前 strategies.py 结果（base_unstable 的K线带上 "tie" 掩码）；没有录制的数据或策略用当前的单根函数"""
+    fx = _fixture(ds, start)
+    recorded = {} if fx is None else fx.get("base", {})
+    live = [n for n in names if any(_label(n, cfg) not in recorded for cfg in CONFIGS)]
+    out = _base_bar(ds, live, start) if live else {}
+    for cfg in CONFIGS:
+        for n in names:
+            label = _label(n, cfg)
+            if label in out:
+                continue
+            j = start - fx["start"]
+            out[label] = {k: v[j:] for k, v in recorded[label].items()}
+            out[label]["tie"] = np.isin(np.arange(start, len(ds.df)), fx["base_unstable"].get(label, []))
+    return {_label(n, cfg): out[_label(n, cfg)] for cfg in CONFIGS for n in names}
+
+
+REFERENCES = {"top15": _top15_reference, "base": _base_reference}
+
+
+# ---------- 备选引擎：fn(ds, names, start) → 同参考实现的结构；不支持的策略不出现在结果里 ----------
+def _top15_full(ds, names, start):
+    """strategies_top15 整段计算（对照录制的参考结果；没有录制结果时它本身就是参考，跳过）"""
+    if ds.fixture is None:
+        raise Skipped("no recorded reference")
+    return {n: _fields(T.run_strategy(n, ds.df), start) for n in names}
+
+
+def _base_bar_engine(ds, names, start):
+    """当前 strategies.py 的单根函数（对照录制的改写前结果；没有录制结果时它本身就是参考，跳过）"""
+    if ds.fixture is None or not ds.fixture.get("base"):
+        raise Skipped("no recorded reference")
+    return _base_bar(ds, names, start)
+
+
+def _top15_last_only(ds, names, start):
+    df = ds.df
+    out = {}
+    for n in names:
+        rows = [T.run_strategy(n, df.iloc[:i + 1], last_only=True) for i in range(start, len(df))]
+        out[n] = _fields(pd.concat(rows), 0)
+    return out
+
+
+def _top15_batch(ds, names, start):
+    res, _ = recent_bar_signals({ds.symbol: ds.df}, names, bars=len(ds.df) - start)
+    return {n: {k: np.asarray(v[k], dtype=np.int64 if k == "signal" else np.float64) for k in FIELDS}
+            for n, v in res.get(ds.symbol, {}).items()}
+
+
+def _top15_preview(ds, names, start):
+    """盘中试算：已收盘状态推进到前一根，把第 i 根当作正在形成的K线试算（收盘时应与整段计算一致）"""
+    df = ds.df
+    book = PreviewBook(names)
+    rows = {n: [] for n in book.names}
+    for i in range(start, len(df)):
+        book.sync(ds.symbol, df.iloc[:i])
+        res = book.preview(ds.symbol, _bars(df, i)[0])
+        for n in book.names:
+            rows[n].append(res[n])
+    return {n: {k: np.array([r[k] for r in rs], dtype=np.int64 if k == "signal" else np.float64) for k in FIELDS}
+            for n, rs in rows.items()}
+
+
+def _base_series(ds, names, start, tail=False):
+    df, fns = ds.df, S.SERIES_REGISTRY
+    n_tail = len(df) - start if tail else None
+    return {_label(n, cfg): _fields(fns[n](ds.symbol, df, ds.tf, tail=n_tail, cfg=cfg), start)
+            for cfg in CONFIGS for n in names}
+
+
+# 引擎名 → (参考实现类别, fn)
+ENGINES = {
+    "top15.full": ("top15", _top15_full),
+    "top15.last_only": ("top15", _top15_last_only),
+    "top15.batch": ("top15", _top15_batch),
+    "top15.preview": ("top15", _top15_preview),
+    "base.bar": ("base", _base_bar_engine),
+    "base.series": ("base", _base_series),
+    "base.series_tail": ("base", lambda ds, names, start: _base_series(ds, names, start, tail=True)),
+}
+
+_NAMES = {"top15": _top15_names, "base": _base_names}
+
+
+# ---------- 指标引擎：fn(ds) → {指标列: (参考值, 引擎值)} ----------
+def _pandas_ema(close, length):
+    """pandas_ta.ema 的 pandas 写法：前 length 根均值作种子，之后 ewm(adjust=False)"""
+    seed = close.copy()
+    seed.iloc[:length] = np.nan
+    if len(close) >= length:
+        seed.iloc[length - 1] = close.iloc[:length].mean()
+    return seed.ewm(span=length, adjust=False).mean()
+
+
+def _pandas_indicators(ds):
+    """ta_kernels 对照 pandas 原生写法（strategies.py 的指标口径即是这些 pandas 调用）"""
+    df = ds.df
+    high, low, close, volume = df["high"], df["low"], df["close"], df["volume"]
+    h, l, c, v = (s.to_numpy() for s in (high, low, close, volume))
+    keys = anchor_keys(ts_ms(df), "D")
+    tp = (high + low + close) / 3.0
+    vwap = (tp * volume).groupby(keys).cumsum() / volume.groupby(keys).cumsum().replace(0.0, np.nan)
+    return {
+        "ewm_span:55": (close.ewm(span=55).mean(), K.ema_span(c, 55)),
+        "ema:20": (_pandas_ema(close, 20), K.ema(c, 20)),
+        "rma:14": (close.ewm(alpha=1.0 / 14, adjust=False).mean(), K.rma(c, 14)),
+        "sma:20": (close.rolling(20).mean(), K.sma(c, 20)),
+        "std:20": (close.rolling(20).std(), K.rolling_std(c, 20)),
+        "max:20": (high.rolling(20).max(), K.rolling_max(h, 20)),
+        "min:20": (low.rolling(20).min(), K.rolling_min(l, 20)),
+        "atr_sma:14": (S._atr(high, low, close, 14)[0], K.atr_sma(h, l, c, 14)[0]),
+        "vwap:D": (vwap, K.anchored_vwap(h, l, c, v, keys)),
+    }
+
+
+# 流式指标 key（同 preview._FACTORIES）→ (属性, ta_kernels 的对应结果)
+_STREAMING = {
+    ("atr", 14): (("value",), lambda o, h, l, c, v, ts: (K.atr(h, l, c, 14),)),
+    ("ema", 50): (("value",), lambda o, h, l, c, v, ts: (K.ema(c, 50),)),
+    ("rsi", 14): (("value",), lambda o, h, l, c, v, ts: (K.rsi(c, 14),)),
+    ("adx", 14): (("value", "dmp", "dmn"), lambda o, h, l, c, v, ts: K.adx(h, l, c, length=14)),
+    ("macd", 12, 26, 9): (("value", "hist", "signal"), lambda o, h, l, c, v, ts: K.macd(c, 12, 26, 9)),
+    ("bb", 20, 2.0): (("lower", "value", "upper"), lambda o, h, l, c, v, ts: K.bbands(c, 20, 2.0)),
+    ("kc", 20, 2.0): (("lower", "value", "upper"), lambda o, h, l, c, v, ts: K.kc(h, l, c, 20, 2.0)),
+    ("dc", 20): (("lower", "value", "upper"), lambda o, h, l, c, v, ts: K.donchian(h, l, 20, 20)),
+    ("cci", 20): (("value",), lambda o, h, l, c, v, ts: (K.cci(h, l, c, 20),)),
+    ("ha",): (("open", "value"), lambda o, h, l, c, v, ts: [K.ha(o, h, l, c)[i] for i in (0, 3)]),
+    ("vwap", "D"): (("value",), lambda o, h, l, c, v, ts: (K.anchored_vwap(h, l, c, v, anchor_keys(ts, "D")),)),
+    ("st", 10, 3.0): (("trend", "value"), lambda o, h, l, c, v, ts: K.supertrend(h, l, c, 10, 3.0)[:2]),
+    ("psar", 0.02, 0.2): (("value", "short"), lambda o, h, l, c, v, ts: K.psar(h, l, c, af=0.02, max_af=0.2)[:2]),
+    ("stochrsi", 14, 14, 3, 3): (("value", "d"), lambda o, h, l, c, v, ts: K.stochrsi(c, 14, 14, 3, 3)),
+}
+
+
+def _streaming_indicators(ds):
+    """streaming.py 的逐根指标对照 ta_kernels 整段结果"""
+    df = ds.df
+    arrays = [df[k].to_numpy() for k in ("open", "high", "low", "close", "volume")] + [ts_ms(df)]
+    bars = _bars(df)
+    out = {}
+    for key, (attrs, ref) in _STREAMING.items():
+        ind = _FACTORIES[key[0]](*key[1:])
+        got = {a: np.empty(len(bars)) for a in attrs}
+        for j, bar in enumerate(bars):
+            ind.update(bar)
+            for a in attrs:
+                got[a][j] = getattr(ind, a)
+        label = ":".join(map(str, key))
+        for a, r in zip(attrs, ref(*arrays)):
+            out[f"{label}.{a}"] = (r, got[a])
+    return out
+
+
+def _columns(frame):
+    return [frame] if not hasattr(frame, "columns") else [frame[col] for col in frame.columns]
+
+
+def _pandas_ta_indicators(ds):
+    """
+    ta_kernels.ta_compat 对照 pandas_ta：有录制结果时对照录制的窗口（窗口之前两边都置 NaN），
+    否则对照已安装的 pandas_ta（未安装时跳过）
+    """
+    fx = _fixture(ds)
+    cases = K.pandas_ta_cases(ds.df)
+    out = {}
+    if fx is not None:
+        got = {f"{name}:{g.name}": np.asarray(g, dtype=np.float64)
+               for name, call in cases.items() for g in _columns(call(K.ta_compat))}
+        # 两边缺的列都按全 NaN 对照（录制结果里没有的新列 / 兼容层不再给出的列都会报出来）
+        for label in list(fx["pandas_ta"]) + [k for k in got if k not in fx["pandas_ta"]]:
+            r, g = np.full(len(ds.df), np.nan), np.full(len(ds.df), np.nan)
+            r[fx["start"]:] = fx["pandas_ta"].get(label, np.nan)
+            g[fx["start"]:] = got.get(label, np.full(len(ds.df), np.nan))[fx["start"]:]
+            out[label] = (r, g)
+        return out
+    try:
+        import pandas_ta as ta
+    except Exception as e:
+        raise Skipped(f"pandas_ta unavailable: {e}")
+    for name, call in cases.items():
+        for r, g in zip(_columns(call(ta)), _columns(call(K.ta_compat))):
+            out[f"{name}:{r.name}"] = (r, g)
+    return out
+
+
+INDICATOR_ENGINES = {
+    "pandas": _pandas_indicators,
+    "streaming": _streaming_indicators,
+    "pandas_ta": _pandas_ta_indicators,
+}
+
+
+# ---------- 对照 ----------
+def _drift(a, b):
+    with np.errstate(invalid="ignore", divide="ignore"):
+        d = np.abs(a - b)
+        rel = d / np.abs(a)
+    ok = np.isfinite(d)
+    rel = rel[ok & np.isfinite(rel)]
+    return (float(d[ok].max()) if ok.any() else 0.0), (float(rel.max()) if len(rel) else 0.0)
+
+
+def _close(a, b, rtol, atol):
+    return np.isclose(a, b, rtol=rtol, atol=atol, equal_nan=True)
+
+
+def _first(bad, ts, start):
+    idx = np.flatnonzero(bad)
+    if not len(idx):
+        return {"first_bar": None, "first_ts": None}
+    j = int(idx[0])
+    return {"first_bar": start + j, "first_ts": str(pd.Timestamp(int(ts[start + j]), unit="ms"))}
+
+
+def compare_signals(ref, got, ts, start, rtol=RTOL, atol=ATOL) -> dict:
+    """
+    逐根对照 signal（须完全一致，ref 带 "tie" 掩码时这些舍入平局的K线不计）与同向信号根上的 entry / sl / tp
+    （rtol / atol 内视为一致，NaN 须同为 NaN）。
+    → {"bars", "signals"（参考的信号根数）, "mismatches", "level_mismatches", "first_bar", "first_ts",
+       "first"（首个分歧根两边的值）, "max_abs", "max_rel", "ok"}
+    """
+    sr, sg = ref["signal"], got["signal"]
+    if len(sr) != len(sg):
+        return {"bars": len(sr), "ok": False, "error": f"length mismatch: {len(sr)} != {len(sg)}"}
+    mis = sr != sg
+    if "tie" in ref:
+        mis &= ~ref["tie"]
+    same = (sr != 0) & (sr == sg)
+    level_bad = np.zeros(len(sr), dtype=bool)
+    max_abs = max_rel = 0.0
+    for k in FIELDS[1:]:
+        a, b = ref[k][same], got[k][same]
+        level_bad[same] |= ~_close(a, b, rtol, atol)
+        d_abs, d_rel = _drift(a, b)
+        max_abs, max_rel = max(max_abs, d_abs), max(max_rel, d_rel)
+    bad = mis | level_bad
+    out = {
+        "bars": len(sr),
+        "signals": int(np.count_nonzero(sr)),
+        "mismatches": int(mis.sum()),
+        "level_mismatches": int(level_bad.sum()),
+        **_first(bad, ts, start),
+        "max_abs": max_abs,
+        "max_rel": max_rel,
+        "ok": not bad.any(),
+    }
+    if out["first_bar"] is not None:
+        j = out["first_bar"] - start
+        out["first"] = {side: {k: (int(v[k][j]) if k == "signal" else float(v[k][j])) for k in FIELDS}
+                        for side, v in (("ref", ref), ("got", got))}
+    return out
+
+
+def compare_values(ref, got, ts, rtol=RTOL, atol=ATOL) -> dict:
+    """指标值逐根对照：NaN 位置须一致，其余在 rtol / atol 内 → {"bars", "nan_mismatch", "first_bar", ..., "ok"}"""
+    a, b = np.asarray(ref, dtype=np.float64), np.asarray(got, dtype=np.float64)
+    if a.shape != b.shape:
+        return {"bars": len(a), "ok": False, "error": f"shape mismatch: {a.shape} != {b.shape}"}
+    nan_mis = np.isnan(a) != np.isnan(b)
+    bad = nan_mis | ~_close(a, b, rtol, atol)
+    max_abs, max_rel = _drift(a, b)
+    out = {
+        "bars": len(a),
+        "nan_mismatch": int(nan_mis.sum()),
+        **_first(bad, ts, 0),
+        "max_abs": max_abs,
+        "max_rel": max_rel,
+        "ok": not bad.any(),
+    }
+    if out["first_bar"] is not None:
+        out["first"] = {"ref": float(a[out["first_bar"]]), "got": float(b[out["first_bar"]])}
+    return out
+
+
+def check_strategies(ds, engine, names=None, bars=BARS, rtol=RTOL, atol=ATOL) -> list:
+    """一个策略引擎在一组数据上的逐策略报告（行 dict）；引擎不支持的策略记为 skipped"""
+    kind, fn = ENGINES[engine]
+    names = _NAMES[kind](names)
+    start = ds.start(bars)
+    head = {"dataset": ds.name, "engine": engine}
+    try:
+        ref = ds.reference(kind, names, start)
+        got = fn(ds, names, start)
+    except Skipped as e:
+        return [{**head, "name": "*", "skipped": str(e)}]
+    except FixtureError as e:
+        return [{**head, "name": "*", "ok": False, "error": str(e)}]
+    ts = ts_ms(ds.df)
+    rows = []
+    for label, r in ref.items():
+        if label not in got:
+            rows.append({**head, "name": label, "skipped": "not supported by engine"})
+            continue
+        rows.append({**head, "name": label, **compare_signals(r, got[label], ts, start, rtol, atol)})
+    return rows
+
+
+def check_indicators(ds, engine, rtol=RTOL, atol=ATOL) -> list:
+    head = {"dataset": ds.name, "engine": engine}
+    try:
+        pairs = INDICATOR_ENGINES[engine](ds)
+    except Skipped as e:
+        return [{**head, "name": "*", "skipped": str(e)}]
+    except FixtureError as e:
+        return [{**head, "name": "*", "ok": False, "error": str(e)}]
+    ts = ts_ms(ds.df)
+    return [{**head, "name": label, **compare_values(r, g, ts, rtol, atol)} for label, (r, g) in pairs.items()]
+
+
+def check_compact(ds) -> list:
+    """紧凑（历史部分 float32）指标缓存与 float64 缓存下全部策略的结果须逐根一致（indicator_cache.validate_compact）"""
+    head = {"dataset": ds.name, "engine": "compact_cache"}
+    res = validate_compact(ds.df, symbol=ds.symbol, tf=ds.tf)
+    rows = [{**head, "name": f"{name}:{mode}", "ok": False, "error": f"{bad} rows differ from float64 cache"}
+            for name, mode, bad in res["diff"]]
+    return rows or [{**head, "name": "*", "checked": res["checked"], "ok": True}]
+
+
+def run(sets=None, engines=None, indicator_engines=None, names=None, bars=BARS, rtol=RTOL, atol=ATOL,
+        compact=True) -> list:
+    """全部（或指定的）数据 × 引擎的报告行；engines / indicator_engines 为 None 时取全部已注册引擎，compact 为是否校验紧凑缓存"""
+    sets = synthetic_sets() if sets is None else sets
+    engines = list(ENGINES) if engines is None else engines
+    indicator_engines = list(INDICATOR_ENGINES) if indicator_engines is None else indicator_engines
+    rows = []
+    for ds in sets:
+        for e in engines:
+            rows += check_strategies(ds, e, names, bars, rtol, atol)
+        for e in indicator_engines:
+            rows += check_indicators(ds, e, rtol, atol)
+        if compact:
+            rows += check_compact(ds)
+    return rows
+
+
+def format_row(row) -> str:
+    where = f"{row['dataset']:<24} {row['engine']:<18} {row['name']:<28}"
+    if "skipped" in row:
+        return f"  -  {where} skipped: {row['skipped']}"
+    if "error" in row:
+        return f"FAIL {where} {row['error']}"
+    mark = " ok " if row["ok"] else "FAIL"
+    if "checked" in row:
+        return f"{mark} {where} checked={row['checked']}"
+    counts = (f"signals={row['signals']} mismatches={row['mismatches']} levels={row['level_mismatches']}"
+              if "signals" in row else f"nan_mismatch={row['nan_mismatch']}")
+    first = "" if row["first_bar"] is None else f" first_bar={row['first_bar']} ({row['first_ts']})"
+    return f"{mark} {where} bars={row['bars']} {counts} max_abs={row['max_abs']:.3g} max_rel={row['max_rel']:.3g}{first}"
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="指标 / 策略内核逐根等价校验")
+    ap.add_argument("--data", default=GOLDEN_DATA, help="录制K线与参考结果的目录或K线文件（CSV / JSON），缺省 golden_data/")
+    ap.add_argument("--no-synthetic", action="store_true", help="只校验录制数据")
+    ap.add_argument("--engine", action="append", help="策略引擎（可多次），缺省为全部")
+    ap.add_argument("--indicators", action="append", help="指标引擎（可多次），缺省为全部；传 none 不校验指标")
+    ap.add_argument("--no-compact", action="store_true", help="不校验紧凑指标缓存")
+    ap.add_argument("--strategy", action="append", help="只校验这些策略（可多次）")
+    ap.add_argument("--plugin", action="append", default=[], help="先 import 的模块（在其中注册备选引擎）")
+    ap.add_argument("--bars", type=int, default=BARS, help=f"逐根对照的窗口（默认 {BARS}）")
+    ap.add_argument("--rtol", type=float, default=RTOL)
+    ap.add_argument("--atol", type=float, default=ATOL)
+    ap.add_argument("--json", action="store_true", help="输出 JSON 报告")
+    ap.add_argument("--all", action="store_true", help="逐行列出全部结果（含跳过的；默认只列出不一致的）")
+    ap.add_argument("--record", metavar="DIR", help="录制参考结果到 DIR/reference/（需要 pandas_ta 与 --baseline）")
+    ap.add_argument("--baseline", help="录制用的 strategies_top15.py（直接调用 pandas_ta 的版本）")
+    ap.add_argument("--baseline-strategies", help="录制用的 strategies.py（改写前、全局 RELAX 开关的版本）")
+    args = ap.parse_args(argv)
+
+    for mod in args.plugin:
+        importlib.import_module(mod)
+    unknown = [e for e in args.engine or [] if e not in ENGINES]
+    unknown += [e for e in args.indicators or [] if e != "none" and e not in INDICATOR_ENGINES]
+    if unknown:
+        ap.error(f"unknown engine: {', '.join(unknown)}（策略引擎 {', '.join(ENGINES)}；指标引擎 {', '.join(INDICATOR_ENGINES)}）")
+    sets = [] if args.no_synthetic else synthetic_sets()
+    if args.data:
+        sets += load_recorded(args.data)
+    if args.record:
+        if not args.baseline or not args.baseline_strategies:
+            ap.error("--record needs --baseline and --baseline-strategies")
+        for path in write_references(sets, args.record, args.baseline, args.bars, args.baseline_strategies):
+            print(f"[golden] recorded {path}")
+        return 0
+    attach_fixtures(sets, args.data)
+    indicators = args.indicators
+    if indicators and "none" in indicators:
+        indicators = []
+    rows = run(sets, args.engine, indicators, args.strategy, args.bars, args.rtol, args.atol,
+               not args.no_compact)
+
+    failed = [r for r in rows if "skipped" not in r and not r["ok"]]
+    if args.json:
+        print(json.dumps({"ok": not failed, "rows": rows}, ensure_ascii=False, indent=2, default=str))
+    else:
+        for r in rows:
+            if args.all or ("skipped" not in r and not r["ok"]):
+                print(format_row(r))
+        skipped = sum("skipped" in r for r in rows)
+        print(f"[golden] {len(sets)} datasets, {len(rows) - skipped} checks, {len(failed)} failed, {skipped} skipped")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    # 以模块身份运行，--plugin 里 import golden 注册的引擎与这里是同一份注册表
+    import golden
+    sys.exit(golden.main())
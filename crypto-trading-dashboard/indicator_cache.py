@@ -0,0 +1,261 @@
+# indicator_cache.py — 一轮信号计算内共享的指标缓存
+# key = (symbol, timeframe, 帧标识(长度/首根/末根时间/末根收盘), 指标 spec)
+# 紧凑模式（compact=True，默认关闭）：float64 数组的历史部分以 float32 存放，最后 EXACT_TAIL 根仍存 float64。
+#   实时路径（last_only）的交叉/阈值判断只看最后两根，结果与 float64 完全一致；
+#   整段计算时更早的K线有 ~6e-8 的相对误差。若舍入会改变同一指标各线之间、或线与收盘价之间的大小关系
+#   （交叉判断的依据，如 StochRSI 的 K/D 饱和时几乎重合），该项整体保留 float64；
+#   不同指标之间（如快慢 EMA）几乎重合处的整段交叉仍可能不同，可用 validate_compact 核对。
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import numpy as np
+import pandas as pd
+
+
+EXACT_TAIL = 2  # 交叉判断需要最后两根
+_F32 = np.finfo(np.float32)
+
+
+class IndicatorCache:
+    """线程安全的 LRU 指标缓存；只存 numpy 数组（不带 index），取出时按调用方的 index 重新包装"""
+
+    def __init__(self, max_entries: int = 4096, compact: bool = False):
+        self.max_entries = int(max_entries)
+        self.compact = bool(compact)
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item
+
+    def put(self, key, item):
+        with self._lock:
+            old = self._data.get(key)
+            if old is not None:
+                self.nbytes -= _nbytes(old)
+            self._data[key] = item
+            self._data.move_to_end(key)
+            self.nbytes += _nbytes(item)
+            while len(self._data) > self.max_entries:
+                self.nbytes -= _nbytes(self._data.popitem(last=False)[1])
+
+    def keys(self) -> list:
+        with self._lock:
+            return list(self._data)
+
+    def invalidate(self, predicate) -> int:
+        """删除 predicate(key) 为真的条目，返回删除数"""
+        with self._lock:
+            drop = [k for k in self._data if predicate(k)]
+            for k in drop:
+                self.nbytes -= _nbytes(self._data.pop(k))
+            return len(drop)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+            self.nbytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else None,
+                "bytes": self.nbytes,
+                "compact": self.compact,
+            }
+
+
+# 当前作用域：(cache, symbol, tf)；未进入作用域时 cached() 直接计算，不做缓存
+_SCOPE = ContextVar("indicator_scope", default=None)
+
+
+@contextmanager
+def indicator_scope(cache: IndicatorCache, symbol: str, tf: str):
+    """在该作用域内调用的策略共享 cache（按 symbol/tf 区分）"""
+    token = _SCOPE.set((cache, symbol, (tf or "").lower()))
+    try:
+        yield cache
+    finally:
+        _SCOPE.reset(token)
+
+
+def _ts_value(x):
+    try:
+        return int(pd.Timestamp(x).value)
+    except Exception:
+        return x
+
+
+def frame_id(df: pd.DataFrame) -> tuple:
+    """帧标识：长度 + 首/末根时间 + 末根收盘（未收盘K线价格变化时也能失效）"""
+    n = len(df)
+    if n == 0:
+        return (0,)
+    if "timestamp" in df.columns:
+        first, last = df["timestamp"].iloc[0], df["timestamp"].iloc[-1]
+    elif "ts" in df.columns:
+        first, last = df["ts"].iloc[0], df["ts"].iloc[-1]
+    else:
+        first, last = df.index[0], df.index[-1]
+    last_close = float(df["close"].iloc[-1]) if "close" in df.columns else None
+    return (n, _ts_value(first), _ts_value(last), last_close)
+
+
+def _readonly(values, compact=False):
+    # 缓存里的数组与调用方返回值不共享内存，且只读，防止被策略就地修改
+    arr = np.array(values, copy=True)
+    if compact and _compactable(arr):
+        head = arr[:-EXACT_TAIL].astype(np.float32)
+        tail = arr[-EXACT_TAIL:]
+        head.flags.writeable = False
+        tail.flags.writeable = False
+        return ("f32", head, tail)
+    arr.flags.writeable = False
+    return arr
+
+
+def _leaves(value):
+    if isinstance(value, pd.DataFrame):
+        return [value[c].to_numpy() for c in value.columns]
+    if isinstance(value, pd.Series):
+        return [value.to_numpy()]
+    if isinstance(value, tuple):
+        return [a for v in value for a in _leaves(v)]
+    return []
+
+
+def _order_safe(value, ref) -> bool:
+    """float32 舍入后，各线两两之间、各线与 ref（收盘价）之间的 > / < 关系是否全部不变"""
+    lines = [a[:-EXACT_TAIL] for a in _leaves(value) if _compactable(a)]
+    if not lines:
+        return True
+    pairs = [(a, a.astype(np.float32).astype(np.float64)) for a in lines]
+    others = list(pairs)
+    if ref is not None and len(ref) == len(lines[0]) + EXACT_TAIL:
+        r = np.asarray(ref, dtype=np.float64)[:-EXACT_TAIL]
+        others.append((r, r))
+    for i, (a, ra) in enumerate(pairs):
+        for b, rb in others[i + 1:]:
+            if len(b) == len(a) and (np.any((a > b) != (ra > rb)) or np.any((a < b) != (ra < rb))):
+                return False
+    return True
+
+
+def _compactable(arr) -> bool:
+    # 只压缩足够长的 float64 数组；有效值超出 float32 的正规数范围（溢出或变成次正规数）时保留 float64
+    if arr.dtype != np.float64 or arr.ndim != 1 or len(arr) <= EXACT_TAIL:
+        return False
+    mag = np.abs(arr[np.isfinite(arr) & (arr != 0)])
+    return not len(mag) or (mag.max() <= _F32.max and mag.min() >= _F32.tiny)
+
+
+def _restore(arr):
+    if isinstance(arr, tuple):
+        _, head, tail = arr
+        return np.concatenate([head.astype(np.float64), tail])
+    return arr
+
+
+def _nbytes(item) -> int:
+    if isinstance(item, np.ndarray):
+        return item.nbytes
+    if isinstance(item, tuple):
+        return sum(_nbytes(v) for v in item)
+    return 0
+
+
+def _freeze(value, compact=False):
+    if isinstance(value, pd.DataFrame):
+        return ("frame", tuple(value.columns), tuple(_readonly(value[c], compact) for c in value.columns))
+    if isinstance(value, pd.Series):
+        return ("series", value.name, _readonly(value, compact))
+    if isinstance(value, tuple):
+        return ("tuple", tuple(_freeze(v, compact) for v in value))
+    return ("raw", value)
+
+
+def _thaw(item, index):
+    kind = item[0]
+    if kind == "frame":
+        _, cols, arrs = item
+        return pd.DataFrame(dict(zip(cols, map(_restore, arrs))), index=index, columns=list(cols))
+    if kind == "series":
+        return pd.Series(_restore(item[2]), index=index, name=item[1])
+    if kind == "tuple":
+        return tuple(_thaw(v, index) for v in item[1])
+    return item[1]
+
+
+def cached(df: pd.DataFrame, spec: tuple, compute):
+    """
+    读取/计算指标：compute() 返回 Series / DataFrame / 它们的 tuple。
+    spec 需包含指标名与全部参数，如 ("ema", "close", 55)。
+    """
+    scope = _SCOPE.get()
+    if scope is None:
+        return compute()
+    cache, symbol, tf = scope
+    key = (symbol, tf, frame_id(df), spec)
+    item = cache.get(key)
+    if item is None:
+        value = compute()
+        compact = cache.compact and _order_safe(value, df["close"].to_numpy() if "close" in df.columns else None)
+        cache.put(key, _freeze(value, compact))
+        return value
+    return _thaw(item, df.index)
+
+
+def validate_compact(df: pd.DataFrame, symbol: str = "VALIDATE", tf: str = "4h") -> dict:
+    """
+    同一帧上分别用 float64 缓存与紧凑缓存跑全部策略（各跑两遍，第二遍全部命中缓存），对比：
+      · TOP15 / 基础策略 series：整段的 signal；
+      · last_only / 基础策略实时版：最后一根的完整结果（signal/entry/sl/tp）。
+    → {"checked": 对比项数, "diff": [(策略, 模式, 不同的行数), ...]}
+    """
+    from strategies import SERIES_REGISTRY, STRATEGY_REGISTRY
+    from strategies_top15 import REGISTRY as TOP15_REGISTRY
+
+    def _run(compact):
+        cache = IndicatorCache(compact=compact)
+        out = {}
+        for _ in range(2):
+            with indicator_scope(cache, symbol, tf):
+                for name, fn in TOP15_REGISTRY.items():
+                    out[(name, "full")] = fn(df)["signal"].to_numpy()
+                    out[(name, "last_only")] = fn(df, last_only=True).to_numpy(dtype=np.float64)
+                for name, fn in SERIES_REGISTRY.items():
+                    out[(name, "full")] = fn(symbol, df, tf)["signal"].to_numpy()
+                for name, fn in STRATEGY_REGISTRY.items():
+                    out[(name, "last_only")] = fn(symbol, df, tf)
+        return out
+
+    exact, compact = _run(False), _run(True)
+    diff = []
+    for key, a in exact.items():
+        b = compact[key]
+        if isinstance(a, np.ndarray):
+            same = (a == b) | (np.isnan(a) & np.isnan(b)) if a.dtype.kind == "f" else a == b
+            bad = int((~same).sum())
+        else:
+            bad = int(a != b)
+        if bad:
+            diff.append((key[0], key[1], bad))
+    return {"checked": len(exact), "diff": diff}
@@ -0,0 +1,173 @@
+# ohlcv.py — 统一的 OHLCV 容器：入口处规范化一次，之后各模块按引用传递，不再逐次 copy / 类型转换
+# 约定（canonical frame）：
+#   index   : int64 epoch 毫秒，名为 "ts_ms"，严格递增
+#   columns : open / high / low / close / volume，全部 float64，共用一块只读内存（每列连续）
+# iloc 切片（如剔除未收盘K线）得到的是同一块内存上的只读视图，仍满足约定。
+import re
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.frequencies import to_offset
+
+OHLCV_COLUMNS = ["open", "high", "low", "close", "volume"]
+INDEX_NAME = "ts_ms"
+
+_TS_ALIASES = ("ts", "timestamp", "time", "t")
+_COL_ALIASES = {"o": "open", "h": "high", "l": "low", "c": "close", "v": "volume"}
+
+
+def is_canonical(df) -> bool:
+    """结构检查（O(1)）：int64 ts_ms 索引 + 五列 float64"""
+    return (
+        isinstance(df, pd.DataFrame)
+        and df.index.name == INDEX_NAME
+        and df.index.dtype == np.int64
+        and list(df.columns) == OHLCV_COLUMNS
+        and all(dt == np.float64 for dt in df.dtypes)
+    )
+
+
+def _to_epoch_ms(values) -> np.ndarray:
+    s = pd.Series(values)
+    if pd.api.types.is_numeric_dtype(s):
+        return pd.to_numeric(s, errors="coerce").to_numpy(dtype=np.float64)
+    dt = pd.to_datetime(s, errors="coerce", utc=True)  # naive 视为 UTC
+    out = dt.dt.as_unit("ms").astype("int64").to_numpy().astype(np.float64)
+    out[dt.isna().to_numpy()] = np.nan
+    return out
+
+
+def _frame_from_raw(raw) -> pd.DataFrame:
+    if isinstance(raw, pd.DataFrame):
+        df = raw
+        if isinstance(df.index, pd.DatetimeIndex) and not any(a in df.columns for a in _TS_ALIASES):
+            df = df.assign(ts=df.index).reset_index(drop=True)
+        return df.rename(columns=_COL_ALIASES)
+    if isinstance(raw, np.ndarray) and raw.ndim == 2 and raw.shape[1] >= 6:
+        return pd.DataFrame(raw[:, :6], columns=["ts"] + OHLCV_COLUMNS)
+    if isinstance(raw, (list, tuple)):
+        if not raw:
+            return pd.DataFrame(columns=["ts"] + OHLCV_COLUMNS)
+        if isinstance(raw[0], (list, tuple)) and len(raw[0]) >= 6:
+            return pd.DataFrame([r[:6] for r in raw], columns=["ts"] + OHLCV_COLUMNS)
+        if isinstance(raw[0], dict):
+            return pd.DataFrame(raw).rename(columns=_COL_ALIASES)
+    raise ValueError(f"Unsupported OHLCV format: {type(raw)} -> cannot normalize")
+
+
+def canonical_ohlcv(raw) -> pd.DataFrame:
+    """
+    接受 ccxt 的 [[ts, o, h, l, c, v], ...]、dict 列表、带 ts/timestamp 列或 DatetimeIndex 的 DataFrame，
+    返回 canonical frame。数值列强制 float64，OHLC 缺失的行丢弃，按时间排序并去重（保留先出现的）。
+    """
+    if is_canonical(raw):
+        return raw
+    df = _frame_from_raw(raw)
+    ts_col = next((a for a in _TS_ALIASES if a in df.columns), None)
+    if ts_col is None:
+        raise KeyError("OHLCV missing timestamp column")
+    n = len(df)
+    ts = _to_epoch_ms(df[ts_col].to_numpy()) if n else np.empty(0)
+    vals = np.empty((n, len(OHLCV_COLUMNS)), dtype=np.float64, order="F")
+    for j, col in enumerate(OHLCV_COLUMNS):
+        if col in df.columns:
+            vals[:, j] = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=np.float64)
+        else:
+            vals[:, j] = np.nan
+    keep = np.isfinite(ts) & ~np.isnan(vals[:, :4]).any(axis=1)
+    ts, vals = ts[keep].astype(np.int64), vals[keep]
+    order = np.argsort(ts, kind="stable")
+    ts, vals = ts[order], vals[order]
+    if len(ts) > 1:
+        first = np.r_[True, ts[1:] != ts[:-1]]
+        ts, vals = ts[first], vals[first]
+    return _wrap(ts, np.asfortranarray(vals))
+
+
+def _wrap(ts: np.ndarray, vals: np.ndarray) -> pd.DataFrame:
+    vals.flags.writeable = False
+    index = pd.Index(ts, dtype=np.int64, name=INDEX_NAME)
+    return pd.DataFrame(vals, index=index, columns=OHLCV_COLUMNS, copy=False)
+
+
+def ensure_canonical(raw) -> pd.DataFrame:
+    """已是 canonical 时原样返回（不复制），否则规范化一次"""
+    return raw if is_canonical(raw) else canonical_ohlcv(raw)
+
+
+def merge_ohlcv(old, new, keep: int = None):
+    """
+    old 末尾接上 new（重叠部分以 new 为准，如更新过的未收盘K线），保留最后 keep 根 → canonical frame；
+    new 的首根晚于 old 的末根（两段之间可能缺K线）或 new 的末根早于 old 的末根时返回 None，由调用方整段重新拉取。
+    """
+    old, new = ensure_canonical(old), ensure_canonical(new)
+    if not len(new):
+        return old
+    if not len(old):
+        return new.iloc[-keep:] if keep else new
+    t_old, t_new = ts_ms(old), ts_ms(new)
+    if t_new[0] > t_old[-1] or t_new[-1] < t_old[-1]:
+        return None
+    cut = int(np.searchsorted(t_old, t_new[0]))
+    ts = np.concatenate([t_old[:cut], t_new])
+    vals = np.vstack([old.to_numpy()[:cut], new.to_numpy()])
+    if keep:
+        ts, vals = ts[-keep:], vals[-keep:]
+    return _wrap(ts, np.asfortranarray(vals))
+
+
+def validate_ohlcv(df) -> None:
+    if not isinstance(df, pd.DataFrame):
+        raise TypeError(f"OHLCV must be DataFrame, got {type(df)}")
+    miss = set(OHLCV_COLUMNS) - set(df.columns)
+    if miss:
+        raise KeyError(f"OHLCV missing columns: {sorted(miss)}")
+    if not is_canonical(df):
+        raise ValueError("OHLCV is not canonical (int64 ts_ms index + float64 columns); use canonical_ohlcv()")
+
+
+def ts_ms(df: pd.DataFrame) -> np.ndarray:
+    return df.index.to_numpy()
+
+
+def bar_times(df: pd.DataFrame) -> pd.DatetimeIndex:
+    """K线时间（tz-naive UTC），与旧版 to_ohlcv_df 的 ts 列一致"""
+    return pd.DatetimeIndex(pd.to_datetime(df.index.to_numpy(), unit="ms"))
+
+
+def bar_time(df: pd.DataFrame, i: int) -> pd.Timestamp:
+    return pd.Timestamp(int(df.index[i]), unit="ms")
+
+
+_ANCHOR_RE = re.compile(r"^\s*(\d*)\s*([A-Za-z]+)\s*$")
+# 固定频率单位（小写）→ pandas 现行别名；m 按K线周期的习惯为分钟（1M / MS / ME 为月，见下）
+_FIXED_UNITS = {"ms": "ms", "s": "s", "sec": "s", "min": "min", "m": "min", "t": "min", "h": "h", "d": "D"}
+_MONTH_UNITS = ("M", "MS", "ME")
+
+
+def anchor_step_ms(anchor: str = "D"):
+    """
+    固定频率锚点（D / 4h / 4H / 15min / 15m …，大小写不限）的步长毫秒数；
+    W / M 等非固定频率（floor 不支持）与认不出的写法返回 None。先按单位表归一成 pandas 现行别名再交给 to_offset，
+    不走已弃用的别名解析。
+    """
+    m = _ANCHOR_RE.match(anchor) if isinstance(anchor, str) else None
+    if m is None or m.group(2) in _MONTH_UNITS:
+        return None
+    unit = _FIXED_UNITS.get(m.group(2).lower())
+    count = int(m.group(1) or 1)
+    if unit is None or count <= 0:
+        return None
+    return max(to_offset(f"{count}{unit}").nanos // 1_000_000, 1)
+
+
+def anchor_keys(ts, anchor: str = "D") -> np.ndarray:
+    """
+    锚点周期编号（int64，同一周期相同），与 DatetimeIndex.floor(anchor) 的分组一致：从 epoch 起按固定步长切分。
+    ts 为 epoch 毫秒数组或 DatetimeIndex；非固定频率整段视为一个周期。
+    """
+    if isinstance(ts, pd.DatetimeIndex):
+        ts = ts.as_unit("ms").asi8
+    ts = np.asarray(ts, dtype=np.int64)
+    step = anchor_step_ms(anchor)
+    return np.zeros(len(ts), dtype=np.int64) if step is None else ts // step
@@ -0,0 +1,133 @@
+# planner.py — 策略执行规划：读取各注册表声明的元数据（所需历史 / 指标依赖 / 相对成本），
+# 算出最少需要拉取的K线数、合并各策略共用的指标、按成本从低到高排序，并剔除历史不足无法运行的策略。
+import inspect
+
+from strategies import STRATEGY_META, STRATEGY_REGISTRY
+from strategies_top15 import META as TOP15_META
+from strategies_top15 import REGISTRY as TOP15_REGISTRY
+
+# 指标 spec → 出现第一个有效值所需的K线数（与 ta_kernels / pandas 的 NaN 前缀一致）。
+# pandas_ta 的 rma 不设 min_periods：RSI 从第 2 根起有值，ATR 以前 n 根 TR 均值为种子（第 n 根），ADX 随 ATR 同时就绪。
+LOOKBACK = {
+    # strategies_top15（pandas_ta 口径）
+    "ta.ema": lambda src, n: n,
+    "ta.rsi": lambda src, n: 2,
+    "ta.atr": lambda n: n,
+    "ta.adx": lambda n: n,
+    "ta.bbands": lambda n, std: n,
+    "ta.macd": lambda fast, slow, sig: slow + sig - 1,
+    "ta.donchian": lambda n: n,
+    "ta.supertrend": lambda n, mult: n + 1,  # 方向初值为 1，ATR 就绪前不会翻转
+    "ta.kc": lambda n, mult: n,
+    "ta.psar": lambda af, afmax: 2,
+    "ta.stochrsi": lambda rsi_len, k, d: rsi_len + k + d - 1,
+    "ta.cci": lambda n: n,
+    "ta.ha": lambda: 1,
+    "hl_mid": lambda n: n,
+    "vwap": lambda anchor: 1,
+    # strategies（基础策略）
+    "ewm_span": lambda src, n: 1,
+    "sma": lambda src, n: n,
+    "atr_sma": lambda n: n,
+    "adx": lambda n: n,
+    "macd_hist": lambda fast, slow, sig: 1,
+}
+
+
+def _registry(name):
+    if name in STRATEGY_REGISTRY:
+        return STRATEGY_REGISTRY[name], STRATEGY_META.get(name)
+    if name in TOP15_REGISTRY:
+        return TOP15_REGISTRY[name], TOP15_META.get(name)
+    return None, None
+
+
+def strategy_params(name: str, params: dict = None) -> dict:
+    """策略参数：函数签名默认值 + 覆盖值（基础策略没有可调参数，返回 {}）"""
+    fn, _ = _registry(name)
+    if fn is None or name in STRATEGY_REGISTRY:
+        return {}
+    merged = {k: v.default for k, v in inspect.signature(fn).parameters.items()
+              if v.default is not v.empty and k != "last_only"}
+    merged.update(params or {})
+    return merged
+
+
+def _resolve(spec, params):
+    return tuple(params.get(a, a) if isinstance(a, str) else a for a in spec)
+
+
+def indicators(name: str, params: dict = None, optional: bool = True) -> list:
+    """策略依赖的指标 spec（参数名已替换成取值）"""
+    _, meta = _registry(name)
+    if meta is None:
+        return []
+    p = strategy_params(name, params)
+    specs = list(meta.get("indicators", []))
+    if optional:
+        specs += meta.get("optional", [])
+    return [_resolve(s, p) for s in specs]
+
+
+def warmup(name: str, params: dict = None) -> int:
+    """
+    最少K线数：显式声明的 warmup 与各必需指标的 NaN 前缀取大者。
+    少于这个长度时最后一根总有必需指标为 NaN，策略不可能给出完整信号（含止损/止盈）。
+    """
+    _, meta = _registry(name)
+    if meta is None:
+        raise KeyError(f"unknown strategy: {name}")
+    need = 0
+    for spec in indicators(name, params, optional=False):
+        rule = LOOKBACK.get(spec[0])
+        if rule is None:
+            raise KeyError(f"{name}: no lookback rule for indicator {spec[0]!r}")
+        need = max(need, rule(*spec[1:]))
+    return max(need, int(meta.get("warmup", 0)))
+
+
+def cost(name: str) -> float:
+    _, meta = _registry(name)
+    return float((meta or {}).get("cost", 1))
+
+
+def plan(names, bars: int = None, params: dict = None) -> dict:
+    """
+    names  : 要运行的策略（保持调用方给的相对顺序作为同成本时的次序）
+    bars   : 可用的已收盘K线数；给出时剔除历史不足的策略
+    params : {策略名: 参数覆盖}
+    → {
+        "order":      可运行的策略，按 cost 从低到高,
+        "skipped":    {策略名: 原因},
+        "warmup":     {策略名: 最少K线数},
+        "history":    全部已知策略都能运行所需的最少K线数,
+        "indicators": {指标 spec: [用到它的策略...]}（去重后的指标清单）,
+      }
+    """
+    params = params or {}
+    runnable, skipped, need = [], {}, {}
+    for name in dict.fromkeys(names):
+        fn, meta = _registry(name)
+        if fn is None:
+            skipped[name] = "unknown strategy"
+            continue
+        if meta is None:
+            skipped[name] = "no metadata"
+            continue
+        need[name] = warmup(name, params.get(name))
+        if bars is not None and bars < need[name]:
+            skipped[name] = f"needs {need[name]} bars, have {bars}"
+            continue
+        runnable.append(name)
+    order = [n for _, _, n in sorted((cost(n), i, n) for i, n in enumerate(runnable))]
+    shared = {}
+    for name in order:
+        for spec in indicators(name, params.get(name)):
+            shared.setdefault(spec, []).append(name)
+    return {
+        "order": order,
+        "skipped": skipped,
+        "warmup": need,
+        "history": max(need.values(), default=0),
+        "indicators": shared,
+    }
@@ -0,0 +1,280 @@
+# preview.py — 未收盘K线的盘中试算（pending 信号）
+# 每个币种维护一份“已收盘”的流式指标状态（streaming.py）：首次用历史播种，之后每收一根新K线只推进一步；
+# 每次刷新行情时把实时价格并进正在形成的K线，复制状态（fork）后试算这一根，不写回已收盘状态。
+# 条件与 strategies_top15 的 last_only 路径相同（前一根 = 已收盘末根，当前根 = 正在形成的K线），
+# 参数取策略函数的默认值。supertrend / psar_trend 的递推用 seq_kernels 的 *_resume 逐根接着算（与整段计算逐位一致）；
+# high==low / 极差为 0 时的 epsilon 流式只能逐根判断（见 streaming.TrueRange），与所有策略的止损止盈 ATR 口径相同。
+import inspect
+import threading
+
+import strategies_top15 as T
+from ohlcv import OHLCV_COLUMNS, ts_ms
+from streaming import (ADX, CCI, MACD, NAN, PSAR, RSI, TAEMA, AnchoredVWAP, BBands, Donchian, HeikinAshi, Keltner,
+                       StochRSI, Supertrend, WilderATR)
+
+# 指标 key → 流式指标
+_FACTORIES = {
+    "atr": WilderATR,
+    "ema": TAEMA,
+    "rsi": RSI,
+    "adx": ADX,
+    "macd": MACD,
+    "bb": BBands,
+    "kc": Keltner,
+    "dc": lambda n: Donchian(n, n),
+    "cci": CCI,
+    "ha": HeikinAshi,
+    "vwap": AnchoredVWAP,
+    "st": Supertrend,
+    "psar": PSAR,
+    "stochrsi": StochRSI,
+}
+
+
+def _up(a0, a1, b0, b1) -> bool:
+    # 与 strategies_top15._xover 的最后两根口径一致（含 NaN 时为 False）
+    return a1 > b1 and a0 <= b0
+
+
+def _down(a0, a1, b0, b1) -> bool:
+    return a1 < b1 and a0 >= b0
+
+
+def _fmax(a, b):
+    return b if a != a else a if b != b else max(a, b)
+
+
+def _fmin(a, b):
+    return b if a != a else a if b != b else min(a, b)
+
+
+def _cloud(d):
+    # Ichimoku：(tenkan, kijun, 云顶, 云底)
+    its, iks, isb = d[0].value, d[1].value, d[2].value
+    isa = (its + iks) / 2.0
+    return its, iks, _fmax(isa, isb), _fmin(isa, isb)
+
+
+# 策略 → (用到的指标 key, 条件)。条件 (p, c, pb, cb, k) → (long, short, tp 覆盖或 None)：
+# p / c 为前一根 / 当前根的指标列表（顺序同 key），pb / cb 为对应的K线 dict，k 为策略参数
+def _ema_adx(p, c, pb, cb, k):
+    up = _up(p[0].value, c[0].value, p[1].value, c[1].value)
+    dn = _down(p[0].value, c[0].value, p[1].value, c[1].value)
+    strong = c[2].value >= k["adx_min"]
+    return up and strong, dn and strong, None
+
+
+def _macd(p, c, pb, cb, k):
+    # strat_macd 按 (MACD, MACDh, MACDs) 的顺序解包为 m, s, h：交叉看 MACD 与柱，确认看信号线
+    m0, m1, s0, s1 = p[0].value, c[0].value, p[0].hist, c[0].hist
+    return _up(m0, m1, s0, s1) and c[0].signal > 0, _down(m0, m1, s0, s1) and c[0].signal < 0, None
+
+
+def _rsi_reversion(p, c, pb, cb, k):
+    close, ema = cb["close"], c[1].value
+    long = close > ema and _up(p[0].value, c[0].value, k["low"], k["low"])
+    short = close < ema and _down(p[0].value, c[0].value, k["high"], k["high"])
+    return long, short, None
+
+
+def _bb_mean(p, c, pb, cb, k):
+    close, bb, rsi = cb["close"], c[0], c[1].value
+    long = close < bb.lower and rsi < 40
+    short = close > bb.upper and rsi > 60
+    return long, short, bb.value if long or short else None
+
+
+def _bb_squeeze(p, c, pb, cb, k):
+    bb = c[0]
+    narrow = (bb.upper - bb.lower) / bb.value < k["bw_th"]
+    long = narrow and _up(pb["close"], cb["close"], p[0].upper, bb.upper)
+    short = narrow and _down(pb["close"], cb["close"], p[0].lower, bb.lower)
+    return long, short, None
+
+
+def _channel_break(p, c, pb, cb, k):
+    # donchian / keltner_break：收盘上穿上轨 / 下穿下轨
+    return (_up(pb["close"], cb["close"], p[0].upper, c[0].upper),
+            _down(pb["close"], cb["close"], p[0].lower, c[0].lower), None)
+
+
+def _ichimoku(p, c, pb, cb, k):
+    its0, iks0, _, _ = _cloud(p)
+    its1, iks1, top, bot = _cloud(c)
+    long = _up(its0, its1, iks0, iks1) and cb["close"] > top
+    short = _down(its0, its1, iks0, iks1) and cb["close"] < bot
+    return long, short, None
+
+
+def _cci(p, c, pb, cb, k):
+    v0, v1 = p[0].value, c[0].value
+    return v1 < k["lo"] and _up(v0, v1, 0, 0), v1 > k["hi"] and _down(v0, v1, 0, 0), None
+
+
+def _adx_di(p, c, pb, cb, k):
+    strong = c[0].value >= k["adx_min"]
+    return (_up(p[0].dmp, c[0].dmp, p[0].dmn, c[0].dmn) and strong,
+            _down(p[0].dmp, c[0].dmp, p[0].dmn, c[0].dmn) and strong, None)
+
+
+def _heikin_ema(p, c, pb, cb, k):
+    close, ema = cb["close"], c[1].value
+    long = _up(p[0].value, c[0].value, p[0].open, c[0].open) and close > ema
+    short = _down(p[0].value, c[0].value, p[0].open, c[0].open) and close < ema
+    return long, short, None
+
+
+def _vwap(p, c, pb, cb, k):
+    return (_up(pb["close"], cb["close"], p[0].value, c[0].value),
+            _down(pb["close"], cb["close"], p[0].value, c[0].value), None)
+
+
+def _supertrend(p, c, pb, cb, k):
+    d0, d1 = p[0].value, c[0].value
+    return _up(d0, d1, 0, 0), _down(d0, d1, 0, 0), None
+
+
+def _psar(p, c, pb, cb, k):
+    # 同 strat_psar：收盘与 PSARl（多头 SAR）交叉 + EMA 过滤
+    close, ema = cb["close"], c[1].value
+    long = _up(pb["close"], close, p[0].value, c[0].value) and close > ema
+    short = _down(pb["close"], close, p[0].value, c[0].value) and close < ema
+    return long, short, None
+
+
+def _stochrsi(p, c, pb, cb, k):
+    k0, k1, d0, d1 = p[0].value, c[0].value, p[0].d, c[0].d
+    return _up(k0, k1, d0, d1) and k1 < k["low"], _down(k0, k1, d0, d1) and k1 > k["high"], None
+
+
+RULES = {
+    "ema_adx": (lambda k: [("ema", k["fast"]), ("ema", k["slow"]), ("adx", k["adx_len"])], _ema_adx),
+    "macd_plus": (lambda k: [("macd", k["fast"], k["slow"], k["sig"])], _macd),
+    "rsi_reversion": (lambda k: [("rsi", k["rsi_len"]), ("ema", k["ema_len"])], _rsi_reversion),
+    "bb_mean": (lambda k: [("bb", k["length"], k["std"]), ("rsi", 14)], _bb_mean),
+    "bb_squeeze": (lambda k: [("bb", k["length"], k["std"])], _bb_squeeze),
+    "donchian": (lambda k: [("dc", k["length"])], _channel_break),
+    "keltner_break": (lambda k: [("kc", k["length"], k["mult"])], _channel_break),
+    "ichimoku_kijun": (lambda k: [("dc", k["tenkan"]), ("dc", k["kijun"]), ("dc", k["senkou"])], _ichimoku),
+    "cci_reversion": (lambda k: [("cci", k["length"])], _cci),
+    "adx_di": (lambda k: [("adx", k["length"])], _adx_di),
+    "heikin_ema": (lambda k: [("ha",), ("ema", k["ema_len"])], _heikin_ema),
+    "vwap_pullback": (lambda k: [("vwap", k["anchor"])], _vwap),
+    "supertrend": (lambda k: [("st", k["length"], k["multiplier"])], _supertrend),
+    "psar_trend": (lambda k: [("psar", k["af"], k["afmax"]), ("ema", k["ema_len"])], _psar),
+    # strat_stochrsi 的随机窗口取 rsi_len（stoch_len 未使用），这里保持一致
+    "stochrsi": (lambda k: [("stochrsi", k["rsi_len"], k["rsi_len"], k["k"], k["d"])], _stochrsi),
+}
+
+_ATR = ("atr", 14)  # _pack 的止损止盈距离（ta.atr 14）
+
+
+def _defaults(name) -> dict:
+    fn = T.REGISTRY[name]
+    return {k: v.default for k, v in inspect.signature(fn).parameters.items() if v.default is not inspect.Parameter.empty}
+
+
+def _bars(df, start=0):
+    ts = ts_ms(df)[start:]
+    cols = [df[c].to_numpy(dtype=float)[start:].tolist() for c in OHLCV_COLUMNS]
+    return [dict(zip(OHLCV_COLUMNS, row), ts_ms=int(t)) for t, *row in zip(ts.tolist(), *cols)]
+
+
+class _Committed:
+    """一个币种已收盘K线上的指标状态"""
+
+    def __init__(self, keys, df):
+        self.keys = tuple(keys)
+        self.indicators = {key: _FACTORIES[key[0]](*key[1:]) for key in self.keys}
+        self.last_ts = None
+        self.last_bar = None
+        self.advance(df, 0)
+
+    def advance(self, df, start):
+        for bar in _bars(df, start):
+            for ind in self.indicators.values():
+                ind.update(bar)
+            self.last_bar = bar
+        if self.last_bar is not None:
+            self.last_ts = self.last_bar["ts_ms"]
+
+
+class PreviewBook:
+    """
+    names 中可试算的策略（见 RULES）的 pending 信号。sync() 用已收盘K线推进状态（同一批K线不重复推进，
+    新收盘的K线逐根追加，时间轴对不上时重播种），preview() 在正在形成的K线上试算。
+    """
+
+    def __init__(self, names=None):
+        names = list(T.REGISTRY) if names is None else list(names)
+        self.names = [n for n in names if n in RULES and n in T.REGISTRY]
+        self.unsupported = [n for n in names if n not in self.names]
+        self.params = {n: _defaults(n) for n in self.names}
+        self.keys = {n: RULES[n][0](self.params[n]) for n in self.names}
+        self._all = sorted({_ATR, *(key for n in self.names for key in self.keys[n])}, key=repr)
+        self._lock = threading.Lock()
+        self._state = {}  # symbol -> _Committed
+
+    def sync(self, symbol, df):
+        """df：该币种已收盘K线（canonical）"""
+        if df is None or not len(df):
+            return None
+        ts = ts_ms(df)
+        with self._lock:
+            st = self._state.get(symbol)
+            if st is not None and st.last_ts == int(ts[-1]):
+                return st
+            if st is not None and st.last_ts is not None:
+                i = int(ts.searchsorted(st.last_ts))
+                if i < len(ts) and int(ts[i]) == st.last_ts:
+                    st.advance(df, i + 1)
+                    return st
+            st = self._state[symbol] = _Committed(self._all, df)
+            return st
+
+    def preview(self, symbol, bar, names=None) -> dict:
+        """
+        bar：正在形成的K线 dict（open/high/low/close/volume/ts_ms），names 只试算其中的策略
+        → {策略名: {"signal", "entry", "sl", "tp"}}；该币种尚未 sync 或 bar 不晚于已收盘末根时为 {}
+        """
+        with self._lock:
+            st = self._state.get(symbol)
+            if st is None or st.last_bar is None or int(bar["ts_ms"]) <= st.last_ts:
+                return {}
+            # 试算在锁内完成：已收盘状态作为“前一根”读取时不会被 sync 推进
+            prev = st.indicators
+            cur = {key: ind.fork() for key, ind in prev.items()}
+            for ind in cur.values():
+                ind.update(bar)
+            return {name: self._evaluate(name, prev, cur, st.last_bar, bar) for name in self.names
+                    if names is None or name in names}
+
+    def _evaluate(self, name, prev, cur, last_bar, bar) -> dict:
+        # 同 strategies_top15._pack_last
+        keys, rule = self.keys[name], RULES[name][1]
+        k = self.params[name]
+        long, short, tp = rule([prev[key] for key in keys], [cur[key] for key in keys], last_bar, bar, k)
+        atr, entry = cur[_ATR].value, float(bar["close"])
+        sig, sl, tp_ = 0, NAN, NAN
+        if long:
+            sig, sl, tp_ = 1, bar["low"] - atr * k["atr_mult"], entry + atr * k["rr"]
+        elif short:
+            sig, sl, tp_ = -1, bar["high"] + atr * k["atr_mult"], entry - atr * k["rr"]
+        if sig and tp is not None:
+            tp_ = tp
+        return {"signal": sig, "entry": entry, "sl": sl, "tp": tp_}
+
+    def pending(self, frames: dict, forming: dict, names=None) -> dict:
+        """
+        frames: {symbol: 已收盘K线}，forming: {symbol: 正在形成的K线 dict}，names 同 preview()
+        → {symbol: {策略名: {...}}}（只含 signal 非 0 的策略）
+        """
+        out = {}
+        for symbol, bar in forming.items():
+            df = frames.get(symbol)
+            if df is None or self.sync(symbol, df) is None:
+                continue
+            hits = {n: r for n, r in self.preview(symbol, bar, names).items() if r["signal"]}
+            if hits:
+                out[symbol] = hits
+        return out
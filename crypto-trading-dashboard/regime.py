@@ -0,0 +1,151 @@
+# regime.py — 市场形态（趋势上行 / 趋势下行 / 震荡）分类与按形态挑选策略
+# 时间轴相同的币种用 strategies_batch.build_panels 堆成 Panel，指标（ta.adx / ta.atr / ta.bbands / ta.ema）
+# 按整张矩阵一次算完；时间轴对不齐的币种走 strategies_top15 的带缓存 helper（与策略共用同一份缓存）。
+# 各币种最后一根的特征拼成数组后一次性按 RULES 分类；同一批K线（各币种末根不变）上的结果直接复用。
+# 形态 → 策略类型见 REGIME_FAMILIES，策略类型取自 STRATEGY_META / META 的 family。
+import threading
+
+import numpy as np
+
+import strategies_batch as B
+import strategies_top15 as T
+from indicator_cache import frame_id, indicator_scope
+from strategies import STRATEGY_META
+from strategies_top15 import META as TOP15_META
+
+REGIMES = ("trend_up", "trend_down", "range")
+
+# 分类阈值：ADX 不低于 adx_trend 且 EMA 在 slope_bars 根内的位移不小于 slope_atr 个 ATR 视为趋势，
+# 方向由 EMA 斜率给出且需与 +DI/-DI 一致；否则为震荡。布林带宽% 小于 squeeze_kc × ATR%
+# （布林带收进 1.5 倍 ATR 的肯特纳通道，即波动收敛）时不论 ADX 一律为震荡。指标不足时为 unknown。
+RULES = {
+    "adx_len": 14,
+    "atr_len": 14,
+    "bb_len": 20,
+    "bb_std": 2.0,
+    "ema_len": 50,
+    "slope_bars": 5,
+    "adx_trend": 22.0,
+    "slope_atr": 0.5,
+    "squeeze_kc": 3.0,
+}
+
+# 形态 → 适用的策略类型（unknown 不做筛选）
+REGIME_FAMILIES = {
+    "trend_up": ("trend", "breakout"),
+    "trend_down": ("trend", "breakout"),
+    "range": ("reversion",),
+}
+
+
+def strategies_for(regime: str, names=None) -> list:
+    """适用于该形态的策略（保持 names 的顺序；names 缺省为全部已注册策略）；unknown 返回全部"""
+    meta = {**STRATEGY_META, **TOP15_META}
+    names = list(meta) if names is None else list(names)
+    families = REGIME_FAMILIES.get(regime)
+    if families is None:
+        return names
+    return [n for n in names if meta.get(n, {}).get("family") in families]
+
+
+def _last(x, back=0):
+    a = np.asarray(x, dtype=np.float64)
+    return float(a[-1 - back]) if len(a) > back else np.nan
+
+
+def _col(x, back=0):
+    """(symbols × bars) 矩阵倒数第 back+1 列"""
+    a = np.asarray(x, dtype=np.float64)
+    return a[:, -1 - back] if a.shape[-1] > back else np.full(a.shape[0], np.nan)
+
+
+def _features(last, close, adx, dmp, dmn, atr, lower, mid, upper, ema, slope_bars):
+    """last(x, back) 取最后一根（单币种为标量、面板为各行的列）"""
+    a = last(atr)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return {
+            "adx": last(adx),
+            "dmp": last(dmp),
+            "dmn": last(dmn),
+            "atrp": a / last(close) * 100.0,
+            "bbw": (last(upper) - last(lower)) / last(mid) * 100.0,
+            "slope": (last(ema) - last(ema, slope_bars)) / a,
+        }
+
+
+def features(df, rules=None) -> dict:
+    """单个币种最后一根的 adx / dmp / dmn / atrp（ATR%）/ bbw（布林带宽%）/ slope（EMA 位移，以 ATR 计）"""
+    r = {**RULES, **(rules or {})}
+    return _features(_last, df["close"], *T._adx(df, r["adx_len"]), T._atr(df, r["atr_len"]),
+                     *T._bbands(df, r["bb_len"], r["bb_std"]), T._ema(df, r["ema_len"]), r["slope_bars"])
+
+
+def panel_features(panel, rules=None) -> dict:
+    """Panel 上各币种最后一根的特征（与 features 逐币种计算一致）→ {symbol: features}"""
+    r = {**RULES, **(rules or {})}
+    cols = _features(_col, panel.close, *B._adx(panel, r["adx_len"]), B._atr(panel, r["atr_len"]),
+                     *B._bbands(panel, r["bb_len"], r["bb_std"]), B._ema(panel, r["ema_len"]), r["slope_bars"])
+    return {s: {k: float(v[i]) for k, v in cols.items()} for i, s in enumerate(panel.symbols)}
+
+
+def frames_features(frames: dict, rules=None, cache=None, tf: str = "4h") -> dict:
+    """{symbol: df} → {symbol: features}；能对齐时间轴的按 Panel 一次算，其余逐币种（cache 为 IndicatorCache 时走缓存）"""
+    panels, leftovers = B.build_panels(frames)
+    feats = {}
+    for panel in panels:
+        feats.update(panel_features(panel, rules))
+    for s in leftovers:
+        if cache is None:
+            feats[s] = features(frames[s], rules)
+        else:
+            with indicator_scope(cache, s, tf):
+                feats[s] = features(frames[s], rules)
+    return {s: feats[s] for s in frames}
+
+
+def classify(feats: dict, rules=None) -> dict:
+    """{symbol: features} → {symbol: 形态}；全部币种按数组一次判定"""
+    r = {**RULES, **(rules or {})}
+    symbols = list(feats)
+    col = {k: np.array([feats[s][k] for s in symbols], dtype=np.float64)
+           for k in ("adx", "dmp", "dmn", "atrp", "bbw", "slope")}
+    known = np.logical_and.reduce([np.isfinite(v) for v in col.values()])
+    squeeze = col["bbw"] < r["squeeze_kc"] * col["atrp"]
+    trending = known & ~squeeze & (col["adx"] >= r["adx_trend"]) & (np.abs(col["slope"]) >= r["slope_atr"])
+    up = trending & (col["slope"] > 0) & (col["dmp"] > col["dmn"])
+    down = trending & (col["slope"] < 0) & (col["dmn"] > col["dmp"])
+    label = np.where(up, "trend_up", np.where(down, "trend_down", np.where(known, "range", "unknown")))
+    return dict(zip(symbols, label.tolist()))
+
+
+class RegimeEngine:
+    """
+    按 tf 缓存最近一次的特征与形态；各币种的K线帧（长度/首末根/末根收盘）都没变时直接复用。
+    时间轴对齐的币种按 Panel 批量计算；cache 为 IndicatorCache 时其余币种的指标走该缓存（与信号计算共用）。
+    """
+
+    def __init__(self, cache=None, rules=None):
+        self.cache = cache
+        self.rules = {**RULES, **(rules or {})}
+        self._lock = threading.Lock()
+        self._last = {}  # tf -> (key, (features, labels))
+
+    def regimes(self, frames: dict, tf: str = "4h", names=None) -> dict:
+        """
+        frames: {symbol: 已剔除未收盘K线的 OHLCV DataFrame}
+        → {symbol: {"regime", "features", "strategies"（适用于该形态的策略，按 names 顺序）}}
+        """
+        tf = (tf or "").lower()
+        key = tuple(sorted((s, frame_id(df)) for s, df in frames.items()))
+        with self._lock:
+            hit = self._last.get(tf)
+        if hit is not None and hit[0] == key:
+            feats, labels = hit[1]
+        else:
+            feats = frames_features(frames, self.rules, self.cache, tf)
+            labels = classify(feats, self.rules)
+            with self._lock:
+                self._last[tf] = (key, (feats, labels))
+        # 形态 → 策略只是查表，不进缓存（策略元数据热加载后立即生效）
+        return {s: {"regime": labels[s], "features": feats[s], "strategies": strategies_for(labels[s], names)}
+                for s in frames}
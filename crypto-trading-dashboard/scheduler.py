@@ -0,0 +1,224 @@
+# scheduler.py — 按K线收盘驱动的信号预计算
+# 信号的输入只在K线收盘时变化：后台线程在各周期每根K线收盘 + settle 秒后醒来，刷新K线、算一次信号，
+# 把结果发布成不可变快照（响应体预先编码好）；接口只读最新快照，响应耗时与轮询的客户端数量无关。
+# K线时间按 UTC 对齐：4h / 1d 从 epoch 起按步长切分，1w 从周一 00:00 起（与交易所K线一致）。
+import json
+import threading
+import time
+from datetime import datetime
+from types import MappingProxyType
+
+from ohlcv import anchor_step_ms
+
+_WEEK_MS = 7 * 86_400_000
+_WEEK_OFFSET_MS = 4 * 86_400_000  # 1970-01-01 是周四，周线（周一开盘）相对 epoch 偏移 4 天
+
+
+def tf_ms(tf: str) -> int:
+    tf = (tf or "").lower()
+    if tf == "1w":
+        return _WEEK_MS
+    step = anchor_step_ms(tf)
+    if step is None:
+        raise ValueError(f"unsupported timeframe: {tf!r}")
+    return step
+
+
+def bar_open_ms(now_ms: int, tf: str) -> int:
+    """now_ms 所在（正在形成的）K线的开盘时间"""
+    step = tf_ms(tf)
+    off = _WEEK_OFFSET_MS if step == _WEEK_MS else 0
+    return (int(now_ms) - off) // step * step + off
+
+
+def next_close_ms(now_ms: int, tf: str) -> int:
+    """now_ms 所在K线的收盘时间（即下一根的开盘时间）"""
+    return bar_open_ms(now_ms, tf) + tf_ms(tf)
+
+
+def last_closed_ms(now_ms: int, tf: str) -> int:
+    """now_ms 时最近一根已收盘K线的开盘时间"""
+    return bar_open_ms(now_ms, tf) - tf_ms(tf)
+
+
+class Snapshot:
+    """一次预计算的结果（不可变）：items 为只读的信号列表，body 为预先编码好的 JSON 响应体"""
+    __slots__ = ("key", "tf", "bar_ms", "version", "computed_at", "elapsed_ms", "items", "body", "etag")
+
+    def __init__(self, key, tf, bar_ms, version, items, elapsed_ms=0.0, extra=None):
+        computed_at = datetime.now()
+        items = tuple(MappingProxyType(dict(it)) for it in items)
+        payload = {
+            "items": [dict(it) for it in items],
+            "timestamp": computed_at.isoformat(),
+            "bar": bar_ms,
+            "version": version,
+            **(extra or {}),
+        }
+        values = {
+            "key": key,
+            "tf": tf,
+            "bar_ms": bar_ms,
+            "version": version,
+            "computed_at": computed_at,
+            "elapsed_ms": float(elapsed_ms),
+            "items": items,
+            "body": json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8"),
+            "etag": f"{key}-{version}",
+        }
+        for k, v in values.items():
+            object.__setattr__(self, k, v)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Snapshot is immutable")
+
+    def info(self) -> dict:
+        return {
+            "tf": self.tf,
+            "bar": self.bar_ms,
+            "version": self.version,
+            "computedAt": self.computed_at.isoformat(),
+            "elapsedMs": round(self.elapsed_ms, 2),
+            "items": len(self.items),
+        }
+
+
+class SnapshotStore:
+    """按 key（如策略配置名）保存最新快照；发布只是替换引用，读方拿到的快照不会再变"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snaps = {}
+        self._version = 0
+
+    def publish(self, key, tf, bar_ms, items, elapsed_ms=0.0, extra=None) -> Snapshot:
+        with self._lock:
+            self._version += 1
+            snap = Snapshot(key, tf, bar_ms, self._version, items, elapsed_ms, extra)
+            self._snaps[key] = snap
+        return snap
+
+    def get(self, key):
+        return self._snaps.get(key)
+
+    def info(self) -> dict:
+        return {k: s.info() for k, s in list(self._snaps.items())}
+
+
+class BarCloseScheduler:
+    """
+    jobs: {tf: fn(tf, bar_ms)}，bar_ms 为刚收盘那根K线的开盘时间。每根K线收盘 + settle 秒后调用一次；
+    返回 False（如交易所还没给出新收盘的K线）或抛异常时 retry 秒后重试，同一根K线最多重试 max_retries 次，
+    之后等下一根收盘。
+    start() 后立即对各周期跑一次（冷启动时发布首个快照），trigger() 让指定周期马上重算（策略变更后）。
+    """
+
+    def __init__(self, jobs: dict, settle: float = 5.0, retry: float = 15.0, max_retries: int = 8, clock=time.time):
+        self.jobs = {tf.lower(): fn for tf, fn in jobs.items()}
+        for tf in self.jobs:
+            tf_ms(tf)
+        self.settle = max(float(settle), 0.0)
+        self.retry = max(float(retry), 1.0)
+        self.max_retries = max(int(max_retries), 0)
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._due = {}  # tf -> 下次运行时间（秒）
+        self._retries = {tf: 0 for tf in self.jobs}  # tf -> 当前这根K线已重试的次数
+        self._stats = {tf: {"runs": 0, "failures": 0, "lastRun": None, "lastOk": None, "lastBar": None,
+                            "lastError": None, "elapsedMs": None} for tf in self.jobs}
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        with self._lock:
+            if self.running:
+                return self
+            now = self.clock()
+            self._due = {tf: now for tf in self.jobs}
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="bar-close-scheduler", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def trigger(self, tf: str = None):
+        """tf 缺省为全部周期"""
+        now = self.clock()
+        with self._lock:
+            for t in ([tf.lower()] if tf else self.jobs):
+                if t in self.jobs:
+                    self._due[t] = now
+        self._wake.set()
+
+    def _next_due(self, tf, now, ok) -> float:
+        close = next_close_ms(now * 1000.0, tf) / 1000.0 + self.settle
+        # 刚收盘还在 settle 内时 next_close 已指向下一根，这里按本根收盘补上
+        recent = bar_open_ms(now * 1000.0, tf) / 1000.0 + self.settle
+        if recent > now:
+            close = recent
+        retries = 0 if ok else self._retries[tf] + 1
+        if retries > self.max_retries:
+            retries = 0
+        self._retries[tf] = retries
+        return min(now + self.retry, close) if retries else close
+
+    def _run(self, tf, now):
+        st = self._stats[tf]
+        bar_ms = last_closed_ms((now - self.settle) * 1000.0, tf)
+        t0 = time.perf_counter()
+        ok = False
+        try:
+            ok = self.jobs[tf](tf, bar_ms) is not False
+            st["lastError"] = None if ok else "bar not available yet"
+        except Exception as e:
+            st["lastError"] = f"{type(e).__name__}: {e}"
+            print(f"[scheduler] {tf} 预计算失败: {e}")
+        st["runs"] += 1
+        st["failures"] += 0 if ok else 1
+        st["lastRun"] = datetime.fromtimestamp(now).isoformat()
+        st["elapsedMs"] = round((time.perf_counter() - t0) * 1000.0, 2)
+        if ok:
+            st["lastOk"], st["lastBar"] = st["lastRun"], bar_ms
+        return ok
+
+    def _loop(self):
+        while not self._stop.is_set():
+            with self._lock:
+                now = self.clock()
+                ready = [tf for tf, due in self._due.items() if due <= now]
+                wait = None if ready else min(self._due.values(), default=now + 60.0) - now
+            if not ready:
+                self._wake.wait(max(wait, 0.0))
+                self._wake.clear()
+                continue
+            for tf in ready:
+                if self._stop.is_set():
+                    return
+                ok = self._run(tf, now)
+                with self._lock:
+                    # 运行期间被 trigger() 的周期保持“立即运行”
+                    if self._due.get(tf, now) <= now:
+                        self._due[tf] = self._next_due(tf, self.clock(), ok)
+
+    def status(self) -> dict:
+        with self._lock:
+            due = dict(self._due)
+        return {
+            "running": self.running,
+            "settleSec": self.settle,
+            "retrySec": self.retry,
+            "maxRetries": self.max_retries,
+            "timeframes": {tf: {**st, "retries": self._retries[tf],
+                                "nextRun": datetime.fromtimestamp(due[tf]).isoformat() if tf in due else None}
+                           for tf, st in self._stats.items()},
+        }
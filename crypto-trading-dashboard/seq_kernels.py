@@ -0,0 +1,248 @@
+# seq_kernels.py — 逐根递推指标（PSAR / Supertrend / Heikin-Ashi / 分组累加）的专用内核
+# 每个递推只写一遍循环体：装了 numba 时 njit 编译、输入为 float64 数组；
+# 没装时原样按纯 Python 执行、输入转成 list（list 下标比 ndarray 标量下标快数倍）。
+# 运算顺序与 ta_kernels 原来的循环（即 pandas_ta）逐位一致。
+# *_run 整段计算并返回 (输出, 状态)；*_resume 用状态接着算新追加的K线，结果与整段重算相同。
+# 状态是普通 dict，可直接 copy / 序列化。只处理一维（单个品种）；二维由 ta_kernels 逐行调用。
+import sys
+
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:  # numba 为可选依赖
+    njit = None
+
+JIT = njit is not None
+_EPS = sys.float_info.epsilon
+NAN = float("nan")
+
+
+def _kernel(fn):
+    return njit(cache=True, nogil=True)(fn) if JIT else fn
+
+
+def _seq(a):
+    a = np.ascontiguousarray(a, dtype=np.float64)
+    return a if JIT else a.tolist()
+
+
+def _buf(n, fill):
+    return np.full(n, fill, dtype=np.float64) if JIT else [fill] * n
+
+
+def _out(*bufs):
+    return tuple(np.asarray(b, dtype=np.float64) for b in bufs)
+
+
+def _same(a, b):
+    return a == b or (a != a and b != b)
+
+
+# ---------- 分组累加（pandas group_cumsum） ----------
+@_kernel
+def _group_cumsum_loop(x, new_group, out):
+    # Kahan 补偿累加，NaN 原样输出且不中断累加；遇到 ±inf 后补偿项为 NaN，后续随之为 NaN（与 pandas 2.2 相同）
+    acc = comp = 0.0
+    for i in range(len(x)):
+        if new_group[i]:
+            acc = comp = 0.0
+        v = x[i]
+        if v != v:
+            continue
+        y = v - comp
+        t = acc + y
+        comp = t - acc - y
+        acc = t
+        out[i] = t
+
+
+def group_cumsum(x, new_group):
+    """一维 x 按组累加，new_group[i] 为真表示第 i 根开始新的一组"""
+    flags = np.ascontiguousarray(new_group, dtype=np.bool_)
+    out = _buf(len(flags), NAN)
+    _group_cumsum_loop(_seq(x), flags if JIT else flags.tolist(), out)
+    return np.asarray(out, dtype=np.float64)
+
+
+# ---------- Supertrend ----------
+@_kernel
+def _supertrend_loop(c, ub, lb, d, trend, long, short, start, prev_d, prev_ub, prev_lb):
+    # ub / lb 原地收紧；prev_* 为上一根的方向与（收紧后的）上下轨
+    for i in range(start, len(c)):
+        if c[i] > prev_ub:
+            di = 1.0
+        elif c[i] < prev_lb:
+            di = -1.0
+        else:
+            di = prev_d
+            if di > 0 and lb[i] < prev_lb:
+                lb[i] = prev_lb
+            if di < 0 and ub[i] > prev_ub:
+                ub[i] = prev_ub
+        d[i] = di
+        if di > 0:
+            trend[i] = lb[i]
+            long[i] = lb[i]
+        else:
+            trend[i] = ub[i]
+            short[i] = ub[i]
+        prev_d, prev_ub, prev_lb = di, ub[i], lb[i]
+    return prev_d, prev_ub, prev_lb
+
+
+def _bands(high, low, atr, multiplier):
+    hl2 = 0.5 * (np.asarray(high, dtype=np.float64) + np.asarray(low, dtype=np.float64))
+    matr = multiplier * np.asarray(atr, dtype=np.float64)
+    return _seq(hl2 + matr), _seq(hl2 - matr)
+
+
+def supertrend_run(high, low, close, atr, multiplier=3.0):
+    """
+    pandas_ta.supertrend 的递推部分（atr 由调用方给出）
+    → ((trend, direction, long, short), state)；空输入时 state 为 None
+    """
+    m = len(close)
+    ub, lb = _bands(high, low, atr, multiplier)
+    d, trend, long, short = _buf(m, 1.0), _buf(m, 0.0), _buf(m, NAN), _buf(m, NAN)
+    if m == 0:
+        return _out(trend, d, long, short), None
+    last = _supertrend_loop(_seq(close), ub, lb, d, trend, long, short, 1, 1.0, ub[0], lb[0])
+    state = {"multiplier": float(multiplier), "dir": last[0], "ub": last[1], "lb": last[2]}
+    return _out(trend, d, long, short), state
+
+
+def supertrend_resume(state, high, low, close, atr):
+    """接着 state 计算新追加的K线（atr 为这些K线的 ATR）→ ((trend, direction, long, short), 新 state)"""
+    if state is None:
+        raise ValueError("supertrend_resume: no state, use supertrend_run on the full history")
+    m = len(close)
+    ub, lb = _bands(high, low, atr, state["multiplier"])
+    d, trend, long, short = _buf(m, 1.0), _buf(m, 0.0), _buf(m, NAN), _buf(m, NAN)
+    last = _supertrend_loop(_seq(close), ub, lb, d, trend, long, short, 0,
+                            state["dir"], state["ub"], state["lb"])
+    new = dict(state, dir=last[0], ub=last[1], lb=last[2])
+    return _out(trend, d, long, short), new
+
+
+# ---------- PSAR ----------
+@_kernel
+def _psar_loop(h, l, long, short, afs, rev, start, falling, sar, ep, af, af0, max_af, h1, l1):
+    # h1/l1 为上一根；max/min 按 Python 内置的比较顺序展开（NaN 行为一致）
+    for row in range(start, len(h)):
+        high_, low_ = h[row], l[row]
+        _sar = sar + af * (ep - sar)
+        if falling:
+            reverse = high_ > _sar
+            if low_ < ep:
+                ep = low_
+                af = af + af0
+                if max_af < af:
+                    af = max_af
+            x = h1
+            if _sar > x:
+                x = _sar
+            _sar = x
+        else:
+            reverse = low_ < _sar
+            if high_ > ep:
+                ep = high_
+                af = af + af0
+                if max_af < af:
+                    af = max_af
+            x = l1
+            if _sar < x:
+                x = _sar
+            _sar = x
+        if reverse:
+            _sar = ep
+            af = af0
+            falling = not falling
+            ep = low_ if falling else high_
+        sar = _sar
+        if falling:
+            short[row] = sar
+        else:
+            long[row] = sar
+        afs[row] = af
+        rev[row] = 1.0 if reverse else 0.0
+        h1, l1 = high_, low_
+    return falling, sar, ep, af, h1, l1
+
+
+def psar_run(high, low, close=None, af0=0.02, max_af=0.2):
+    """pandas_ta.psar → ((long, short, af, reversal), state)；空输入时 state 为 None"""
+    h, l = _seq(high), _seq(low)
+    m = len(h)
+    af0, max_af = float(af0), float(max_af)
+    long, short, afs, rev = _buf(m, NAN), _buf(m, NAN), _buf(m, NAN), _buf(m, 0.0)
+    if m == 0:
+        return _out(long, short, afs, rev), None
+    # 与 pandas_ta 一致：前两根的 -DM > 0 视为下跌起步
+    falling = m > 1 and (l[0] - l[1]) > (h[1] - h[0]) and (l[0] - l[1]) > 0 and abs(l[0] - l[1]) >= _EPS
+    sar, ep = (h[0], l[0]) if falling else (l[0], h[0])
+    if close is not None:
+        sar = float(close[0])
+    for i in range(min(2, m)):
+        afs[i] = af0
+    last = _psar_loop(h, l, long, short, afs, rev, 1, falling, sar, ep, af0, af0, max_af, h[0], l[0])
+    state = {
+        "af0": af0, "max_af": max_af,
+        "falling": last[0], "sar": last[1], "ep": last[2], "af": last[3], "h1": last[4], "l1": last[5],
+    }
+    return _out(long, short, afs, rev), state
+
+
+def psar_resume(state, high, low):
+    """接着 state 计算新追加的K线 → ((long, short, af, reversal), 新 state)"""
+    if state is None:
+        raise ValueError("psar_resume: no state, use psar_run on the full history")
+    h, l = _seq(high), _seq(low)
+    m = len(h)
+    long, short, afs, rev = _buf(m, NAN), _buf(m, NAN), _buf(m, NAN), _buf(m, 0.0)
+    if m == 0:
+        return _out(long, short, afs, rev), dict(state)
+    last = _psar_loop(h, l, long, short, afs, rev, 0, state["falling"], state["sar"], state["ep"],
+                      state["af"], state["af0"], state["max_af"], state["h1"], state["l1"])
+    new = dict(state, falling=last[0], sar=last[1], ep=last[2], af=last[3], h1=last[4], l1=last[5])
+    return _out(long, short, afs, rev), new
+
+
+# ---------- Heikin-Ashi ----------
+@_kernel
+def _ha_loop(c, o, start, prev_o, prev_c):
+    for i in range(start, len(c)):
+        prev_o = 0.5 * (prev_o + prev_c)
+        o[i] = prev_o
+        prev_c = c[i]
+    return prev_o, prev_c
+
+
+def _ha_out(ho, high, low, hc):
+    ho = np.asarray(ho, dtype=np.float64)
+    return ho, np.fmax(np.fmax(ho, high), hc), np.fmin(np.fmin(ho, low), hc), hc
+
+
+def ha_run(open_, high, low, close):
+    """pandas_ta.ha → ((HA_open, HA_high, HA_low, HA_close), state)；空输入时 state 为 None"""
+    open_, high, low, close = (np.asarray(a, dtype=np.float64) for a in (open_, high, low, close))
+    hc = 0.25 * (open_ + high + low + close)
+    c = _seq(hc)
+    o = _buf(len(c), 0.0)
+    if not len(c):
+        return _ha_out(o, high, low, hc), None
+    o[0] = 0.5 * (float(open_[0]) + float(close[0]))
+    last = _ha_loop(c, o, 1, o[0], c[0])
+    return _ha_out(o, high, low, hc), {"open": last[0], "close": last[1]}
+
+
+def ha_resume(state, open_, high, low, close):
+    """接着 state 计算新追加的K线 → ((HA_open, HA_high, HA_low, HA_close), 新 state)"""
+    if state is None:
+        raise ValueError("ha_resume: no state, use ha_run on the full history")
+    open_, high, low, close = (np.asarray(a, dtype=np.float64) for a in (open_, high, low, close))
+    hc = 0.25 * (open_ + high + low + close)
+    c = _seq(hc)
+    o = _buf(len(c), 0.0)
+    last = _ha_loop(c, o, 0, state["open"], state["close"])
+    return _ha_out(o, high, low, hc), {"open": last[0], "close": last[1]}
@@ -1,11 +1,21 @@
 # strategies.py  — 改良版：ADX过滤 + ATR动态TP/SL + 当根触发 + 小数位控制
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from types import MappingProxyType
+
 import numpy as np
 import pandas as pd
-import pandas_ta as ta
+
+import ta_kernels as K
+from indicator_cache import cached
+from ohlcv import bar_times, is_canonical
+from streaming import HTFBars
 
 # ---------- 工具 ----------
-def _ss(x):  # safe series
-    return pd.Series(x).astype(float)
+def _ss(x):  # safe series（已是 float64 时不复制）
+    return pd.Series(x).astype(float, copy=False)
 
 def _fmt(symbol: str, v: float) -> float:
     if v is None or not np.isfinite(v): return v
@@ -24,13 +34,40 @@ def _atr(high, low, close, n=14):
     return atr, atrp
 
 def _adx(high, low, close, n=14):
-    adxdf = ta.adx(high=_ss(high), low=_ss(low), close=_ss(close), length=n)
-    return adxdf[f"ADX_{n}"]
+    # 与 pandas_ta.adx 同口径（见 ta_kernels），直接在数组上算
+    c = _ss(close)
+    adx, _, _ = K.adx(_ss(high).to_numpy(), _ss(low).to_numpy(), c.to_numpy(), length=n)
+    return pd.Series(adx, index=c.index, name=f"ADX_{n}")
+
+# --- 带缓存的指标（同一轮计算内各策略共享，见 indicator_cache） ---
+def _ema_c(df, close, span):
+    return cached(df, ("ewm_span", "close", span), lambda: close.ewm(span=span).mean())
+
+def _sma_c(df, close, n):
+    return cached(df, ("sma", "close", n), lambda: close.rolling(n).mean())
+
+def _atr_c(df, high, low, close, n=14):
+    return cached(df, ("atr_sma", n), lambda: _atr(high, low, close, n))
+
+def _adx_c(df, high, low, close, n=14):
+    return cached(df, ("adx", n), lambda: _adx(high, low, close, n))
+
+def _macd_hist_c(df, close):
+    def _calc():
+        dif = _ema_c(df, close, 12) - _ema_c(df, close, 26)
+        dea = dif.ewm(span=9).mean()
+        return dif - dea
+    return cached(df, ("macd_hist", 12, 26, 9), _calc)
 
 # --- HTF 重采样：把当前 df 按更大周期聚合成 OHLCV ---
+def _dt_indexed(df: pd.DataFrame) -> pd.DataFrame:
+    # 需要 datetime 时间轴：旧格式取 ts 列，canonical frame 取 epoch 毫秒索引（UTC）
+    if "ts" not in df.columns and is_canonical(df):
+        return df.set_axis(bar_times(df), axis=0, copy=False)
+    return df.set_index("ts")
+
 def _resample_ohlc(df: pd.DataFrame, rule: str) -> pd.DataFrame:
-    # 需要 ts 是 datetime；dashboard 的 to_ohlcv_df 已经转换过
-    g = df.set_index("ts").resample(rule, label="right", closed="right")
+    g = _dt_indexed(df).resample(rule, label="right", closed="right")
     o = g["open"].first()
     h = g["high"].max()
     l = g["low"].min()
@@ -44,12 +81,11 @@ def strategy_diag(df: pd.DataFrame, tf: str) -> dict:
     """返回最近一根K的关键指标，前端诊断用"""
     try:
         close=_ss(df["close"]) ; high=_ss(df["high"]) ; low=_ss(df["low"])
-        ema12=close.ewm(span=12).mean(); ema26=close.ewm(span=26).mean()
-        dif=ema12-ema26; dea=dif.ewm(span=9).mean(); hist=dif-dea
-        ema55=close.ewm(span=55).mean(); ema144=close.ewm(span=144).mean()
+        hist=_macd_hist_c(df, close)
+        ema55=_ema_c(df, close, 55); ema144=_ema_c(df, close, 144)
         up=np.maximum(ema55, ema144); dn=np.minimum(ema55, ema144)
-        sma20=close.rolling(20).mean(); sma60=close.rolling(60).mean()
-        atr, atrp=_atr(high,low,close,14); adx=_adx(high,low,close,14)
+        sma20=_sma_c(df, close, 20); sma60=_sma_c(df, close, 60)
+        atr, atrp=_atr_c(df,high,low,close,14); adx=_adx_c(df,high,low,close,14)
         last=float(close.iloc[-1])
         last_atr=float(atr.iloc[-1]) if np.isfinite(atr.iloc[-1]) else None
         vegas_dist_atr = (
@@ -70,13 +106,6 @@ def strategy_diag(df: pd.DataFrame, tf: str) -> dict:
     except Exception:
         return {}
 
-# 运行时放松模式（用于快速恢复信号量）
-RELAX = False
-
-def set_relax_mode(flag: bool):
-    global RELAX
-    RELAX = bool(flag)
-
 # 不同周期参数（可按需再调）
 PARAMS = {
     "4h": {"adx_min": 18, "atrp_min": 0.35, "tp_atr": {"trend":2.0,"revert":1.5}, "sl_atr": {"trend":1.4,"revert":1.2}},
@@ -85,28 +114,139 @@ PARAMS = {
 }
 DEF = {"adx_min":16,"atrp_min":0.4,"tp_atr":{"trend":2.2,"revert":1.8},"sl_atr":{"trend":1.6,"revert":1.3}}
 
-def _cfg(tf:str):
-    tf = (tf or "").lower()
-    return PARAMS.get(tf, DEF)
+# ---------- 策略配置（按次求值传入，不再读写模块全局开关） ----------
+def _frozen(v):
+    return MappingProxyType({k: _frozen(x) for k, x in v.items()}) if isinstance(v, dict) else v
+
+def _key(v):
+    return tuple(sorted((k, _key(x)) for k, x in v.items())) if hasattr(v, "items") else v
+
+class StrategyConfig:
+    """
+    一次求值用的阈值（不可变，各线程可共享同一实例）：
+      relax   — 放松模式：Vegas 突破距离 0.3→0.15 ATR、缠论 ADX 门槛下调、MACD 不做 EMA200 过滤
+      params  — 各周期 adx_min / atrp_min / tp_atr / sl_atr，default 用于未列出的周期（缺省取 PARAMS / DEF）
+    key 可哈希，gate 与策略结果按它分别缓存，不同配置的结果互不覆盖。
+    """
+    __slots__ = ("name", "relax", "params", "default", "key")
+
+    def __init__(self, relax: bool = False, params: dict = None, default: dict = None, name: str = None):
+        params = PARAMS if params is None else params
+        values = {
+            "name": name or ("relaxed" if relax else "strict"),
+            "relax": bool(relax),
+            "params": _frozen({str(k).lower(): dict(v) for k, v in params.items()}),
+            "default": _frozen(dict(DEF if default is None else default)),
+        }
+        values["key"] = (values["relax"], _key(values["params"]), _key(values["default"]))
+        for k, v in values.items():
+            object.__setattr__(self, k, v)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("StrategyConfig is immutable; use replace()")
+
+    def replace(self, **changes) -> "StrategyConfig":
+        kw = {"relax": self.relax, "params": self.params, "default": self.default, "name": None}
+        kw.update(changes)
+        return StrategyConfig(**kw)
+
+    def tf(self, tf: str):
+        """该周期的阈值（只读 mapping）"""
+        return self.params.get((tf or "").lower(), self.default)
+
+    def __eq__(self, other):
+        return isinstance(other, StrategyConfig) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        return f"StrategyConfig(name={self.name!r}, relax={self.relax})"
+
+STRICT = StrategyConfig(relax=False)
+RELAXED = StrategyConfig(relax=True)
+
+# 未显式传 cfg 时：当前上下文（config_scope）的配置，否则进程缺省（set_relax_mode，只在启动时设置）
+_CONFIG = ContextVar("strategy_config", default=None)
+_DEFAULT_RELAX = False
+
+def set_relax_mode(flag: bool):
+    """设置进程缺省配置（启动时按 config.json 调用一次）；单次请求用 cfg= 或 config_scope"""
+    global _DEFAULT_RELAX
+    _DEFAULT_RELAX = bool(flag)
+
+def current_config() -> StrategyConfig:
+    cfg = _CONFIG.get()
+    if cfg is not None:
+        return cfg
+    return RELAXED if _DEFAULT_RELAX else STRICT
+
+def _resolve(cfg):
+    return current_config() if cfg is None else cfg
+
+@contextmanager
+def config_scope(cfg: StrategyConfig):
+    """作用域内（当前线程 / 上下文）未显式传 cfg 的策略都用 cfg，不影响并发的其他请求"""
+    token = _CONFIG.set(cfg)
+    try:
+        yield cfg
+    finally:
+        _CONFIG.reset(token)
+
+def use_config(cfg: StrategyConfig):
+    """把 cfg 设为当前上下文的配置（无法用 with 包住的脚本式调用方，如 streamlit 每次 rerun）"""
+    _CONFIG.set(cfg)
+
+# ---------- 共享前置过滤（gate） ----------
+# 只依赖 ATR/ADX 这类便宜且各策略共用的序列，按 (symbol, tf, K线) 算一次（走指标缓存）；
+# gate 不通过的策略直接返回/跳过，不再构建 EMA/MACD 等重指标。策略在 STRATEGY_META["gates"] 里声明用到哪些。
+GATES = {
+    "adx_min": lambda v, tf, cfg: v["adx"] >= cfg.tf(tf)["adx_min"],
+    "atrp_min": lambda v, tf, cfg: v["atrp"] >= cfg.tf(tf)["atrp_min"],
+    "chan_adx_min": lambda v, tf, cfg: v["adx"] >= _chan_adx_min(tf, cfg),
+}
+
+def gate_values(df: pd.DataFrame) -> dict:
+    """最后一根的 ADX14 / ATR%（NaN 时任何 gate 都不通过）"""
+    close = _ss(df["close"]); high = _ss(df["high"]); low = _ss(df["low"])
+    _, atrp = _atr_c(df, high, low, close, 14)
+    adx = _adx_c(df, high, low, close, 14)
+    return {"adx": float(adx.iloc[-1]), "atrp": float(atrp.iloc[-1])}
+
+def evaluate_gates(df: pd.DataFrame, tf: str, cfg: StrategyConfig = None) -> dict:
+    """{gate 名: 是否通过}；同一根K线上各策略共用一份结果（ADX/ATR% 各配置共用，判定按配置分别缓存）"""
+    cfg = _resolve(cfg)
+    def _calc():
+        v = cached(df, ("gate_values", 14), lambda: gate_values(df))
+        return {name: bool(fn(v, tf, cfg)) for name, fn in GATES.items()}
+    return cached(df, ("gates", (tf or "").lower(), cfg.key), _calc)
+
+def gate_rejection(name: str, gates: dict):
+    """策略声明的 gate 中第一个未通过的名字；全部通过（或未声明）返回 None"""
+    for g in STRATEGY_META.get(name, {}).get("gates", ()):
+        if not gates.get(g, False):
+            return g
+    return None
+
+def _gated_out(name: str, df: pd.DataFrame, tf: str, cfg: StrategyConfig) -> bool:
+    return gate_rejection(name, evaluate_gates(df, tf, cfg)) is not None
 
 # ---------- 策略 ----------
-def vegas_tunnel(symbol: str, df: pd.DataFrame, tf: str):
+def vegas_tunnel(symbol: str, df: pd.DataFrame, tf: str, cfg: StrategyConfig = None):
     """
     趋势突破：上一根在通道内，本根收在通道外 + ADX过滤 + 超出一定距离
     通道：EMA55 / EMA144；距离门槛：0.3*ATR
     """
-    if len(df) < 160: return None
+    cfg = _resolve(cfg)
+    if len(df) < STRATEGY_META["vegas_tunnel"]["warmup"]: return None
+    if _gated_out("vegas_tunnel", df, tf, cfg): return None  # ADX / ATR% 过滤先于 EMA 计算
     close = _ss(df["close"]); high=_ss(df["high"]); low=_ss(df["low"])
-    ema55 = close.ewm(span=55).mean()
-    ema144= close.ewm(span=144).mean()
+    atr, _ = _atr_c(df, high, low, close, 14)
+    adx = _adx_c(df, high, low, close, 14)
+    ema55 = _ema_c(df, close, 55)
+    ema144= _ema_c(df, close, 144)
     up = np.maximum(ema55, ema144); dn = np.minimum(ema55, ema144)
 
-    atr, atrp = _atr(high, low, close, 14)
-    adx = _adx(high, low, close, 14)
-    if not np.isfinite(adx.iloc[-1]): return None
-    if adx.iloc[-1] < _cfg(tf)["adx_min"]: return None
-    if atrp.iloc[-1] < _cfg(tf)["atrp_min"]: return None
-
     prev_in = (dn.iloc[-2] <= close.iloc[-2] <= up.iloc[-2])
     if not prev_in: return None
 
@@ -115,7 +255,7 @@ def vegas_tunnel(symbol: str, df: pd.DataFrame, tf: str):
 
     side=None
     # 要求超出通道的幅度至少 X*ATR；放松模式降到 0.15
-    dist_mult = 0.15 if RELAX else 0.3
+    dist_mult = 0.15 if cfg.relax else 0.3
     if last > up.iloc[-1] + dist_mult*last_atr:
         side="BUY"
     elif last < dn.iloc[-1] - dist_mult*last_atr:
@@ -123,7 +263,7 @@ def vegas_tunnel(symbol: str, df: pd.DataFrame, tf: str):
     else:
         return None
 
-    tp_mult = _cfg(tf)["tp_atr"]["trend"]; sl_mult=_cfg(tf)["sl_atr"]["trend"]
+    tp_mult = cfg.tf(tf)["tp_atr"]["trend"]; sl_mult=cfg.tf(tf)["sl_atr"]["trend"]
     if side=="BUY":
         target= last + tp_mult*last_atr; stop= last - sl_mult*last_atr
     else:
@@ -135,7 +275,115 @@ def vegas_tunnel(symbol: str, df: pd.DataFrame, tf: str):
         "confidence":45, "reason":f"建议单：{symbol}（{tf}）{'做多' if side=='BUY' else '做空'}；收盘有效突破 Vegas 通道 + ADX{int(adx.iloc[-1])} 过滤。"
     }
 
-def chan_simplified(symbol: str, df: pd.DataFrame, tf: str):
+# chan_simplified 的更高周期映射与非对称 ATR TP/SL
+CHAN_HTF_RULE = {"4h": "1D", "1d": "1W"}
+CHAN_TP_SL = {"4h": (3.0, 1.2), "1d": (3.0, 1.5), "1w": (3.5, 2.0)}
+
+def _chan_adx_min(tf: str, cfg: StrategyConfig) -> float:
+    relax = cfg.relax
+    adx_min_map = {"4h": (16 if relax else 22), "1d": (15 if relax else 20), "1w": (13 if relax else 18)}
+    return adx_min_map.get(tf, 20)
+
+# HTF K线增量维护：按 (symbol, tf) 记住已聚合的前缀，df 只是在末尾追加新K线时只聚合新增部分
+_HTF_FEEDS = OrderedDict()
+_HTF_FEEDS_MAX = 256
+_HTF_LOCK = threading.Lock()
+_OHLCV = ["open", "high", "low", "close", "volume"]
+
+class _HTFFeed:
+    def __init__(self, rule: str):
+        self.bars = HTFBars(rule, sma_lengths=(20, 60))
+        self.n = 0          # 已喂入的基础K线根数
+        self.first = None   # 首根时间（原始 int64）
+        self.last = None    # 最后喂入那根 (ts, o, h, l, c, v)，用来确认 df 仍是同一段数据
+
+def _ts_i8(df: pd.DataFrame) -> np.ndarray:
+    if "ts" not in df.columns and is_canonical(df):
+        return df.index.to_numpy()
+    ts = df["ts"]
+    if not pd.api.types.is_datetime64_any_dtype(ts):
+        raise TypeError("ts must be datetime")
+    return ts.array.asi8
+
+def _wall_ms(df: pd.DataFrame, start: int) -> np.ndarray:
+    if "ts" not in df.columns and is_canonical(df):
+        return df.index.to_numpy()[start:]
+    idx = pd.DatetimeIndex(df["ts"].iloc[start:])
+    if idx.hasnans:
+        raise ValueError("NaT in ts")
+    if idx.tz is not None:
+        idx = idx.tz_localize(None)
+    return idx.as_unit("ms").asi8
+
+def _htf_sma_incremental(df: pd.DataFrame, tf: str, key) -> tuple:
+    """→ (HTF根数, sma20, sma60)，结果与 _htf_sma_resample 一致"""
+    rule = CHAN_HTF_RULE[tf]
+    n = len(df)
+    ts = _ts_i8(df)
+    cols = [df[c].to_numpy(dtype=np.float64) for c in _OHLCV]
+    with _HTF_LOCK:
+        feed = _HTF_FEEDS.get((key, tf))
+        start = 0
+        if feed is not None and 0 < feed.n <= n and int(ts[0]) == feed.first:
+            j = feed.n - 1
+            if (int(ts[j]), *(float(c[j]) for c in cols)) == feed.last:
+                start = feed.n
+        if start == 0:
+            feed = _HTFFeed(rule)
+        if start < n:
+            try:
+                ms = _wall_ms(df, start)
+                rows = zip(ms.tolist(), *(c[start:].tolist() for c in cols))
+                for t, o, h, l, c, v in rows:
+                    feed.bars.update(t, o, h, l, c, v)
+            except Exception:
+                _HTF_FEEDS.pop((key, tf), None)  # 喂到一半失败的状态不能再用
+                raise
+            feed.first = int(ts[0])
+            feed.n = n
+            feed.last = (int(ts[-1]), *(float(c[-1]) for c in cols))
+        _HTF_FEEDS[(key, tf)] = feed
+        _HTF_FEEDS.move_to_end((key, tf))
+        while len(_HTF_FEEDS) > _HTF_FEEDS_MAX:
+            _HTF_FEEDS.popitem(last=False)
+        sma = feed.bars.sma()
+        return len(feed.bars), sma[20], sma[60]
+
+def _htf_sma_resample(df: pd.DataFrame, tf: str) -> tuple:
+    df_htf = _resample_ohlc(df, CHAN_HTF_RULE[tf])
+    c_htf = _ss(df_htf["close"])
+    if len(c_htf) < 60:
+        return len(c_htf), np.nan, np.nan
+    return len(c_htf), c_htf.rolling(20).mean().iloc[-1], c_htf.rolling(60).mean().iloc[-1]
+
+def _htf_confirm(df: pd.DataFrame, tf: str, cross_up: bool, cross_down: bool, key=None) -> bool:
+    """
+    HTF SMA20/60 方向确认；数据不足时软退化放行，重采样失败视为不通过。
+    key（通常是 symbol）不为空时走增量 HTF 聚合，遇到不支持的数据（时间不递增等）退回整段重采样。
+    """
+    if CHAN_HTF_RULE.get(tf) is None:
+        return True
+    try:
+        res = None
+        if key is not None and len(df):
+            try:
+                res = _htf_sma_incremental(df, tf, key)
+            except Exception:
+                res = None
+        n_htf, sma20_h, sma60_h = res if res is not None else _htf_sma_resample(df, tf)
+        if n_htf < 60:
+            return True  # 软退化：数据不足时跳过 HTF 确认
+        if not (np.isfinite(sma20_h) and np.isfinite(sma60_h)):
+            return True  # 软退化
+        if cross_up and not (sma20_h > sma60_h):
+            return False
+        if cross_down and not (sma60_h > sma20_h):
+            return False
+        return True
+    except Exception:
+        return False
+
+def chan_simplified(symbol: str, df: pd.DataFrame, tf: str, cfg: StrategyConfig = None):
     """
     最终优化版（趋势跟随，减少假信号）：
     - 仅当 SMA20/60 在"当根"发生金叉/死叉才触发（去抖动）
@@ -149,23 +397,21 @@ def chan_simplified(symbol: str, df: pd.DataFrame, tf: str):
         1d:  TP=3.0*ATR,  SL=1.5*ATR
         1w:  TP=3.5*ATR,  SL=2.0*ATR
     """
-    if len(df) < 80:
+    cfg = _resolve(cfg)
+    if len(df) < STRATEGY_META["chan_simplified"]["warmup"]:
+        return None
+    # ADX 门槛（放松模式下降低），先于 SMA 计算
+    if _gated_out("chan_simplified", df, tf, cfg):
         return None
 
     close = _ss(df["close"]); high = _ss(df["high"]); low = _ss(df["low"])
-    sma20 = close.rolling(20).mean(); sma60 = close.rolling(60).mean()
-    atr, _ = _atr(high, low, close, 14)
-    adx = _adx(high, low, close, 14)
+    atr, _ = _atr_c(df, high, low, close, 14)
+    adx = _adx_c(df, high, low, close, 14)
+    sma20 = _sma_c(df, close, 20); sma60 = _sma_c(df, close, 60)
 
     if not np.isfinite(sma20.iloc[-1]) or not np.isfinite(sma60.iloc[-1]):
         return None
 
-    # ADX 门槛（放松模式下降低）
-    adx_min_map = {"4h": (16 if RELAX else 22), "1d": (15 if RELAX else 20), "1w": (13 if RELAX else 18)}
-    adx_min = adx_min_map.get(tf, 20)
-    if not np.isfinite(adx.iloc[-1]) or adx.iloc[-1] < adx_min:
-        return None
-
     # 当根交叉
     cross_up = (sma20.iloc[-2] <= sma60.iloc[-2]) and (sma20.iloc[-1] > sma60.iloc[-1])
     cross_down = (sma20.iloc[-2] >= sma60.iloc[-2]) and (sma20.iloc[-1] < sma60.iloc[-1])
@@ -173,26 +419,8 @@ def chan_simplified(symbol: str, df: pd.DataFrame, tf: str):
         return None
 
     # 更高周期方向确认
-    htf_rule_map = {"4h": "1D", "1d": "1W"}
-    htf_rule = htf_rule_map.get(tf)
-    if htf_rule is not None:
-        try:
-            df_htf = _resample_ohlc(df, htf_rule)
-            c_htf = _ss(df_htf["close"]) if len(df_htf) else None
-            if c_htf is None or len(c_htf) < 60:
-                pass  # 软退化：数据不足时跳过 HTF 确认
-            else:
-                sma20_h = c_htf.rolling(20).mean()
-                sma60_h = c_htf.rolling(60).mean()
-                if not (np.isfinite(sma20_h.iloc[-1]) and np.isfinite(sma60_h.iloc[-1])):
-                    pass  # 软退化
-                else:
-                    if cross_up and not (sma20_h.iloc[-1] > sma60_h.iloc[-1]):
-                        return None
-                    if cross_down and not (sma60_h.iloc[-1] > sma20_h.iloc[-1]):
-                        return None
-        except Exception:
-            return None
+    if not _htf_confirm(df, tf, cross_up, cross_down, key=symbol):
+        return None
 
     side = "BUY" if cross_up else "SELL"
     last_close = float(close.iloc[-1])
@@ -201,12 +429,7 @@ def chan_simplified(symbol: str, df: pd.DataFrame, tf: str):
         return None
 
     # 非对称 ATR TP/SL
-    mult_map = {
-        "4h": (3.0, 1.2),
-        "1d": (3.0, 1.5),
-        "1w": (3.5, 2.0),
-    }
-    tp_atr, sl_atr = mult_map.get(tf, (3.0, 1.2))
+    tp_atr, sl_atr = CHAN_TP_SL.get(tf, (3.0, 1.2))
     if side == "BUY":
         target = last_close + tp_atr * last_atr
         stop = last_close - sl_atr * last_atr
@@ -225,29 +448,26 @@ def chan_simplified(symbol: str, df: pd.DataFrame, tf: str):
         "reason": f"建议单：{symbol}（{tf}）{'做多' if side=='BUY' else '做空'}；SMA20/60 当根交叉 + HTF 确认 + ADX{int(adx.iloc[-1])}。"
     }
 
-def macd(symbol: str, df: pd.DataFrame, tf: str):
+def macd(symbol: str, df: pd.DataFrame, tf: str, cfg: StrategyConfig = None):
     """
     MACD 交叉 + 基线确认：
     - DIF/DEA 由负转正→BUY（并且收盘在 EMA200 上方）
     - 由正转负→SELL（并且收盘在 EMA200 下方）
     - ADX/ATR% 过滤，小幅抖动不触发
     """
-    if len(df) < 220: return None
+    cfg = _resolve(cfg)
+    if len(df) < STRATEGY_META["macd"]["warmup"]: return None
+    # ADX / ATR% 过滤（NaN 视为不通过）先于 MACD / EMA200 计算
+    if _gated_out("macd", df, tf, cfg): return None
     close=_ss(df["close"]); high=_ss(df["high"]); low=_ss(df["low"])
-    ema12=close.ewm(span=12).mean(); ema26=close.ewm(span=26).mean()
-    dif=ema12-ema26; dea=dif.ewm(span=9).mean(); hist=dif-dea
-    ema200=close.ewm(span=200).mean()
-    atr, atrp=_atr(high,low,close,14); adx=_adx(high,low,close,14)
+    atr, _=_atr_c(df,high,low,close,14)
+    hist=_macd_hist_c(df, close)
+    ema200=_ema_c(df, close, 200)
 
-    # finite 检查，避免 NaN 绕过过滤或行为不一致
-    if not (np.isfinite(atrp.iloc[-1]) and np.isfinite(adx.iloc[-1])):
-        return None
-    if atrp.iloc[-1] < _cfg(tf)["atrp_min"] or adx.iloc[-1] < _cfg(tf)["adx_min"]:
-        return None
     if not (np.isfinite(hist.iloc[-1]) and np.isfinite(hist.iloc[-2]) and np.isfinite(ema200.iloc[-1])):
         return None
 
-    use_ema200_filter = not RELAX
+    use_ema200_filter = not cfg.relax
     cond_buy = (hist.iloc[-2] <= 0 and hist.iloc[-1] > 0)
     cond_sell= (hist.iloc[-2] >= 0 and hist.iloc[-1] < 0)
     if use_ema200_filter:
@@ -265,7 +485,7 @@ def macd(symbol: str, df: pd.DataFrame, tf: str):
     last=float(close.iloc[-1]); last_atr=float(atr.iloc[-1])
     if not np.isfinite(last_atr) or last_atr <= 0:
         return None
-    tp_mult=_cfg(tf)["tp_atr"]["trend"]; sl_mult=_cfg(tf)["sl_atr"]["trend"]
+    tp_mult=cfg.tf(tf)["tp_atr"]["trend"]; sl_mult=cfg.tf(tf)["sl_atr"]["trend"]
     target = last + (tp_mult*last_atr if side=="BUY" else -tp_mult*last_atr)
     stop   = last - (sl_mult*last_atr if side=="BUY" else -sl_mult*last_atr)
 
@@ -275,9 +495,164 @@ def macd(symbol: str, df: pd.DataFrame, tf: str):
         "confidence":30,"reason":f"建议单：{symbol}（{tf}）{'做多' if side=='BUY' else '做空'}；MACD交叉 + EMA200 基线 + ADX过滤。"
     }
 
+# ---------- 全序列版本（回测/近窗口一次算完） ----------
+# 返回与 df 同 index 的 DataFrame(signal/entry/sl/tp)，与 strategies_top15._pack 同形；
+# 第 i 行 == 把 df.iloc[:i+1] 交给对应单根函数的结果（entry/sl/tp 同样经 _fmt 取整）。
+def _series_frame(symbol, close, long, short, tp_dist, sl_dist, tail=None):
+    long = np.asarray(long, dtype=bool); short = np.asarray(short, dtype=bool) & ~long
+    if tail is not None:
+        long[:max(len(long) - tail, 0)] = False; short[:max(len(short) - tail, 0)] = False
+    c = close.to_numpy(dtype=float)
+    tp_dist = np.asarray(tp_dist, dtype=float); sl_dist = np.asarray(sl_dist, dtype=float)
+    entry = c.copy()
+    tp = np.full(len(c), np.nan); sl = np.full(len(c), np.nan)
+    for i in np.flatnonzero(long | short):
+        d = 1.0 if long[i] else -1.0
+        entry[i] = _fmt(symbol, c[i])
+        tp[i] = _fmt(symbol, c[i] + d * tp_dist[i])
+        sl[i] = _fmt(symbol, c[i] - d * sl_dist[i])
+    sig = np.where(long, 1, np.where(short, -1, 0))
+    return pd.DataFrame({"signal": sig, "entry": entry, "sl": sl, "tp": tp}, index=close.index)
+
+def _prev(x):
+    out = np.empty(len(x)); out[:1] = np.nan; out[1:] = x[:-1]
+    return out
+
+def _arr(*xs):
+    return tuple(np.asarray(x, dtype=float) for x in xs)
+
+# tail：只需要最后 tail 根时传入，更早的行 signal 为 0（省去逐根的 HTF 确认与价位取整）
+def vegas_tunnel_series(symbol: str, df: pd.DataFrame, tf: str, tail: int = None,
+                        cfg: StrategyConfig = None) -> pd.DataFrame:
+    close_s = _ss(df["close"]); high=_ss(df["high"]); low=_ss(df["low"])
+    ema55 = _ema_c(df, close_s, 55); ema144 = _ema_c(df, close_s, 144)
+    atr, atrp = _atr_c(df, high, low, close_s, 14)
+    adx = _adx_c(df, high, low, close_s, 14)
+    close, ema55, ema144, atr, atrp, adx = _arr(close_s, ema55, ema144, atr, atrp, adx)
+    up = np.maximum(ema55, ema144); dn = np.minimum(ema55, ema144)
+    cfg = _resolve(cfg); th = cfg.tf(tf)
+
+    ok = (np.arange(len(df)) >= STRATEGY_META["vegas_tunnel"]["warmup"] - 1) & np.isfinite(adx) & ~(adx < th["adx_min"]) & ~(atrp < th["atrp_min"])
+    ok &= (_prev(dn) <= _prev(close)) & (_prev(close) <= _prev(up))
+    ok &= np.isfinite(atr) & (atr > 0)
+    dist_mult = 0.15 if cfg.relax else 0.3
+    long = ok & (close > up + dist_mult*atr)
+    short = ok & ~long & (close < dn - dist_mult*atr)
+    return _series_frame(symbol, close_s, long, short, th["tp_atr"]["trend"]*atr, th["sl_atr"]["trend"]*atr, tail)
+
+def chan_simplified_series(symbol: str, df: pd.DataFrame, tf: str, tail: int = None,
+                           cfg: StrategyConfig = None) -> pd.DataFrame:
+    close_s = _ss(df["close"]); high = _ss(df["high"]); low = _ss(df["low"])
+    sma20 = _sma_c(df, close_s, 20); sma60 = _sma_c(df, close_s, 60)
+    atr, _ = _atr_c(df, high, low, close_s, 14)
+    adx = _adx_c(df, high, low, close_s, 14)
+    sma20, sma60, atr, adx = _arr(sma20, sma60, atr, adx)
+
+    ok = (np.arange(len(df)) >= STRATEGY_META["chan_simplified"]["warmup"] - 1) & np.isfinite(sma20) & np.isfinite(sma60)
+    ok &= np.isfinite(adx) & ~(adx < _chan_adx_min(tf, _resolve(cfg)))
+    cross_up = ok & (_prev(sma20) <= _prev(sma60)) & (sma20 > sma60)
+    cross_down = ok & (_prev(sma20) >= _prev(sma60)) & (sma20 < sma60)
+    atr_ok = np.isfinite(atr) & (atr > 0)
+    cross_up &= atr_ok; cross_down &= atr_ok
+    if tail is not None:
+        cross_up[:max(len(df) - tail, 0)] = False; cross_down[:max(len(df) - tail, 0)] = False
+
+    # HTF 确认只在候选根上做（候选通常很少）；用单独的 HTF 状态，回测 / 回放的前缀不会把实时路径的状态重置
+    for i in np.flatnonzero(cross_up | cross_down):
+        if not _htf_confirm(df.iloc[:i+1], tf, bool(cross_up[i]), bool(cross_down[i]), key=(symbol, "series")):
+            cross_up[i] = False; cross_down[i] = False
+
+    tp_atr, sl_atr = CHAN_TP_SL.get(tf, (3.0, 1.2))
+    return _series_frame(symbol, close_s, cross_up, cross_down, tp_atr*atr, sl_atr*atr)
+
+def macd_series(symbol: str, df: pd.DataFrame, tf: str, tail: int = None,
+                cfg: StrategyConfig = None) -> pd.DataFrame:
+    close_s=_ss(df["close"]); high=_ss(df["high"]); low=_ss(df["low"])
+    hist=_macd_hist_c(df, close_s)
+    ema200=_ema_c(df, close_s, 200)
+    atr, atrp=_atr_c(df,high,low,close_s,14); adx=_adx_c(df,high,low,close_s,14)
+    close, hist, ema200, atr, atrp, adx = _arr(close_s, hist, ema200, atr, atrp, adx)
+    cfg = _resolve(cfg); th = cfg.tf(tf)
+
+    ok = (np.arange(len(df)) >= STRATEGY_META["macd"]["warmup"] - 1) & np.isfinite(atrp) & np.isfinite(adx)
+    ok &= ~(atrp < th["atrp_min"]) & ~(adx < th["adx_min"])
+    ok &= np.isfinite(hist) & np.isfinite(_prev(hist)) & np.isfinite(ema200)
+    ok &= np.isfinite(atr) & (atr > 0)
+    long = ok & (_prev(hist) <= 0) & (hist > 0)
+    short = ok & (_prev(hist) >= 0) & (hist < 0)
+    if not cfg.relax:
+        long &= close > ema200
+        short &= close < ema200
+    return _series_frame(symbol, close_s, long, short, th["tp_atr"]["trend"]*atr, th["sl_atr"]["trend"]*atr, tail)
+
+def series_signal(frame: pd.DataFrame, i: int):
+    """全序列结果第 i 行 -> {side, entry, target, stop}；无信号返回 None"""
+    row = frame.iloc[i]
+    sig = int(row["signal"])
+    if sig == 0:
+        return None
+    return {"side": "BUY" if sig > 0 else "SELL", "entry": float(row["entry"]),
+            "target": float(row["tp"]), "stop": float(row["sl"])}
+
 # 统一注册表
 STRATEGY_REGISTRY = {
     "vegas_tunnel": vegas_tunnel,
     "chan_simplified": chan_simplified,
     "macd": macd,
 }
+
+# 全序列版本注册表（同名键）
+SERIES_REGISTRY = {
+    "vegas_tunnel": vegas_tunnel_series,
+    "chan_simplified": chan_simplified_series,
+    "macd": macd_series,
+}
+
+# 声明式元数据（供 planner 使用）：
+#   warmup     — 最少K线数（函数内的长度门槛即取自这里）
+#   indicators — 依赖的指标，写法与 indicator_cache 的 spec 相同
+#   gates      — 共享前置过滤（见 GATES），不通过时不再构建该策略的其余指标
+#   cost       — 相对耗时（1 最轻），planner 按它从低到高排序
+#   family     — 策略类型 trend / breakout / reversion（regime 按市场形态挑选策略）
+STRATEGY_META = {
+    "vegas_tunnel": {
+        "warmup": 160,
+        "indicators": [("ewm_span", "close", 55), ("ewm_span", "close", 144), ("atr_sma", 14), ("adx", 14)],
+        "gates": ["adx_min", "atrp_min"],
+        "cost": 2,
+        "family": "breakout",
+    },
+    "chan_simplified": {
+        "warmup": 80,
+        "indicators": [("sma", "close", 20), ("sma", "close", 60), ("atr_sma", 14), ("adx", 14)],
+        "gates": ["chan_adx_min"],
+        "cost": 2,
+        "family": "trend",
+    },
+    "macd": {
+        "warmup": 220,
+        "indicators": [("macd_hist", 12, 26, 9), ("ewm_span", "close", 200), ("atr_sma", 14), ("adx", 14)],
+        "gates": ["adx_min", "atrp_min"],
+        "cost": 2,
+        "family": "trend",
+    },
+}
+
+# ---------- 按配置求值（结果进指标缓存；多个配置共用同一批指标） ----------
+def evaluate(name: str, symbol: str, df: pd.DataFrame, tf: str, cfg: StrategyConfig = None):
+    """
+    基础策略在 cfg 下的结果（dict 或 None）。在 indicator_scope 内按 (symbol, tf, K线, cfg) 缓存，
+    之后同一根K线上同一配置的请求直接命中；返回副本，调用方可自行修改。
+    """
+    cfg = _resolve(cfg)
+    fn = STRATEGY_REGISTRY[name]
+    res = cached(df, (name, "result", (tf or "").lower(), cfg.key), lambda: fn(symbol, df, tf, cfg=cfg))
+    return dict(res) if res else None
+
+def evaluate_variants(symbol: str, df: pd.DataFrame, tf: str, names=None, configs=(STRICT, RELAXED)) -> dict:
+    """
+    同一次遍历里按多个配置求值基础策略 → {cfg.name: {策略名: 结果或 None}}。
+    指标与 ADX/ATR% 只算一次，各配置只多出阈值判断；结果均进缓存，之后任一配置的请求不再重算。
+    """
+    names = [n for n in (STRATEGY_META if names is None else names) if n in STRATEGY_META]
+    return {cfg.name: {n: evaluate(n, symbol, df, tf, cfg) for n in names} for cfg in configs}
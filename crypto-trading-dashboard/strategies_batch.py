@@ -0,0 +1,415 @@
+# strategies_batch.py — TOP15 策略的批量版：同一时间轴的多个币种堆成 (symbols × bars) 矩阵，
+# 指标与入场条件按整张矩阵一次算完，再按行拆回每个币种的信号。
+# 公式与 strategies_top15 逐条对应（指标同样走 ta_kernels），参数默认值直接读取 strategies_top15 的函数签名。
+import inspect
+import itertools
+
+import numpy as np
+import pandas as pd
+
+import ta_kernels as K
+from ohlcv import OHLCV_COLUMNS, anchor_keys, is_canonical
+from strategies_top15 import REGISTRY as TOP15_REGISTRY
+
+
+class Panel:
+    """同一时间轴上的多币种 OHLCV 矩阵；memo() 让同一面板上的各策略共享指标"""
+
+    def __init__(self, symbols, ts_ms, open_, high, low, close, volume):
+        self.symbols = list(symbols)
+        self.ts_ms = ts_ms
+        self.open, self.high, self.low, self.close, self.volume = open_, high, low, close, volume
+        self._memo = {}
+
+    @property
+    def shape(self):
+        return self.close.shape
+
+    def memo(self, spec, compute):
+        if spec not in self._memo:
+            self._memo[spec] = compute()
+        return self._memo[spec]
+
+
+def frame_ts_ms(df: pd.DataFrame):
+    """与 strategies_top15._ensure_dt_index 取时间轴的优先级一致；取不到返回 None"""
+    if is_canonical(df):
+        return df.index.to_numpy()
+    try:
+        if isinstance(df.index, pd.DatetimeIndex):
+            idx = df.index
+        elif "timestamp" in df.columns:
+            idx = pd.DatetimeIndex(pd.to_datetime(df["timestamp"], errors="coerce", utc=True))
+        elif "ts" in df.columns:
+            idx = pd.DatetimeIndex(pd.to_datetime(df["ts"], errors="coerce", utc=True))
+        else:
+            return None
+        if idx.hasnans:
+            return None
+        return idx.as_unit("ms").asi8
+    except Exception:
+        return None
+
+
+def build_panels(frames: dict):
+    """
+    frames: {symbol: OHLCV DataFrame}
+    → (panels, leftovers)：时间轴完全相同的币种合成一个 Panel；
+      时间轴缺失/未排序/含非有限值的币种放进 leftovers，交给逐币种路径。
+    """
+    groups, leftovers = {}, []
+    for symbol, df in frames.items():
+        ts = frame_ts_ms(df) if df is not None and len(df) else None
+        if ts is None or (len(ts) > 1 and not np.all(np.diff(ts) > 0)):
+            leftovers.append(symbol)
+            continue
+        try:
+            vals = df[OHLCV_COLUMNS].to_numpy(dtype=np.float64)
+        except Exception:
+            leftovers.append(symbol)
+            continue
+        if not np.isfinite(vals).all():
+            leftovers.append(symbol)
+            continue
+        groups.setdefault(ts.tobytes(), (ts, []))[1].append((symbol, vals))
+    panels = []
+    for ts, members in groups.values():
+        stack = np.stack([v for _, v in members])  # (symbols, bars, 5)
+        mats = [np.ascontiguousarray(stack[:, :, j]) for j in range(5)]
+        panels.append(Panel([s for s, _ in members], ts, *mats))
+    return panels, leftovers
+
+
+# ------- helpers（与 strategies_top15 同名 helper 一一对应） -------
+def _prev(a):
+    out = np.full(a.shape, np.nan)
+    out[..., 1:] = a[..., :-1]
+    return out
+
+
+def _xover(a, b):
+    a, b = np.broadcast_arrays(np.asarray(a, dtype=np.float64), np.asarray(b, dtype=np.float64))
+    return (a > b) & (_prev(a) <= _prev(b))
+
+
+def _xunder(a, b):
+    a, b = np.broadcast_arrays(np.asarray(a, dtype=np.float64), np.asarray(b, dtype=np.float64))
+    return (a < b) & (_prev(a) >= _prev(b))
+
+
+def _ema(p, length):
+    return p.memo(("ta.ema", length), lambda: K.ema(p.close, length))
+
+
+def _rsi(p, length):
+    return p.memo(("ta.rsi", length), lambda: K.rsi(p.close, length))
+
+
+def _adx(p, length):
+    return p.memo(("ta.adx", length), lambda: K.adx(p.high, p.low, p.close, length=length))
+
+
+def _atr(p, length=14):
+    return p.memo(("ta.atr", length), lambda: K.atr(p.high, p.low, p.close, length=length))
+
+
+def _bbands(p, length, std):
+    return p.memo(("ta.bbands", length, std), lambda: K.bbands(p.close, length, std))
+
+
+def _pack(p, long, short, entry=None, atr=None, atr_mult=2.0, rr=1.5):
+    entry = p.close if entry is None else entry
+    atr = _atr(p) if atr is None else atr
+    sl = np.where(long, p.low - atr * atr_mult, np.where(short, p.high + atr * atr_mult, np.nan))
+    tp = np.where(long, entry + atr * rr, np.where(short, entry - atr * rr, np.nan))
+    sig = np.where(long, 1, np.where(short, -1, 0))
+    return {"signal": sig, "entry": entry, "sl": sl, "tp": tp}
+
+
+# ------- 批量策略（签名 (panel, **params) -> {signal/entry/sl/tp: 矩阵}） -------
+def batch_ema_adx(p, fast, slow, adx_len, adx_min, atr_mult, rr):
+    e1, e2 = _ema(p, fast), _ema(p, slow)
+    adx = _adx(p, adx_len)[0]
+    long = _xover(e1, e2) & (adx >= adx_min)
+    short = _xunder(e1, e2) & (adx >= adx_min)
+    return _pack(p, long, short, atr_mult=atr_mult, rr=rr)
+
+
+def batch_macd(p, fast, slow, sig, atr_mult, rr):
+    m, s, h = p.memo(("ta.macd", fast, slow, sig), lambda: K.macd(p.close, fast, slow, sig))
+    long = _xover(m, s) & (h > 0)
+    short = _xunder(m, s) & (h < 0)
+    return _pack(p, long, short, atr_mult=atr_mult, rr=rr)
+
+
+def batch_rsi_reversion(p, rsi_len, low, high, ema_len, atr_mult, rr):
+    rsi = _rsi(p, rsi_len)
+    ema200 = _ema(p, ema_len)
+    long = (p.close > ema200) & _xover(rsi, low)
+    short = (p.close < ema200) & _xunder(rsi, high)
+    return _pack(p, long, short, atr_mult=atr_mult, rr=rr)
+
+
+def batch_bb_mean(p, length, std, atr_mult, rr):
+    lower, mid, upper = _bbands(p, length, std)
+    rsi = _rsi(p, 14)
+    long = (p.close < lower) & (rsi < 40)
+    short = (p.close > upper) & (rsi > 60)
+    out = _pack(p, long, short, atr_mult=atr_mult, rr=rr)
+    out["tp"] = np.where(long | short, mid, out["tp"])
+    return out
+
+
+def batch_bb_squeeze(p, length, std, bw_th, atr_mult, rr):
+    lower, mid, upper = _bbands(p, length, std)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        bandwidth = (upper - lower) / mid
+    long = (bandwidth < bw_th) & _xover(p.close, upper)
+    short = (bandwidth < bw_th) & _xunder(p.close, lower)
+    return _pack(p, long, short, atr_mult=atr_mult, rr=rr)
+
+
+def batch_donchian(p, length, atr_mult, rr):
+    lower, _, upper = p.memo(("ta.donchian", length), lambda: K.donchian(p.high, p.low, length, length))
+    long = _xover(p.close, upper)
+    short = _xunder(p.close, lower)
+    return _pack(p, long, short, atr_mult=atr_mult, rr=rr)
+
+
+def batch_supertrend(p, length, multiplier, atr_mult, rr):
+    direction = p.memo(("ta.supertrend", length, multiplier),
+                       lambda: K.supertrend(p.high, p.low, p.close, length, multiplier)[1])
+    long = _xover(direction, 0.0)
+    short = _xunder(direction, 0.0)
+    return _pack(p, long, short, atr_mult=atr_mult, rr=rr)
+
+
+def batch_keltner_break(p, length, mult, atr_mult, rr):
+    lower, _, upper = p.memo(("ta.kc", length, mult), lambda: K.kc(p.high, p.low, p.close, length, mult))
+    long = _xover(p.close, upper)
+    short = _xunder(p.close, lower)
+    return _pack(p, long, short, atr_mult=atr_mult, rr=rr)
+
+
+def _hl_mid(p, n):
+    return p.memo(("hl_mid", n), lambda: (K.rolling_max(p.high, n) + K.rolling_min(p.low, n)) / 2.0)
+
+
+def batch_ichimoku(p, tenkan, kijun, senkou, atr_mult, rr):
+    its, iks = _hl_mid(p, tenkan), _hl_mid(p, kijun)
+    isa = (its + iks) / 2.0
+    isb = _hl_mid(p, senkou)
+    long = _xover(its, iks) & (p.close > np.fmax(isa, isb))
+    short = _xunder(its, iks) & (p.close < np.fmin(isa, isb))
+    return _pack(p, long, short, atr_mult=atr_mult, rr=rr)
+
+
+def batch_psar(p, af, afmax, ema_len, atr_mult, rr):
+    ps_val = p.memo(("ta.psar", af, afmax), lambda: K.psar(p.high, p.low, p.close, af=af, max_af=afmax)[0])
+    ema = _ema(p, ema_len)
+    long = _xover(p.close, ps_val) & (p.close > ema)
+    short = _xunder(p.close, ps_val) & (p.close < ema)
+    return _pack(p, long, short, atr_mult=atr_mult, rr=rr)
+
+
+def batch_stochrsi(p, rsi_len, stoch_len, k, d, low, high, atr_mult, rr):
+    kcol, dcol = p.memo(("ta.stochrsi", rsi_len, k, d), lambda: K.stochrsi(p.close, rsi_len, rsi_len, k, d))
+    long = _xover(kcol, dcol) & (kcol < low)
+    short = _xunder(kcol, dcol) & (kcol > high)
+    return _pack(p, long, short, atr_mult=atr_mult, rr=rr)
+
+
+def batch_cci(p, length, lo, hi, atr_mult, rr):
+    cci = p.memo(("ta.cci", length), lambda: K.cci(p.high, p.low, p.close, length=length))
+    long = (cci < lo) & _xover(cci, 0.0)
+    short = (cci > hi) & _xunder(cci, 0.0)
+    return _pack(p, long, short, atr_mult=atr_mult, rr=rr)
+
+
+def batch_adx_di(p, length, adx_min, atr_mult, rr):
+    ad, dmp, dmn = _adx(p, length)
+    long = _xover(dmp, dmn) & (ad >= adx_min)
+    short = _xunder(dmp, dmn) & (ad >= adx_min)
+    return _pack(p, long, short, atr_mult=atr_mult, rr=rr)
+
+
+def batch_heikin_ema(p, ema_len, atr_mult, rr):
+    ha_o, _, _, ha_c = p.memo(("ta.ha",), lambda: K.ha(p.open, p.high, p.low, p.close))
+    ema = _ema(p, ema_len)
+    long = _xover(ha_c, ha_o) & (p.close > ema)
+    short = _xunder(ha_c, ha_o) & (p.close < ema)
+    return _pack(p, long, short, atr_mult=atr_mult, rr=rr)
+
+
+def batch_vwap_pullback(p, anchor, atr_mult, rr):
+    vwap = p.memo(("vwap", anchor),
+                  lambda: K.anchored_vwap(p.high, p.low, p.close, p.volume, anchor_keys(p.ts_ms, anchor)))
+    long = _xover(p.close, vwap)
+    short = _xunder(p.close, vwap)
+    return _pack(p, long, short, entry=p.close, atr_mult=atr_mult, rr=rr)
+
+
+BATCH_REGISTRY = {
+    "ema_adx": batch_ema_adx,
+    "macd_plus": batch_macd,
+    "rsi_reversion": batch_rsi_reversion,
+    "bb_mean": batch_bb_mean,
+    "bb_squeeze": batch_bb_squeeze,
+    "donchian": batch_donchian,
+    "supertrend": batch_supertrend,
+    "keltner_break": batch_keltner_break,
+    "ichimoku_kijun": batch_ichimoku,
+    "psar_trend": batch_psar,
+    "stochrsi": batch_stochrsi,
+    "cci_reversion": batch_cci,
+    "adx_di": batch_adx_di,
+    "heikin_ema": batch_heikin_ema,
+    "vwap_pullback": batch_vwap_pullback,
+}
+
+
+def _defaults(fn) -> dict:
+    return {k: v.default for k, v in inspect.signature(fn).parameters.items()
+            if v.default is not v.empty and k != "last_only"}
+
+
+def run_batch(name: str, panel: Panel, **params) -> dict:
+    """批量入口：返回 {signal/entry/sl/tp: (symbols × bars) 矩阵}，参数缺省取 strategies_top15 的默认值"""
+    merged = _defaults(TOP15_REGISTRY[name])
+    merged.update(params)
+    return BATCH_REGISTRY[name](panel, **merged)
+
+
+def _run_panels(frames: dict, names, on_error=None, budget=None):
+    """
+    按面板逐策略批量计算 → ([(panel, name, out)], leftovers)；计算失败的 (面板, 策略) 不出现在结果里。
+    budget 为 StrategyBudget 时每个策略的批量调用各自计时、各按该策略的预算限时，
+    超时 / busy 且无可复用结果的 (面板, 策略) 同样不出现在结果里（只有它回退逐币种）。
+    """
+    names = [n for n in names if n in BATCH_REGISTRY]
+    panels, leftovers = build_panels(frames)
+    runs = []
+    for panel in panels:
+        if panel.shape[1] == 0:
+            leftovers.extend(panel.symbols)
+            continue
+        for name in names:
+            try:
+                if budget is None:
+                    out = run_batch(name, panel)
+                else:
+                    out, _ = budget.run(name, ("batch", tuple(panel.symbols)), run_batch, name, panel,
+                                        frame=int(panel.ts_ms[-1]))
+                    if out is None:
+                        continue
+                runs.append((panel, name, out))
+            except Exception as e:
+                if on_error is not None:
+                    on_error(name, e)
+    return runs, leftovers
+
+
+def last_bar_signals(frames: dict, names, on_error=None, budget=None):
+    """
+    frames: {symbol: 已剔除未收盘K线的 OHLCV DataFrame}
+    → (results, leftovers)
+      results[symbol][name] = {"signal","entry","sl","tp"}（最后一根）；
+      某策略批量计算失败（或超出 budget 中该策略的预算）时该策略不出现在 results 中，调用方应回退到逐币种路径。
+      leftovers 为无法并入面板的币种。
+    """
+    runs, leftovers = _run_panels(frames, names, on_error, budget)
+    results = {}
+    for panel, name, out in runs:
+        sig, entry, sl, tp = (out[k][:, -1] for k in ("signal", "entry", "sl", "tp"))
+        for r, symbol in enumerate(panel.symbols):
+            results.setdefault(symbol, {})[name] = {
+                "signal": int(sig[r]),
+                "entry": float(entry[r]),
+                "sl": float(sl[r]),
+                "tp": float(tp[r]),
+            }
+    return results, leftovers
+
+
+def tail_columns(x, bars: int, fill):
+    """二维矩阵（或一维序列）的最后 bars 列；不足时左侧补 fill"""
+    x = np.asarray(x)
+    lead = x.shape[:-1]
+    n = x.shape[-1]
+    if n >= bars:
+        return x[..., n - bars:]
+    out = np.full(lead + (bars,), fill, dtype=np.result_type(x.dtype, np.asarray(fill).dtype))
+    out[..., bars - n:] = x
+    return out
+
+
+def recent_bar_signals(frames: dict, names, bars: int = 1, on_error=None, budget=None):
+    """
+    与 last_bar_signals 相同，但取最后 bars 根（整段矩阵本来就算出来了，多取几列不增加计算量）
+    → (results, leftovers)
+      results[symbol][name] = {"signal": int8[bars], "entry"/"sl"/"tp": float64[bars]}；
+      历史不足 bars 根时左侧 signal 补 0、价位补 NaN。
+    """
+    bars = max(int(bars), 1)
+    runs, leftovers = _run_panels(frames, names, on_error, budget)
+    results = {}
+    for panel, name, out in runs:
+        sig = tail_columns(out["signal"], bars, 0).astype(np.int8)
+        levels = {k: tail_columns(np.asarray(out[k], dtype=np.float64), bars, np.nan) for k in ("entry", "sl", "tp")}
+        for r, symbol in enumerate(panel.symbols):
+            results.setdefault(symbol, {})[name] = {"signal": sig[r], **{k: v[r] for k, v in levels.items()}}
+    return results, leftovers
+
+
+# ------- 参数网格：同一面板上批量评估多组参数，指标按 spec 只算一次 -------
+def expand_grid(grid) -> list:
+    """{"fast": [10, 20], "slow": [50, 60]} → 笛卡尔积的参数字典列表；已是字典列表时原样返回"""
+    if isinstance(grid, dict):
+        keys = list(grid)
+        values = [v if isinstance(v, (list, tuple, range, np.ndarray)) else [v] for v in grid.values()]
+        return [dict(zip(keys, combo)) for combo in itertools.product(*values)]
+    return [dict(g) for g in grid]
+
+
+def _grid_panel(data) -> Panel:
+    if isinstance(data, Panel):
+        return data
+    frames = {"_": data} if isinstance(data, pd.DataFrame) else dict(data)
+    panels, leftovers = build_panels(frames)
+    if len(panels) != 1 or leftovers:
+        raise ValueError(f"grid needs one shared time axis: {len(panels)} panels, leftovers={leftovers}")
+    return panels[0]
+
+
+def grid_signals(name: str, data, grid, fields=("signal",)) -> dict:
+    """
+    在同一份数据上评估一组参数（grid 为 {参数: 取值列表} 或参数字典列表）。
+    data: Panel / 单个 OHLCV DataFrame / {symbol: DataFrame}（须同一时间轴）。
+    各组合共用面板上的指标缓存：如 EMA 10..60 每个长度只算一次，再被所有组合复用。
+    → {"name", "params": [组合...], "symbols", "ts_ms",
+       "signal": int8 张量 (组合 × 币种 × K线), 以及 fields 中额外要求的 entry/sl/tp（float64，同形状）,
+       "indicators": 实际计算的指标个数}
+    """
+    if name not in BATCH_REGISTRY:
+        raise KeyError(f"unknown strategy: {name}")
+    panel = _grid_panel(data)
+    base = _defaults(TOP15_REGISTRY[name])
+    combos = expand_grid(grid)
+    unknown = sorted({k for c in combos for k in c} - set(base))
+    if unknown:
+        raise ValueError(f"{name} has no parameter(s) {unknown}; valid: {sorted(base)}")
+    fields = list(dict.fromkeys(["signal", *fields]))
+    out = {f: np.empty((len(combos),) + panel.shape, dtype=np.int8 if f == "signal" else np.float64)
+           for f in fields}
+    for i, combo in enumerate(combos):
+        res = BATCH_REGISTRY[name](panel, **{**base, **combo})
+        for f in fields:
+            out[f][i] = res[f]
+    return {
+        "name": name,
+        "params": combos,
+        "symbols": panel.symbols,
+        "ts_ms": panel.ts_ms,
+        **out,
+        "indicators": len(panel._memo),
+    }
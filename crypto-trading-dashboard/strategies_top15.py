@@ -1,19 +1,92 @@
 import numpy as np
 import pandas as pd
-import pandas_ta as ta
+
+import ta_kernels as K
+from indicator_cache import cached
+from ohlcv import anchor_keys, bar_times, is_canonical
 
 # ------- helpers -------
+# 指标统一走缓存：同一根K线上各策略重复用到的 EMA/ADX/RSI/ATR 只算一次
+# 计算走 ta_kernels（与 pandas_ta 同口径的 NumPy 内核），不再经过 pandas_ta 的中间 DataFrame
+def _col(df, name):
+    return df[name].to_numpy(dtype=np.float64)
+
+
+def _hlc(df):
+    return _col(df, "high"), _col(df, "low"), _col(df, "close")
+
+
+def _series(df, *arrays):
+    out = tuple(pd.Series(a, index=df.index) for a in arrays)
+    return out[0] if len(out) == 1 else out
+
+
+def _ema(df, length):
+    return cached(df, ("ta.ema", "close", length), lambda: _series(df, K.ema(_col(df, "close"), length)))
+
+
+def _rsi(df, length):
+    return cached(df, ("ta.rsi", "close", length), lambda: _series(df, K.rsi(_col(df, "close"), length)))
+
+
+def _adx(df, length):
+    """→ (adx, dmp, dmn)"""
+    return cached(df, ("ta.adx", length), lambda: _series(df, *K.adx(*_hlc(df), length=length)))
+
+
+def _atr(df, length=14):
+    return cached(df, ("ta.atr", length), lambda: _series(df, K.atr(*_hlc(df), length=length)))
+
+
+def _bbands(df, length, std):
+    """→ (lower, mid, upper)"""
+    return cached(df, ("ta.bbands", length, std), lambda: _series(df, *K.bbands(_col(df, "close"), length, std)))
+
+
+def _shift1(x):
+    # b 可以是常数阈值（如 RSI 30 / 零轴），整段时与 pd.Series([b]*n).shift(1) 等价
+    return x.shift(1) if isinstance(x, pd.Series) else x
+
+
 def _xover(a, b):
-    return (a > b) & (a.shift(1) <= b.shift(1))
+    if isinstance(a, np.ndarray):  # last_only：只看最后两根
+        return np.array([False, a[-1] > _at(b, -1) and a[-2] <= _at(b, -2)])
+    return (a > b) & (a.shift(1) <= _shift1(b))
 
 
 def _xunder(a, b):
-    return (a < b) & (a.shift(1) >= b.shift(1))
+    if isinstance(a, np.ndarray):
+        return np.array([False, a[-1] < _at(b, -1) and a[-2] >= _at(b, -2)])
+    return (a < b) & (a.shift(1) >= _shift1(b))
+
+
+# ------- last_only：实时路径只读最后一根 -------
+# last_only=True 时策略只返回最后一根的 signal/entry/sl/tp（单行 DataFrame），与整段计算取 iloc[-1] 一致：
+#   · 有限窗口指标（BB / Donchian / CCI / Ichimoku / VWAP）只在够 warmup 的尾部视图上算；
+#   · 递推类指标（EMA / RSI / ADX / ATR / PSAR / Supertrend…）依赖全部历史，仍整段计算（走指标缓存，各策略共享）；
+#   · 条件只在最后两根的 numpy 数组上求值（交叉需要前一根），避开整段 pandas 运算与打包。
+def _tail(df, n, last_only):
+    """有限窗口指标的输入：last_only 时只取最后 n 根（视图，不复制）"""
+    return df.iloc[-n:] if last_only and len(df) > n else df
+
+
+def _last2(last_only, *series):
+    """条件求值区间：last_only 时换成最后两根的 numpy 数组"""
+    if not last_only:
+        return series
+    # 不足两根时前补 NaN，与 shift(1) 的首根 NaN 口径一致
+    return tuple(np.r_[np.nan, s] if len(s) < 2 else np.asarray(s)[-2:] for s in series)
 
 
-def _pack(df, long, short, entry=None, atr=None, atr_mult=2.0, rr=1.5):
+def _at(x, i):
+    return x[i] if isinstance(x, np.ndarray) else x
+
+
+def _pack(df, long, short, entry=None, atr=None, atr_mult=2.0, rr=1.5, last_only=False):
     entry = df["close"] if entry is None else entry
-    atr = ta.atr(df["high"], df["low"], df["close"]) if atr is None else atr
+    atr = _atr(df) if atr is None else atr
+    if last_only:
+        return _pack_last(df, bool(long[-1]), bool(short[-1]), float(entry.iloc[-1]), float(atr.iloc[-1]), atr_mult, rr)
     sl = np.where(long, df["low"] - atr * atr_mult,
                   np.where(short, df["high"] + atr * atr_mult, np.nan))
     tp = np.where(long, entry + atr * rr,
@@ -22,12 +95,25 @@ def _pack(df, long, short, entry=None, atr=None, atr_mult=2.0, rr=1.5):
     return pd.DataFrame({"signal": sig, "entry": entry, "sl": sl, "tp": tp})
 
 
+def _pack_last(df, long, short, entry, atr, atr_mult, rr):
+    """_pack 的单根版本（标量运算，口径同上）"""
+    sig, sl, tp = 0, np.nan, np.nan
+    if long:
+        sig, sl, tp = 1, float(df["low"].iloc[-1]) - atr * atr_mult, entry + atr * rr
+    elif short:
+        sig, sl, tp = -1, float(df["high"].iloc[-1]) + atr * atr_mult, entry - atr * rr
+    return pd.DataFrame({"signal": [sig], "entry": [entry], "sl": [sl], "tp": [tp]}, index=df.index[-1:])
+
+
 # 强韧版：确保 tz-naive 的 DatetimeIndex，且仅保留 OHLCV
 def _ensure_dt_index(df: pd.DataFrame, default_freq: str = "4H") -> pd.DataFrame:
     """
     确保是按时间排序的 tz-naive DatetimeIndex，并只保留 OHLCV 列。
     若没有时间列，则造一条等距时间轴做兜底，避免 RangeIndex 导致的 to_period 等问题。
+    canonical frame（见 ohlcv.py）已满足数值/排序约定，只换成时间索引，不复制数据。
     """
+    if is_canonical(df):
+        return df.set_axis(bar_times(df), axis=0, copy=False)
     dfi = df.copy()
 
     # 1) 拿到 DatetimeIndex
@@ -61,198 +147,199 @@ def _ensure_dt_index(df: pd.DataFrame, default_freq: str = "4H") -> pd.DataFrame
 
 
 # 1) EMA 20/50 + ADX 过滤（趋势跟随）
-def strat_ema_adx(df, fast=20, slow=50, adx_len=14, adx_min=20, atr_mult=2.0, rr=2.0):
-    e1 = ta.ema(df["close"], length=fast)
-    e2 = ta.ema(df["close"], length=slow)
-    adx = ta.adx(df["high"], df["low"], df["close"], length=adx_len)[f"ADX_{adx_len}"]
+def strat_ema_adx(df, fast=20, slow=50, adx_len=14, adx_min=20, atr_mult=2.0, rr=2.0, last_only=False):
+    e1 = _ema(df, fast)
+    e2 = _ema(df, slow)
+    adx, _, _ = _adx(df, adx_len)
+    e1, e2, adx = _last2(last_only, e1, e2, adx)
     long = _xover(e1, e2) & (adx >= adx_min)
     short = _xunder(e1, e2) & (adx >= adx_min)
-    return _pack(df, long, short, atr_mult=atr_mult, rr=rr)
+    return _pack(df, long, short, atr_mult=atr_mult, rr=rr, last_only=last_only)
 
 
 # 2) MACD 信号线交叉 + 直方图确认
-def strat_macd(df, fast=12, slow=26, sig=9, atr_mult=2.0, rr=2.0):
-    macd = ta.macd(df["close"], fast=fast, slow=slow, signal=sig)
-    macd_line = macd.columns[0]
-    sig_line = macd.columns[1]
-    hist_col = macd.columns[2]
-    m = macd[macd_line]
-    s = macd[sig_line]
-    h = macd[hist_col]
+def strat_macd(df, fast=12, slow=26, sig=9, atr_mult=2.0, rr=2.0, last_only=False):
+    # 按 pandas_ta 的列顺序 (MACD, MACDh, MACDs) 依次取用
+    m, s, h = cached(df, ("ta.macd", fast, slow, sig),
+                     lambda: _series(df, *K.macd(_col(df, "close"), fast, slow, sig)))
+    m, s, h = _last2(last_only, m, s, h)
     long = _xover(m, s) & (h > 0)
     short = _xunder(m, s) & (h < 0)
-    return _pack(df, long, short, atr_mult=atr_mult, rr=rr)
+    return _pack(df, long, short, atr_mult=atr_mult, rr=rr, last_only=last_only)
 
 
 # 3) RSI 反转 + EMA200 大势过滤（均值回归）
-def strat_rsi_reversion(df, rsi_len=14, low=30, high=70, ema_len=200, atr_mult=1.8, rr=1.2):
-    rsi = ta.rsi(df["close"], length=rsi_len)
-    ema200 = ta.ema(df["close"], length=ema_len)
-    long = (df["close"] > ema200) & _xover(rsi, pd.Series([low] * len(df), index=df.index))
-    short = (df["close"] < ema200) & _xunder(rsi, pd.Series([high] * len(df), index=df.index))
-    return _pack(df, long, short, atr_mult=atr_mult, rr=rr)
+def strat_rsi_reversion(df, rsi_len=14, low=30, high=70, ema_len=200, atr_mult=1.8, rr=1.2, last_only=False):
+    rsi = _rsi(df, rsi_len)
+    ema200 = _ema(df, ema_len)
+    close, rsi, ema200 = _last2(last_only, df["close"], rsi, ema200)
+    long = (close > ema200) & _xover(rsi, low)
+    short = (close < ema200) & _xunder(rsi, high)
+    return _pack(df, long, short, atr_mult=atr_mult, rr=rr, last_only=last_only)
 
 
 # 4) 布林带均值回归（BB mean-revert）
-def strat_bb_mean(df, length=20, std=2.0, atr_mult=1.6, rr=1.2):
-    bb = ta.bbands(df["close"], length=length, std=std)
-    lower = bb.filter(like="BBL").iloc[:, 0]
-    mid = bb.filter(like="BBM").iloc[:, 0]
-    upper = bb.filter(like="BBU").iloc[:, 0]
-    rsi = ta.rsi(df["close"], length=14)
-    long = (df["close"] < lower) & (rsi < 40)
-    short = (df["close"] > upper) & (rsi > 60)
-    out = _pack(df, long, short, atr_mult=atr_mult, rr=rr)
+def strat_bb_mean(df, length=20, std=2.0, atr_mult=1.6, rr=1.2, last_only=False):
+    lower, mid, upper = _bbands(_tail(df, length + 1, last_only), length, std)
+    rsi = _rsi(df, 14)
+    close, lower, mid, upper, rsi = _last2(last_only, df["close"], lower, mid, upper, rsi)
+    long = (close < lower) & (rsi < 40)
+    short = (close > upper) & (rsi > 60)
+    out = _pack(df, long, short, atr_mult=atr_mult, rr=rr, last_only=last_only)
+    if last_only:
+        if long[-1] or short[-1]:
+            out["tp"] = mid[-1]
+        return out
     out.loc[long, "tp"] = mid[long]
     out.loc[short, "tp"] = mid[short]
     return out
 
 
 # 5) 布林带挤压突破（Squeeze Breakout）
-def strat_bb_squeeze(df, length=20, std=2.0, bw_th=0.05, atr_mult=2.2, rr=2.2):
-    bb = ta.bbands(df["close"], length=length, std=std)
-    lower = bb.filter(like="BBL").iloc[:, 0]
-    mid = bb.filter(like="BBM").iloc[:, 0]
-    upper = bb.filter(like="BBU").iloc[:, 0]
+def strat_bb_squeeze(df, length=20, std=2.0, bw_th=0.05, atr_mult=2.2, rr=2.2, last_only=False):
+    lower, mid, upper = _bbands(_tail(df, length + 1, last_only), length, std)
+    close, lower, mid, upper = _last2(last_only, df["close"], lower, mid, upper)
     bandwidth = (upper - lower) / mid
-    long = (bandwidth < bw_th) & _xover(df["close"], upper)
-    short = (bandwidth < bw_th) & _xunder(df["close"], lower)
-    return _pack(df, long, short, atr_mult=atr_mult, rr=rr)
+    long = (bandwidth < bw_th) & _xover(close, upper)
+    short = (bandwidth < bw_th) & _xunder(close, lower)
+    return _pack(df, long, short, atr_mult=atr_mult, rr=rr, last_only=last_only)
 
 
 # 6) Donchian 20 突破 + ATR 止损（海龟）
-def strat_donchian(df, length=20, atr_mult=2.5, rr=2.5):
-    dc = ta.donchian(df["high"], df["low"], lower_length=length, upper_length=length)
-    upper = dc.filter(like="DCU").iloc[:, 0]
-    lower = dc.filter(like="DCL").iloc[:, 0]
-    long = _xover(df["close"], upper)
-    short = _xunder(df["close"], lower)
-    return _pack(df, long, short, atr_mult=atr_mult, rr=rr)
+def strat_donchian(df, length=20, atr_mult=2.5, rr=2.5, last_only=False):
+    w = _tail(df, length + 1, last_only)
+    lower, _, upper = cached(w, ("ta.donchian", length),
+                             lambda: _series(w, *K.donchian(_col(w, "high"), _col(w, "low"), length, length)))
+    close, lower, upper = _last2(last_only, df["close"], lower, upper)
+    long = _xover(close, upper)
+    short = _xunder(close, lower)
+    return _pack(df, long, short, atr_mult=atr_mult, rr=rr, last_only=last_only)
 
 
 # 7) Supertrend 趋势跟随
-def strat_supertrend(df, length=10, multiplier=3.0, atr_mult=2.0, rr=2.0):
-    st = ta.supertrend(df["high"], df["low"], df["close"], length=length, multiplier=multiplier)
-    dcol = [c for c in st.columns if c.startswith("SUPERTd")][0]
-    long = _xover(st[dcol], pd.Series(0, index=df.index))
-    short = _xunder(st[dcol], pd.Series(0, index=df.index))
-    return _pack(df, long, short, atr_mult=atr_mult, rr=rr)
+def strat_supertrend(df, length=10, multiplier=3.0, atr_mult=2.0, rr=2.0, last_only=False):
+    direction = cached(df, ("ta.supertrend", length, multiplier),
+                       lambda: _series(df, K.supertrend(*_hlc(df), length=length, multiplier=multiplier)[1]))
+    direction, = _last2(last_only, direction)
+    long = _xover(direction, 0)
+    short = _xunder(direction, 0)
+    return _pack(df, long, short, atr_mult=atr_mult, rr=rr, last_only=last_only)
 
 
 # 8) Keltner 通道突破
-def strat_keltner_break(df, length=20, mult=2.0, atr_mult=2.0, rr=2.0):
-    kc = ta.kc(df["high"], df["low"], df["close"], length=length, scalar=mult)
-    upper = kc.filter(like="KCU").iloc[:, 0]
-    lower = kc.filter(like="KCL").iloc[:, 0]
-    long = _xover(df["close"], upper)
-    short = _xunder(df["close"], lower)
-    return _pack(df, long, short, atr_mult=atr_mult, rr=rr)
+def strat_keltner_break(df, length=20, mult=2.0, atr_mult=2.0, rr=2.0, last_only=False):
+    lower, _, upper = cached(df, ("ta.kc", length, mult),
+                             lambda: _series(df, *K.kc(*_hlc(df), length=length, scalar=mult)))
+    close, lower, upper = _last2(last_only, df["close"], lower, upper)
+    long = _xover(close, upper)
+    short = _xunder(close, lower)
+    return _pack(df, long, short, atr_mult=atr_mult, rr=rr, last_only=last_only)
 
 
 # 9) Ichimoku 基准线交叉 + 云层过滤
-def strat_ichimoku(df, tenkan=9, kijun=26, senkou=52, atr_mult=2.2, rr=2.0):
+def strat_ichimoku(df, tenkan=9, kijun=26, senkou=52, atr_mult=2.2, rr=2.0, last_only=False):
     # 手算 Ichimoku（不依赖 pandas_ta.ichimoku，避免“close 必填”的版本差异）
     df = _ensure_dt_index(df)
+    w = _tail(df, max(tenkan, kijun, senkou) + 1, last_only)
+    high, low = _col(w, "high"), _col(w, "low")
 
-    hh_t = df["high"].rolling(tenkan, min_periods=tenkan).max()
-    ll_t = df["low"].rolling(tenkan, min_periods=tenkan).min()
-    its = (hh_t + ll_t) / 2.0  # Tenkan
+    def mid(n):  # (N 周期最高 + 最低) / 2，同 rolling(n, min_periods=n)
+        return (K.rolling_max(high, n) + K.rolling_min(low, n)) / 2.0
 
-    hh_k = df["high"].rolling(kijun, min_periods=kijun).max()
-    ll_k = df["low"].rolling(kijun, min_periods=kijun).min()
-    iks = (hh_k + ll_k) / 2.0  # Kijun
+    its, iks = mid(tenkan), mid(kijun)  # Tenkan / Kijun
+    isa, isb = (its + iks) / 2.0, mid(senkou)  # Span A / Span B
+    # 与 concat([isa, isb]).max(axis=1) 一样跳过 NaN
+    cloud_top, cloud_bot = np.fmax(isa, isb), np.fmin(isa, isb)
 
-    isa = (its + iks) / 2.0  # Span A
-    hh_s = df["high"].rolling(senkou, min_periods=senkou).max()
-    ll_s = df["low"].rolling(senkou, min_periods=senkou).min()
-    isb = (hh_s + ll_s) / 2.0  # Span B
+    if last_only:
+        close, its, iks, cloud_top, cloud_bot = _last2(True, w["close"], its, iks, cloud_top, cloud_bot)
+    else:
+        close = w["close"]
+        its, iks, cloud_top, cloud_bot = _series(w, its, iks, cloud_top, cloud_bot)
+    long = _xover(its, iks) & (close > cloud_top)
+    short = _xunder(its, iks) & (close < cloud_bot)
 
-    cloud_top = pd.concat([isa, isb], axis=1).max(axis=1)
-    cloud_bot = pd.concat([isa, isb], axis=1).min(axis=1)
-
-    long = _xover(its, iks) & (df["close"] > cloud_top)
-    short = _xunder(its, iks) & (df["close"] < cloud_bot)
-
-    return _pack(df, long, short, atr_mult=atr_mult, rr=rr)
+    return _pack(df, long, short, atr_mult=atr_mult, rr=rr, last_only=last_only)
 
 
 # 10) Parabolic SAR + EMA 趋势过滤
-def strat_psar(df, af=0.02, afmax=0.2, ema_len=50, atr_mult=2.0, rr=2.0):
-    ps = ta.psar(df["high"], df["low"], df["close"], af=af, max_af=afmax)
-    ps_val = ps.filter(like="PSAR").iloc[:, 0]
-    ema = ta.ema(df["close"], length=ema_len)
-    long = _xover(df["close"], ps_val) & (df["close"] > ema)
-    short = _xunder(df["close"], ps_val) & (df["close"] < ema)
-    return _pack(df, long, short, atr_mult=atr_mult, rr=rr)
+def strat_psar(df, af=0.02, afmax=0.2, ema_len=50, atr_mult=2.0, rr=2.0, last_only=False):
+    # 与原先 filter(like="PSAR") 取第一列一致：PSARl（多头 SAR）
+    ps_val = cached(df, ("ta.psar", af, afmax),
+                    lambda: _series(df, K.psar(*_hlc(df), af=af, max_af=afmax)[0]))
+    ema = _ema(df, ema_len)
+    close, ps_val, ema = _last2(last_only, df["close"], ps_val, ema)
+    long = _xover(close, ps_val) & (close > ema)
+    short = _xunder(close, ps_val) & (close < ema)
+    return _pack(df, long, short, atr_mult=atr_mult, rr=rr, last_only=last_only)
 
 
 # 11) Stochastic RSI 极值反转
-def strat_stochrsi(df, rsi_len=14, stoch_len=14, k=3, d=3, low=0.2, high=0.8, atr_mult=1.8, rr=1.2):
-    sr = ta.stochrsi(df["close"], length=rsi_len, rsi_length=rsi_len, k=k, d=d)
-    kcol = sr.filter(like="STOCHRSIk").iloc[:, 0]
-    dcol = sr.filter(like="STOCHRSId").iloc[:, 0]
+def strat_stochrsi(df, rsi_len=14, stoch_len=14, k=3, d=3, low=0.2, high=0.8, atr_mult=1.8, rr=1.2,
+                   last_only=False):
+    kcol, dcol = cached(df, ("ta.stochrsi", rsi_len, k, d),
+                        lambda: _series(df, *K.stochrsi(_col(df, "close"), rsi_len, rsi_len, k, d)))
+    kcol, dcol = _last2(last_only, kcol, dcol)
     long = _xover(kcol, dcol) & (kcol < low)
     short = _xunder(kcol, dcol) & (kcol > high)
-    return _pack(df, long, short, atr_mult=atr_mult, rr=rr)
+    return _pack(df, long, short, atr_mult=atr_mult, rr=rr, last_only=last_only)
 
 
 # 12) CCI 极值 + 零轴回归
-def strat_cci(df, length=20, lo=-100, hi=100, atr_mult=1.8, rr=1.2):
-    cci = ta.cci(df["high"], df["low"], df["close"], length=length)
-    zero = pd.Series(0, index=df.index)
-    long = (cci < lo) & _xover(cci, zero)
-    short = (cci > hi) & _xunder(cci, zero)
-    return _pack(df, long, short, atr_mult=atr_mult, rr=rr)
+def strat_cci(df, length=20, lo=-100, hi=100, atr_mult=1.8, rr=1.2, last_only=False):
+    w = _tail(df, length + 1, last_only)
+    cci = cached(w, ("ta.cci", length), lambda: _series(w, K.cci(*_hlc(w), length=length)))
+    cci, = _last2(last_only, cci)
+    long = (cci < lo) & _xover(cci, 0)
+    short = (cci > hi) & _xunder(cci, 0)
+    return _pack(df, long, short, atr_mult=atr_mult, rr=rr, last_only=last_only)
 
 
 # 13) ADX + DI 交叉（趋势确定）
-def strat_adx_di(df, length=14, adx_min=20, atr_mult=2.0, rr=2.0):
-    adx = ta.adx(df["high"], df["low"], df["close"], length=length)
-    dmp = adx[f"DMP_{length}"]
-    dmn = adx[f"DMN_{length}"]
-    ad = adx[f"ADX_{length}"]
+def strat_adx_di(df, length=14, adx_min=20, atr_mult=2.0, rr=2.0, last_only=False):
+    ad, dmp, dmn = _adx(df, length)
+    ad, dmp, dmn = _last2(last_only, ad, dmp, dmn)
     long = _xover(dmp, dmn) & (ad >= adx_min)
     short = _xunder(dmp, dmn) & (ad >= adx_min)
-    return _pack(df, long, short, atr_mult=atr_mult, rr=rr)
+    return _pack(df, long, short, atr_mult=atr_mult, rr=rr, last_only=last_only)
 
 
 # 14) Heikin-Ashi 反转 + EMA 基线
-def strat_heikin_ema(df, ema_len=50, atr_mult=2.0, rr=1.6):
-    ha = ta.ha(df["open"], df["high"], df["low"], df["close"])
-    ha_o = ha.filter(like="HA_open").iloc[:, 0]
-    ha_c = ha.filter(like="HA_close").iloc[:, 0]
-    ema = ta.ema(df["close"], length=ema_len)
-    long = _xover(ha_c, ha_o) & (df["close"] > ema)
-    short = _xunder(ha_c, ha_o) & (df["close"] < ema)
-    return _pack(df, long, short, atr_mult=atr_mult, rr=rr)
+def strat_heikin_ema(df, ema_len=50, atr_mult=2.0, rr=1.6, last_only=False):
+    ha_o, _, _, ha_c = cached(df, ("ta.ha",),
+                              lambda: _series(df, *K.ha(_col(df, "open"), *_hlc(df))))
+    ema = _ema(df, ema_len)
+    close, ha_o, ha_c, ema = _last2(last_only, df["close"], ha_o, ha_c, ema)
+    long = _xover(ha_c, ha_o) & (close > ema)
+    short = _xunder(ha_c, ha_o) & (close < ema)
+    return _pack(df, long, short, atr_mult=atr_mult, rr=rr, last_only=last_only)
 
 
 # 15) VWAP 回踩/突破（日内或多周期）
-def strat_vwap_pullback(df, anchor="D", atr_mult=1.8, rr=1.5):
+def strat_vwap_pullback(df, anchor="D", atr_mult=1.8, rr=1.5, last_only=False):
     """
-    手算 VWAP：
+    手算 VWAP（K.anchored_vwap，逐根喂入的版本见 streaming.AnchoredVWAP）：
       vwap = 累计(典型价*成交量) / 累计(成交量)
     按 anchor（默认日 D）分组，每个锚点周期内独立累加。
     不使用 pandas_ta.vwap，规避 to_period 和排序告警。
     """
     df = _ensure_dt_index(df)
+    keys = anchor_keys(df.index, anchor)
 
-    typical = (df["high"] + df["low"] + df["close"]) / 3.0
-    pv = typical * df["volume"]
-
-    try:
-        grp = df.index.floor(anchor)
-    except Exception:
-        grp = pd.Series(0, index=df.index)
+    if last_only:
+        # 只从倒数第二根所在锚点周期的起点开始累加
+        start = int(np.searchsorted(keys, keys[-2])) if len(keys) > 1 else 0
+        w = df.iloc[start:]
+        vwap = K.anchored_vwap(*_hlc(w), _col(w, "volume"), keys[start:])
+        close, vwap = _last2(True, _col(w, "close"), vwap)
+    else:
+        vwap = _series(df, K.anchored_vwap(*_hlc(df), _col(df, "volume"), keys))
+        close = df["close"]
 
-    cum_pv = pv.groupby(grp).cumsum()
-    cum_v  = df["volume"].groupby(grp).cumsum().replace(0, np.nan)
-    vwap = cum_pv / cum_v
+    long = _xover(close, vwap)
+    short = _xunder(close, vwap)
 
-    long = _xover(df["close"], vwap)
-    short = _xunder(df["close"], vwap)
-
-    return _pack(df, long, short, entry=df["close"], atr_mult=atr_mult, rr=rr)
+    return _pack(df, long, short, entry=df["close"], atr_mult=atr_mult, rr=rr, last_only=last_only)
 
 
 # ------- 注册表（名字 -> 函数）-------
@@ -275,10 +362,45 @@ REGISTRY = {
 }
 
 
-def run_strategy(name: str, df: pd.DataFrame, **params) -> pd.DataFrame:
-    """统一入口：返回含 signal/entry/sl/tp 的 DataFrame"""
+# ------- 声明式元数据（供 planner 使用）-------
+# indicators 与 cached() 的 spec 同写法，其中的字符串若是策略参数名，按参数取值（如 "fast" → 20）；
+# warmup 由指标的 NaN 前缀推出（见 planner.LOOKBACK），optional 中的指标只参与去重、不计入 warmup；
+# cost 为相对耗时（1 最轻）；family 为策略类型 trend / breakout / reversion（regime 按市场形态挑选策略）。
+META = {
+    "ema_adx": {"indicators": [("ta.ema", "close", "fast"), ("ta.ema", "close", "slow"), ("ta.adx", "adx_len"),
+                               ("ta.atr", 14)], "cost": 2, "family": "trend"},
+    "macd_plus": {"indicators": [("ta.macd", "fast", "slow", "sig"), ("ta.atr", 14)], "cost": 2, "family": "trend"},
+    "rsi_reversion": {"indicators": [("ta.rsi", "close", "rsi_len"), ("ta.ema", "close", "ema_len"), ("ta.atr", 14)],
+                      "cost": 1, "family": "reversion"},
+    "bb_mean": {"indicators": [("ta.bbands", "length", "std"), ("ta.rsi", "close", 14), ("ta.atr", 14)], "cost": 2,
+                "family": "reversion"},
+    "bb_squeeze": {"indicators": [("ta.bbands", "length", "std"), ("ta.atr", 14)], "cost": 1, "family": "breakout"},
+    "donchian": {"indicators": [("ta.donchian", "length"), ("ta.atr", 14)], "cost": 1, "family": "breakout"},
+    "supertrend": {"indicators": [("ta.supertrend", "length", "multiplier"), ("ta.atr", 14)], "cost": 1,
+                   "family": "trend"},
+    "keltner_break": {"indicators": [("ta.kc", "length", "mult"), ("ta.atr", 14)], "cost": 1, "family": "breakout"},
+    # 云层取 fmax/fmin 会跳过 NaN，Span B（senkou）未就绪时也能出信号，故不计入 warmup
+    "ichimoku_kijun": {"indicators": [("hl_mid", "tenkan"), ("hl_mid", "kijun"), ("ta.atr", 14)],
+                       "optional": [("hl_mid", "senkou")], "cost": 2, "family": "trend"},
+    "psar_trend": {"indicators": [("ta.psar", "af", "afmax"), ("ta.ema", "close", "ema_len"), ("ta.atr", 14)],
+                   "cost": 1, "family": "trend"},
+    "stochrsi": {"indicators": [("ta.stochrsi", "rsi_len", "k", "d"), ("ta.atr", 14)], "cost": 2,
+                 "family": "reversion"},
+    "cci_reversion": {"indicators": [("ta.cci", "length"), ("ta.atr", 14)], "cost": 1, "family": "reversion"},
+    "adx_di": {"indicators": [("ta.adx", "length"), ("ta.atr", 14)], "cost": 2, "family": "trend"},
+    "heikin_ema": {"indicators": [("ta.ha",), ("ta.ema", "close", "ema_len"), ("ta.atr", 14)], "cost": 1,
+                   "family": "trend"},
+    "vwap_pullback": {"indicators": [("vwap", "anchor"), ("ta.atr", 14)], "cost": 3, "family": "reversion"},
+}
+
+
+def run_strategy(name: str, df: pd.DataFrame, last_only: bool = False, **params) -> pd.DataFrame:
+    """
+    统一入口：返回含 signal/entry/sl/tp 的 DataFrame（策略不修改入参，按引用传入）。
+    last_only=True 时只返回最后一根（单行），结果与整段计算的最后一行一致。
+    """
     fn = REGISTRY[name]
-    return fn(df.copy(), **params)
+    return fn(df, last_only=last_only, **params)
 
 
 
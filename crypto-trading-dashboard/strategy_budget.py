@@ -0,0 +1,138 @@
+# strategy_budget.py — 信号计算里每个策略的时间预算与隔离
+# 策略调用放到工作线程里执行，调用方最多等 budget_ms：
+#   · 超时的调用被放弃（Python 线程无法强杀，它跑完后耗时照常记录，结果留作“上一根”）；
+#   · 同一策略还有被放弃的调用没跑完时，不再派新的调用（busy），避免一个卡死的策略占满线程池；
+#   · 超时 / busy 时按 on_timeout 处理："skip" 不出结果，"reuse" 沿用该策略在同一 key、同一 frame
+#     （同一根K线）上一次成功的结果；别的K线上的旧结果不复用，免得把上一根的信号当成新信号。
+# 每个策略最近 window 次的耗时进环形缓冲，stats() 给出 p50 / p99 与各类计数。
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+import numpy as np
+
+_MISSING = object()
+
+
+class StrategyBudget:
+    """budget_ms <= 0 时在调用线程里直接执行（只计时，不限时）"""
+
+    def __init__(self, budget_ms: float = 1000, overrides: dict = None, on_timeout: str = "skip",
+                 max_workers: int = 8, window: int = 512):
+        if on_timeout not in ("skip", "reuse"):
+            raise ValueError(f"on_timeout must be 'skip' or 'reuse', got {on_timeout!r}")
+        self.budget_ms = float(budget_ms)
+        self.overrides = {k: float(v) for k, v in (overrides or {}).items()}
+        self.on_timeout = on_timeout
+        self.window = int(window)
+        self._pool = ThreadPoolExecutor(max_workers=int(max_workers), thread_name_prefix="strategy")
+        self._lock = threading.Lock()
+        self._times = {}     # name -> deque[ms]
+        self._counts = {}    # name -> {ok/timeout/busy/reused/error: n}
+        self._inflight = {}  # name -> 被放弃但仍在运行的调用数
+        self._last = {}      # (name, key) -> (frame, 上一次成功的结果)
+
+    def budget(self, name: str) -> float:
+        return self.overrides.get(name, self.budget_ms)
+
+    def _count(self, name, what):
+        c = self._counts.setdefault(name, {"ok": 0, "timeout": 0, "busy": 0, "reused": 0, "error": 0})
+        c[what] += 1
+
+    def _record(self, name, ms):
+        with self._lock:
+            self._times.setdefault(name, deque(maxlen=self.window)).append(ms)
+
+    def _timed(self, name, fn, args, kwargs):
+        t0 = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self._record(name, (time.perf_counter() - t0) * 1000.0)
+
+    def _fallback(self, name, key, what, frame):
+        with self._lock:
+            self._count(name, what)
+            last_frame, last = self._last.get((name, key), (None, _MISSING))
+            if self.on_timeout == "reuse" and last is not _MISSING and last_frame == frame:
+                self._count(name, "reused")
+                return last, "reused"
+        return None, what
+
+    def _finish_abandoned(self, name, key, frame, fut):
+        with self._lock:
+            self._inflight[name] -= 1
+            if not fut.cancelled() and fut.exception() is None:
+                self._last[(name, key)] = (frame, fut.result())
+
+    def run(self, name: str, key, fn, *args, frame=None, **kwargs):
+        """
+        在预算内执行 fn(*args, **kwargs) → (结果, 状态)，状态为 ok / timeout / busy / reused。
+        key 区分同一策略的不同对象（通常是 symbol）；frame 标识本次输入（通常是最后一根K线的时间），
+        reuse 只复用 frame 相同的上一次结果。fn 抛出的异常计数后原样抛出。
+        """
+        budget = self.budget(name)
+        if budget <= 0:
+            try:
+                result = self._timed(name, fn, args, kwargs)
+            except Exception:
+                with self._lock:
+                    self._count(name, "error")
+                raise
+        else:
+            with self._lock:
+                busy = self._inflight.get(name, 0) > 0
+            if busy:
+                return self._fallback(name, key, "busy", frame)
+            ctx = contextvars.copy_context()  # 带上 indicator_scope 等上下文
+            fut = self._pool.submit(ctx.run, self._timed, name, fn, args, kwargs)
+            try:
+                result = fut.result(timeout=budget / 1000.0)
+            except FutureTimeout:
+                with self._lock:
+                    self._inflight[name] = self._inflight.get(name, 0) + 1
+                fut.add_done_callback(lambda f: self._finish_abandoned(name, key, frame, f))
+                return self._fallback(name, key, "timeout", frame)
+            except Exception:
+                with self._lock:
+                    self._count(name, "error")
+                raise
+        with self._lock:
+            self._count(name, "ok")
+            self._last[(name, key)] = (frame, result)
+        return result, "ok"
+
+    def stats(self) -> dict:
+        """{策略名: {samples（窗口内耗时样本数）, ok, timeout, busy, reused, error, running, p50_ms, p99_ms, max_ms, budget_ms}}"""
+        with self._lock:
+            names = sorted(set(self._times) | set(self._counts))
+            out = {}
+            for name in names:
+                ts = np.asarray(self._times.get(name, ()), dtype=np.float64)
+                c = dict(self._counts.get(name, {}))
+                out[name] = {
+                    "samples": len(ts),
+                    **c,
+                    "running": self._inflight.get(name, 0),
+                    "p50_ms": round(float(np.percentile(ts, 50)), 3) if len(ts) else None,
+                    "p99_ms": round(float(np.percentile(ts, 99)), 3) if len(ts) else None,
+                    "max_ms": round(float(ts.max()), 3) if len(ts) else None,
+                    "budget_ms": self.budget(name),
+                }
+            return out
+
+    def forget(self, names):
+        """丢弃这些策略保存的上一次结果（策略代码热加载后旧结果不再可复用）"""
+        names = set(names)
+        with self._lock:
+            for k in [k for k in self._last if k[0] in names]:
+                del self._last[k]
+
+    def reset(self):
+        with self._lock:
+            self._times.clear()
+            self._counts.clear()
+            self._last.clear()
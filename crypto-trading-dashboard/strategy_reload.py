@@ -0,0 +1,297 @@
+# strategy_reload.py — 策略模块热加载：不重启进程、不清空已预热的K线与指标缓存
+# 从磁盘重新执行 strategies / strategies_top15 / strategies_batch，新模块全部加载成功后才替换
+# （任何一个出错则恢复旧模块，运行中的服务不受影响）；随后把各调用方模块里从旧模块导入的名字
+# （注册表、策略函数等）一次性改指向新对象。
+# 改动检测按函数粒度比较字节码（不含行号，只挪动位置不算改动）、默认参数与引用到的模块级常量，
+# 再沿函数调用关系向上传播；只有用到改动代码的策略算“改动”，也只失效改动代码里出现的指标 spec，
+# 其余缓存原样保留。
+import importlib.util
+import inspect
+import os
+import sys
+import types
+
+# 按依赖顺序重新加载
+MODULES = ("strategies", "strategies_top15", "strategies_batch")
+
+# 运行期状态从旧模块沿用：名字 -> 是否为派生缓存（派生缓存在引用它的代码改动时丢弃，否则沿用）
+RUNTIME_STATE = {
+    "strategies": {"_DEFAULT_RELAX": False, "_CONFIG": False, "_HTF_LOCK": False, "_HTF_FEEDS": True},
+}
+
+# 按策略名索引的注册表 / 元数据：某一项的改动只算那一个策略改动（见 _registry_changes），不传播到引用整张表的代码
+TABLES = {"STRATEGY_REGISTRY", "SERIES_REGISTRY", "STRATEGY_META", "REGISTRY", "META", "BATCH_REGISTRY",
+          "TOP15_REGISTRY"}
+
+# 已从批量注册表移除的 top15 策略 -> 移除时的批量函数；批量实现改动之前保持移除（跨多次热加载）
+_BATCH_OFF = {}
+
+_APP_DIR = os.path.dirname(os.path.abspath(__file__))
+_DATA = (dict, list, tuple, set, frozenset, str, bytes, int, float, complex, bool, type(None))
+
+
+def _code_key(code):
+    # 字节码 + 常量（嵌套的 lambda / 内部函数递归展开）+ 引用的名字；不含行号与文件名
+    consts = tuple(_code_key(c) if isinstance(c, types.CodeType) else (type(c).__name__, repr(c))
+                   for c in code.co_consts)
+    return (code.co_code, consts, code.co_names, code.co_varnames, code.co_freevars, code.co_flags)
+
+
+def _strings(code, out):
+    for c in code.co_consts:
+        if isinstance(c, types.CodeType):
+            _strings(c, out)
+        elif isinstance(c, str):
+            out.add(c)
+    return out
+
+
+def _data_key(value):
+    """模块级常量的可比较表示；内含的函数按代码比较（GATES 之类的 lambda 表）"""
+    if inspect.isfunction(value):
+        return ("fn", _code_key(value.__code__), _data_key(value.__defaults__), _data_key(value.__kwdefaults__))
+    if isinstance(value, dict):
+        return ("dict", tuple(sorted(((repr(k), _data_key(v)) for k, v in value.items()), key=lambda kv: kv[0])))
+    if isinstance(value, (list, tuple)):
+        return (type(value).__name__, tuple(_data_key(v) for v in value))
+    if isinstance(value, (set, frozenset)):
+        return ("set", tuple(sorted(repr(v) for v in value)))
+    if isinstance(value, _DATA):
+        return ("v", repr(value))
+    return ("obj", type(value).__qualname__)
+
+
+def _function_key(fn):
+    return (_code_key(fn.__code__), _data_key(fn.__defaults__), _data_key(fn.__kwdefaults__))
+
+
+def _names(code):
+    names = set(code.co_names)
+    for c in code.co_consts:
+        if isinstance(c, types.CodeType):
+            names |= _names(c)
+    return names
+
+
+def _unit(obj):
+    """函数或类 → (比较用的 key, 引用的全局名字, 代码对象列表)；类按其方法与类属性整体比较"""
+    if inspect.isfunction(obj):
+        return _function_key(obj), _names(obj.__code__), [obj.__code__]
+    keys, names, codes = [], {b.__name__ for b in obj.__bases__}, []
+    for k, v in vars(obj).items():
+        fn = v.__func__ if isinstance(v, (staticmethod, classmethod)) else v.fget if isinstance(v, property) else v
+        if inspect.isfunction(fn):
+            keys.append((k, _function_key(fn)))
+            names |= _names(fn.__code__)
+            codes.append(fn.__code__)
+        elif not k.startswith("__") and isinstance(v, _DATA):
+            keys.append((k, _data_key(v)))
+    return (obj.__qualname__, tuple(keys)), names, codes
+
+
+def _units(mod):
+    return {k: _unit(v) for k, v in vars(mod).items()
+            if (inspect.isfunction(v) or inspect.isclass(v)) and v.__module__ == mod.__name__}
+
+
+def _instances(mod):
+    # 模块级的本模块类实例（如 strategies.STRICT / RELAXED）
+    return {k: v for k, v in vars(mod).items()
+            if not k.startswith("__") and not inspect.isclass(v) and not inspect.isfunction(v)
+            and type(v).__module__ == mod.__name__}
+
+
+def _data_names(value, out):
+    # 常量里嵌着的函数（如 GATES 的 lambda）引用的全局名字
+    if inspect.isfunction(value):
+        out |= _names(value.__code__)
+    elif isinstance(value, dict):
+        for v in value.values():
+            _data_names(v, out)
+    elif isinstance(value, (list, tuple)):
+        for v in value:
+            _data_names(v, out)
+    return out
+
+
+def _own_data(mod):
+    skip = RUNTIME_STATE.get(mod.__name__, {})
+    return {k: _data_key(v) for k, v in vars(mod).items()
+            if isinstance(v, _DATA) and not k.startswith("__") and k not in skip and k not in TABLES}
+
+
+def _dirty(old_units, new_units, old, new):
+    """
+    新模块中“行为可能变了”的函数/类名：自身代码、默认参数改动，或（直接或间接）引用了改动的函数、类、常量
+    """
+    old_data, new_data = _own_data(old), _own_data(new)
+    changed_data = {k for k in set(old_data) | set(new_data) if old_data.get(k) != new_data.get(k)}
+    dirty = {k for k, u in new_units.items() if k not in old_units or u[0] != old_units[k][0]}
+    # 删掉的函数：仍引用它的新代码必然也改了，这里只需把名字算作改动
+    tainted = dirty | changed_data | (set(old_units) - set(new_units))
+    refs = {k: u[1] for k, u in new_units.items()}
+    refs.update({k: _data_names(getattr(new, k), set()) for k in new_data})
+    # 实例随其类一起算改动（类里用到的常量改了，模块加载时按旧常量建好的实例也就变了）
+    refs.update({k: {type(v).__name__} for k, v in _instances(new).items()})
+    grew = True
+    while grew:
+        grew = False
+        for k, names in refs.items():
+            if k not in tainted and tainted.intersection(names):
+                tainted.add(k)
+                grew = True
+    return dirty | (tainted & set(new_units))
+
+
+def _load(name):
+    spec = importlib.util.find_spec(name)
+    if spec is None or spec.loader is None:
+        raise ImportError(f"cannot locate module {name!r}")
+    mod = importlib.util.module_from_spec(spec)
+    sys.modules[name] = mod  # 后加载的模块 import 到的是新版本
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def _carry_state(old, new, units, dirty):
+    for key, derived in RUNTIME_STATE.get(old.__name__, {}).items():
+        if not hasattr(old, key):
+            continue
+        if derived and any(key in u[1] for k, u in units.items() if k in dirty):
+            continue
+        setattr(new, key, getattr(old, key))
+
+
+def _registry_changes(pairs, metas, dirty):
+    """
+    pairs: [(旧注册表, 新注册表)]，metas: (旧元数据, 新元数据) 或 None
+    → {策略名: 是否改动（函数 dirty、换了函数、增删，或元数据变化）}
+    """
+    out = {}
+    for before, after in pairs:
+        for name in set(before) | set(after):
+            a, b = before.get(name), after.get(name)
+            if a is None or b is None:
+                changed = True
+            elif inspect.isfunction(a) and inspect.isfunction(b):
+                changed = b.__name__ in dirty or a.__name__ != b.__name__ or _function_key(a) != _function_key(b)
+            else:
+                changed = _data_key(a) != _data_key(b)
+            out[name] = out.get(name, False) or changed
+    if metas:
+        before, after = metas
+        for name in set(before) | set(after):
+            if _data_key(before.get(name)) != _data_key(after.get(name)):
+                out[name] = True
+    return out
+
+
+def _consumers(exclude):
+    for name, mod in list(sys.modules.items()):
+        path = getattr(mod, "__file__", None)
+        if mod is None or name in exclude or not path:
+            continue
+        if os.path.dirname(os.path.abspath(path)) == _APP_DIR:
+            yield mod
+
+
+def _rebind(olds, news):
+    """调用方模块里指向旧模块对象的名字改指向新对象（每个模块一次 dict.update，读到的要么全旧要么全新）"""
+    mapping = {}
+    for name in MODULES:
+        old, new = olds[name], news[name]
+        mapping.setdefault(id(old), (old, new))
+        instances = _instances(old)
+        for key, value in vars(old).items():
+            if key.startswith("__") or key not in vars(new):
+                continue
+            own = getattr(value, "__module__", None) == name
+            if (inspect.isfunction(value) or inspect.isclass(value)) and not own:
+                continue
+            if not (inspect.isfunction(value) or inspect.isclass(value) or key in instances
+                    or isinstance(value, (dict, list))):
+                continue
+            if getattr(new, key) is not value:  # 从其他模块导入的对象（如 OHLCV_COLUMNS）不用改
+                mapping.setdefault(id(value), (value, getattr(new, key)))
+    rebound = {}
+    for mod in _consumers(MODULES):
+        updates = {}
+        for key, value in list(vars(mod).items()):
+            hit = mapping.get(id(value))
+            if hit is not None and hit[0] is value:
+                updates[key] = hit[1]
+        if updates:
+            vars(mod).update(updates)
+            rebound[mod.__name__] = sorted(updates)
+    return rebound
+
+
+def reload_strategies(cache=None, budget=None) -> dict:
+    """
+    重新加载策略模块。cache 为 IndicatorCache 时只失效改动代码用到的指标 spec；
+    budget 为 StrategyBudget 时丢弃改动策略的“上一次结果”（避免 reuse 回退返回旧代码的结果）。
+    → {
+        "changed":     改动的策略名,
+        "batch_off":   逐币种逻辑改过、批量实现没跟着改的 top15 策略（不走批量路径）,
+        "invalidated": 失效的指标缓存条目数,
+        "kinds":       失效的指标 spec 名,
+        "rebound":     {调用方模块: [改指向的名字]},
+      }
+    加载出错时抛出原异常，旧模块保持不变。
+    """
+    olds = {name: sys.modules.get(name) or importlib.import_module(name) for name in MODULES}
+    news = {}
+    try:
+        for name in MODULES:
+            news[name] = _load(name)
+    except BaseException:
+        for name, mod in olds.items():
+            sys.modules[name] = mod
+        raise
+
+    dirty, strings = {}, set()
+    for name in MODULES:
+        units = _units(news[name])
+        dirty[name] = _dirty(_units(olds[name]), units, olds[name], news[name])
+        _carry_state(olds[name], news[name], units, dirty[name])
+        for unit in dirty[name]:
+            for code in units[unit][2]:
+                _strings(code, strings)
+
+    old_base, base = olds["strategies"], news["strategies"]
+    old_top, top = olds["strategies_top15"], news["strategies_top15"]
+    old_batch, batch = olds["strategies_batch"], news["strategies_batch"]
+    changed = _registry_changes([(old_base.STRATEGY_REGISTRY, base.STRATEGY_REGISTRY),
+                                 (old_base.SERIES_REGISTRY, base.SERIES_REGISTRY)],
+                                (old_base.STRATEGY_META, base.STRATEGY_META), dirty["strategies"])
+    changed.update(_registry_changes([(old_top.REGISTRY, top.REGISTRY)], (old_top.META, top.META),
+                                     dirty["strategies_top15"]))
+    # 批量实现与移除前的版本比较；逐币种逻辑改了而批量实现没跟着改的，从批量注册表移除（回退到逐币种路径）
+    batch_changed = _registry_changes([({**old_batch.BATCH_REGISTRY, **_BATCH_OFF}, batch.BATCH_REGISTRY)], None,
+                                      dirty["strategies_batch"])
+    off = {n: batch.BATCH_REGISTRY[n] for n in set(_BATCH_OFF) | {n for n, c in changed.items() if c}
+           if n in batch.BATCH_REGISTRY and not batch_changed.get(n)}
+    _BATCH_OFF.clear()
+    _BATCH_OFF.update(off)
+    for n in off:
+        del batch.BATCH_REGISTRY[n]
+    for n, c in batch_changed.items():
+        changed[n] = changed.get(n, False) or c
+    names = sorted(n for n, c in changed.items() if c)
+
+    rebound = _rebind(olds, news)
+
+    kinds, invalidated = set(), 0
+    if cache is not None:
+        present = {key[3][0] for key in cache.keys() if key[3]}
+        kinds = present & strings
+        invalidated = cache.invalidate(lambda key: bool(key[3]) and key[3][0] in kinds)
+    if budget is not None and names:
+        budget.forget(names)
+    return {
+        "changed": names,
+        "batch_off": sorted(off),
+        "invalidated": invalidated,
+        "kinds": sorted(kinds),
+        "rebound": rebound,
+    }
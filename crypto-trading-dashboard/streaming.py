@@ -0,0 +1,774 @@
+# streaming.py — O(1)/根 的流式指标：用历史播种一次，之后每收一根K线 update(bar)
+# 更新规则逐步复刻 pandas 的 ewm / rolling 内核（同样的运算顺序），
+# 因此数值与 strategies.py / strategies_top15.py 中的 pandas / pandas_ta 结果一致。
+import math
+import sys
+from collections import deque
+from collections.abc import Mapping
+
+import numpy as np
+
+import seq_kernels as seq
+from ohlcv import anchor_step_ms
+
+NAN = float("nan")
+
+
+def _px(bar, key="close") -> float:
+    """bar 可以是数字，也可以是含 open/high/low/close/volume 的 dict"""
+    if isinstance(bar, Mapping):
+        v = bar.get(key)
+        return NAN if v is None else float(v)
+    return float(bar)
+
+
+def _div(a: float, b: float) -> float:
+    # 与 numpy 除法一致：除零得 ±inf / nan，而不是抛异常
+    if b == 0:
+        if a != a or a == 0:
+            return NAN
+        return math.copysign(math.inf, a) * math.copysign(1.0, b)
+    return a / b
+
+
+_CONTAINERS = (deque, list, dict)
+
+
+class _Indicator:
+    value = NAN
+
+    def seed(self, history):
+        """用历史逐根播种，返回最后一个值"""
+        for bar in history:
+            self.update(bar)
+        return self.value
+
+    @property
+    def ready(self) -> bool:
+        return self.value == self.value
+
+    def fork(self):
+        """复制当前状态（窗口/累加器另存一份，内含的指标递归复制），用于试算而不影响原状态"""
+        other = object.__new__(type(self))
+        state = self.__dict__.copy()
+        for k, v in state.items():
+            if type(v) in _CONTAINERS:
+                state[k] = v.copy()
+            elif isinstance(v, _Indicator):
+                state[k] = v.fork()
+        other.__dict__ = state
+        return other
+
+
+# ---------- EWM（pandas Series.ewm(...).mean()，ignore_na=False） ----------
+class EWM(_Indicator):
+    def __init__(self, span=None, alpha=None, adjust=True, min_periods=0):
+        if span is not None:
+            com = (float(span) - 1) / 2.0
+        elif alpha is not None:
+            com = (1.0 - alpha) / alpha
+        else:
+            raise ValueError("span or alpha required")
+        a = 1.0 / (1.0 + com)
+        self.adjust = bool(adjust)
+        self.min_periods = max(int(min_periods), 1)
+        self._old_wt_factor = 1.0 - a
+        self._new_wt = 1.0 if self.adjust else a
+        self._weighted = None  # None = 尚未见过第一根
+        self._old_wt = 1.0
+        self.nobs = 0
+
+    def update(self, bar) -> float:
+        cur = _px(bar)
+        is_obs = cur == cur
+        self.nobs += is_obs
+        w = self._weighted
+        if w is None:
+            w = cur
+            self._old_wt = 1.0
+        elif w == w:
+            self._old_wt *= self._old_wt_factor
+            if is_obs:
+                if w != cur:
+                    w = self._old_wt * w + self._new_wt * cur
+                    w /= (self._old_wt + self._new_wt)
+                if self.adjust:
+                    self._old_wt += self._new_wt
+                else:
+                    self._old_wt = 1.0
+        elif is_obs:
+            w = cur
+        self._weighted = w
+        self.value = w if self.nobs >= self.min_periods else NAN
+        return self.value
+
+
+def EMA(span: int) -> EWM:
+    """close.ewm(span=span).mean()（strategies.py 口径）"""
+    return EWM(span=span)
+
+
+def RMA(length: int) -> EWM:
+    """pandas_ta.rma：ewm(alpha=1/length, adjust=False)"""
+    return EWM(alpha=1.0 / length, adjust=False)
+
+
+class TAEMA(_Indicator):
+    """pandas_ta.ema：前 length 根取 SMA 作种子，之后 ewm(span, adjust=False)；给出 alpha 时改用 ewm(alpha)（ATR 的 presma 种子）"""
+
+    def __init__(self, length: int, alpha: float = None):
+        self.length = int(length)
+        self._buf = []
+        self._ewm = EWM(span=self.length, adjust=False) if alpha is None else EWM(alpha=alpha, adjust=False)
+
+    def update(self, bar) -> float:
+        x = _px(bar)
+        if self._buf is not None:
+            self._buf.append(x)
+            if len(self._buf) < self.length:
+                self.value = self._ewm.update(NAN)
+                return self.value
+            arr = np.asarray(self._buf, dtype=float)
+            cnt = int(np.count_nonzero(arr == arr))
+            x = float(np.where(arr == arr, arr, 0.0).sum()) / cnt if cnt else NAN
+            self._buf = None
+        self.value = self._ewm.update(x)
+        return self.value
+
+
+# ---------- 滚动窗口（pandas rolling(n).mean()/std()，min_periods=n） ----------
+class SMA(_Indicator):
+    def __init__(self, length: int, min_periods=None):
+        self.length = int(length)
+        self.min_periods = self.length if min_periods is None else int(min_periods)
+        self._win = deque()
+        self._reset()
+
+    def _reset(self):
+        self._sum = 0.0
+        self._comp_add = 0.0
+        self._comp_remove = 0.0
+        self.nobs = 0
+        self._neg_ct = 0
+        self._same = 0
+        self._prev = None
+
+    def _add(self, val):
+        if val == val:
+            self.nobs += 1
+            y = val - self._comp_add
+            t = self._sum + y
+            self._comp_add = t - self._sum - y
+            self._sum = t
+            if math.copysign(1.0, val) < 0:
+                self._neg_ct += 1
+            if val == self._prev:
+                self._same += 1
+            else:
+                self._same = 1
+            self._prev = val
+
+    def _remove(self, val):
+        if val == val:
+            self.nobs -= 1
+            y = -val - self._comp_remove
+            t = self._sum + y
+            self._comp_remove = t - self._sum - y
+            self._sum = t
+            if math.copysign(1.0, val) < 0:
+                self._neg_ct -= 1
+
+    def update(self, bar) -> float:
+        x = _px(bar)
+        self._win.append(x)
+        if self.length == 1 or len(self._win) == 1:
+            # pandas 在窗口不重叠时整窗重建
+            while len(self._win) > self.length:
+                self._win.popleft()
+            self._reset()
+            self._prev = self._win[0]
+            for v in self._win:
+                self._add(v)
+        else:
+            if len(self._win) > self.length:
+                self._remove(self._win.popleft())
+            self._add(x)
+        self.value = self._calc()
+        return self.value
+
+    def _calc(self) -> float:
+        minp = max(self.min_periods, 1)
+        if self.nobs >= minp and self.nobs > 0:
+            result = self._sum / self.nobs
+            if self._same >= self.nobs:
+                result = self._prev
+            elif self._neg_ct == 0 and result < 0:
+                result = 0.0
+            elif self._neg_ct == self.nobs and result > 0:
+                result = 0.0
+            return result
+        return NAN
+
+
+class TASMA(_Indicator):
+    """ta_kernels.sma（pandas_ta.sma）：窗口内逐个累加 x/length，求和顺序与批量相同，结果逐位一致；每根 O(length)，用于短窗口"""
+
+    def __init__(self, length: int):
+        self.length = int(length)
+        self._k = 1.0 / self.length
+        self._win = deque(maxlen=self.length)
+
+    def update(self, bar) -> float:
+        self._win.append(_px(bar))
+        if len(self._win) < self.length:
+            self.value = NAN
+            return self.value
+        acc = None
+        for v in self._win:
+            acc = v * self._k if acc is None else acc + v * self._k
+        self.value = acc
+        return self.value
+
+
+class RollingStd(_Indicator):
+    """rolling(n).std(ddof)：Welford + Kahan 增删，与 pandas roll_var 同步"""
+
+    def __init__(self, length: int, ddof: int = 1, min_periods=None):
+        self.length = int(length)
+        self.ddof = int(ddof)
+        self.min_periods = self.length if min_periods is None else int(min_periods)
+        self._win = deque()
+        self._reset()
+
+    def _reset(self):
+        self._mean = 0.0
+        self._ssqdm = 0.0
+        self._comp_add = 0.0
+        self._comp_remove = 0.0
+        self.nobs = 0
+        self._same = 0
+        self._prev = None
+
+    def _add(self, val):
+        if val != val:
+            return
+        self.nobs += 1
+        if val == self._prev:
+            self._same += 1
+        else:
+            self._same = 1
+        self._prev = val
+        prev_mean = self._mean - self._comp_add
+        y = val - self._comp_add
+        t = y - self._mean
+        self._comp_add = t + self._mean - y
+        self._mean = self._mean + t / self.nobs if self.nobs else 0.0
+        self._ssqdm = self._ssqdm + (val - prev_mean) * (val - self._mean)
+
+    def _remove(self, val):
+        if val == val:
+            self.nobs -= 1
+            if self.nobs:
+                prev_mean = self._mean - self._comp_remove
+                y = val - self._comp_remove
+                t = y - self._mean
+                self._comp_remove = t + self._mean - y
+                self._mean = self._mean - t / self.nobs
+                self._ssqdm = self._ssqdm - (val - prev_mean) * (val - self._mean)
+            else:
+                self._mean = 0.0
+                self._ssqdm = 0.0
+
+    def update(self, bar) -> float:
+        x = _px(bar)
+        self._win.append(x)
+        if self.length == 1 or len(self._win) == 1:
+            while len(self._win) > self.length:
+                self._win.popleft()
+            self._reset()
+            self._prev = self._win[0]
+            for v in self._win:
+                self._add(v)
+        else:
+            if len(self._win) > self.length:
+                self._remove(self._win.popleft())
+            self._add(x)
+        self.value = self._calc()
+        return self.value
+
+    def _calc(self) -> float:
+        minp = max(self.min_periods, 1)
+        if self.nobs >= minp and self.nobs > self.ddof:
+            if self.nobs == 1 or self._same >= self.nobs:
+                var = 0.0
+            else:
+                var = self._ssqdm / (self.nobs - float(self.ddof))
+        else:
+            return NAN
+        return math.sqrt(var) if var >= 0 else 0.0
+
+
+# ---------- 滚动极值（单调队列，与 ta_kernels.rolling_max / rolling_min 一致，min_periods=n） ----------
+class RollingMax(_Indicator):
+    """rolling(n).max()：队列里保留可能成为最大值的 (序号, 值)，值单调不增，每根均摊 O(1)"""
+
+    def __init__(self, length: int, key: str = "close"):
+        self.length = int(length)
+        self.key = key
+        self._q = deque()
+        self._i = -1
+        self._last_nan = -1  # 窗口内出现 NaN 时结果为 NaN
+
+    @staticmethod
+    def _beats(x, y) -> bool:
+        return x >= y
+
+    def update(self, bar) -> float:
+        x = _px(bar, self.key)
+        self._i += 1
+        i, q = self._i, self._q
+        if x != x:
+            self._last_nan = i
+        else:
+            while q and self._beats(x, q[-1][1]):
+                q.pop()
+            q.append((i, x))
+        start = i - self.length + 1
+        while q and q[0][0] < start:
+            q.popleft()
+        full = self.length > 0 and start >= 0 and self._last_nan < start
+        self.value = q[0][1] if full else NAN
+        return self.value
+
+
+class RollingMin(RollingMax):
+    """rolling(n).min()"""
+
+    @staticmethod
+    def _beats(x, y) -> bool:
+        return x <= y
+
+
+class Donchian(_Indicator):
+    """ta_kernels.donchian：lower / upper 为 low / high 的滚动极值，value 为中轨（Ichimoku 的 (最高+最低)/2 同此）"""
+
+    def __init__(self, lower_length: int = 20, upper_length: int = 20):
+        self._lower = RollingMin(lower_length, key="low")
+        self._upper = RollingMax(upper_length, key="high")
+        self.lower = self.upper = NAN
+
+    def update(self, bar) -> float:
+        self.lower = self._lower.update(bar)
+        self.upper = self._upper.update(bar)
+        self.value = 0.5 * (self.lower + self.upper)
+        return self.value
+
+
+# ---------- True Range / ATR / ADX ----------
+class TrueRange(_Indicator):
+    """
+    ta_style=False：strategies._atr 口径；ta_style=True：pandas_ta.true_range 口径（high==low 时加 epsilon）。
+    首根 TR = |high-low|，prenan=True 时为 NaN。
+    注：pandas_ta 只要整段出现过一次 high==low 就给所有根加 epsilon，流式只能逐根处理，
+    此时与批量结果有 ~1e-16 的相对误差。
+    """
+
+    def __init__(self, ta_style: bool = False, prenan: bool = False):
+        self.ta_style = bool(ta_style)
+        self.prenan = bool(prenan)
+        self._prev_close = None
+
+    def update(self, bar) -> float:
+        h, l, c = _px(bar, "high"), _px(bar, "low"), _px(bar, "close")
+        hl = h - l
+        if self.ta_style and hl == 0:
+            hl += sys.float_info.epsilon
+        pc = self._prev_close
+        self._prev_close = c
+        if pc is None:
+            self.value = NAN if self.prenan else abs(hl)
+            return self.value
+        parts = [abs(hl), abs(h - pc), abs(l - pc)]
+        finite = [p for p in parts if p == p]
+        self.value = max(finite) if finite else NAN
+        return self.value
+
+
+class ATR(_Indicator):
+    """strategies._atr：TR 的 n 期简单均值；同时给出 atrp%"""
+
+    def __init__(self, length: int = 14):
+        self._tr = TrueRange()
+        self._sma = SMA(length)
+        self.atrp = NAN
+
+    def update(self, bar) -> float:
+        self.value = self._sma.update(self._tr.update(bar))
+        self.atrp = _div(self.value, _px(bar, "close")) * 100.0
+        return self.value
+
+
+class WilderATR(_Indicator):
+    """pandas_ta.atr（mamode=rma, presma）：前 length 根 TR 的均值作种子，之后 RMA"""
+
+    def __init__(self, length: int = 14, prenan: bool = False):
+        self._tr = TrueRange(ta_style=True, prenan=prenan)
+        self._rma = TAEMA(length, alpha=1.0 / length)
+
+    def update(self, bar) -> float:
+        self.value = self._rma.update(self._tr.update(bar))
+        return self.value
+
+
+class ADX(_Indicator):
+    """pandas_ta.adx：value=ADX，另有 dmp / dmn"""
+
+    def __init__(self, length: int = 14, scalar: float = 100.0):
+        self.scalar = float(scalar)
+        self._atr = WilderATR(length, prenan=True)
+        self._pos = RMA(length)
+        self._neg = RMA(length)
+        self._adx = RMA(length)
+        self._prev_hl = None
+        self.dmp = NAN
+        self.dmn = NAN
+
+    @staticmethod
+    def _zero(x):
+        return 0.0 if abs(x) < sys.float_info.epsilon else x
+
+    def update(self, bar) -> float:
+        h, l = _px(bar, "high"), _px(bar, "low")
+        atr = self._atr.update(bar)
+        if self._prev_hl is None:
+            up = dn = NAN
+        else:
+            up = h - self._prev_hl[0]
+            dn = self._prev_hl[1] - l
+        self._prev_hl = (h, l)
+        pos = up if (up > dn and up > 0) else (0.0 if up == up else NAN)
+        neg = dn if (dn > up and dn > 0) else (0.0 if dn == dn else NAN)
+        k = _div(self.scalar, atr)
+        self.dmp = k * self._pos.update(self._zero(pos))
+        self.dmn = k * self._neg.update(self._zero(neg))
+        dx = _div(self.scalar * abs(self.dmp - self.dmn), self.dmp + self.dmn)
+        self.value = self._adx.update(dx)
+        return self.value
+
+
+class CCI(_Indicator):
+    """ta_kernels.cci：典型价的窗口均值与平均绝对偏差，每根 O(length)，与批量结果差 ~1e-12 量级（求和顺序不同）"""
+
+    def __init__(self, length: int = 14, c: float = 0.015):
+        self.length = int(length)
+        self.c = float(c)
+        self._win = deque(maxlen=self.length)
+        self.mad = NAN
+
+    def update(self, bar) -> float:
+        tp = (_px(bar, "high") + _px(bar, "low") + _px(bar, "close")) / 3.0
+        self._win.append(tp)
+        if len(self._win) < self.length or any(v != v for v in self._win):
+            self.value = self.mad = NAN
+            return self.value
+        mean = math.fsum(self._win) / self.length
+        self.mad = math.fsum(abs(v - mean) for v in self._win) / self.length
+        self.value = _div(tp - mean, self.c * self.mad)
+        return self.value
+
+
+# ---------- RSI / MACD / 通道 / Heikin-Ashi（ta_kernels 同名内核的逐根版本） ----------
+class RSI(_Indicator):
+    """ta_kernels.rsi：涨跌幅分别做 RMA"""
+
+    def __init__(self, length: int = 14, scalar: float = 100.0):
+        self.scalar = float(scalar)
+        self._pos = RMA(length)
+        self._neg = RMA(length)
+        self._prev_close = None
+
+    def update(self, bar) -> float:
+        c = _px(bar)
+        diff = NAN if self._prev_close is None else c - self._prev_close
+        self._prev_close = c
+        pa = self._pos.update(0.0 if diff < 0 else diff)
+        na = self._neg.update(0.0 if diff > 0 else diff)
+        self.value = _div(self.scalar * pa, pa + abs(na))
+        return self.value
+
+
+class MACD(_Indicator):
+    """ta_kernels.macd：value=MACD 线，另有 signal / hist；信号线从 MACD 线第一个有效值起算"""
+
+    def __init__(self, fast: int = 12, slow: int = 26, signal: int = 9):
+        self._fast = TAEMA(fast)
+        self._slow = TAEMA(slow)
+        self._signal = TAEMA(signal)
+        self._started = False
+        self.signal = self.hist = NAN
+
+    def update(self, bar) -> float:
+        m = self._fast.update(bar) - self._slow.update(bar)
+        self._started = self._started or m == m
+        self.signal = self._signal.update(m) if self._started else NAN
+        self.value = m
+        self.hist = m - self.signal
+        return self.value
+
+
+class BBands(_Indicator):
+    """ta_kernels.bbands（SMA ± std 倍样本标准差）：value 为中轨，另有 lower / upper"""
+
+    def __init__(self, length: int = 20, std: float = 2.0, ddof: int = 1):
+        self.std = float(std)
+        self._mid = SMA(length)
+        self._sd = RollingStd(length, ddof=ddof)
+        self.lower = self.upper = NAN
+
+    def update(self, bar) -> float:
+        mid = self._mid.update(bar)
+        dev = self.std * self._sd.update(bar)
+        self.lower, self.value, self.upper = mid - dev, mid, mid + dev
+        return self.value
+
+
+class Keltner(_Indicator):
+    """ta_kernels.kc（EMA 中轨 ± scalar 倍 TR 的 EMA）：value 为中轨，另有 lower / upper；TR 的 epsilon 口径同 TrueRange"""
+
+    def __init__(self, length: int = 20, scalar: float = 2.0):
+        self.scalar = float(scalar)
+        self._basis = TAEMA(length)
+        self._band = TAEMA(length)
+        self._tr = TrueRange(ta_style=True)
+        self.lower = self.upper = NAN
+
+    def update(self, bar) -> float:
+        basis = self._basis.update(bar)
+        band = self._band.update(self._tr.update(bar))
+        self.lower, self.value, self.upper = basis - self.scalar * band, basis, basis + self.scalar * band
+        return self.value
+
+
+class HeikinAshi(_Indicator):
+    """seq_kernels.ha_run：value 为 HA 收盘，另有 open（HA 开盘）"""
+
+    def __init__(self):
+        self._prev = None  # (上一根 HA 开盘, 上一根 HA 收盘)
+        self.open = NAN
+
+    def update(self, bar) -> float:
+        o, h, l, c = _px(bar, "open"), _px(bar, "high"), _px(bar, "low"), _px(bar, "close")
+        self.value = 0.25 * (o + h + l + c)
+        self.open = 0.5 * (o + c) if self._prev is None else 0.5 * (self._prev[0] + self._prev[1])
+        self._prev = (self.open, self.value)
+        return self.value
+
+
+class StochRSI(_Indicator):
+    """
+    ta_kernels.stochrsi：RSI 的滚动极值归一化后做两次 SMA，value 为 K，另有 d。
+    极差为 0 时加 epsilon 的口径同 TrueRange（pandas_ta 按整段判断，流式逐根）。
+    """
+
+    def __init__(self, length: int = 14, rsi_length: int = 14, k: int = 3, d: int = 3):
+        self._rsi = RSI(rsi_length)
+        self._lo = RollingMin(length)
+        self._hi = RollingMax(length)
+        self._k = TASMA(k)
+        self._d = TASMA(d)
+        self.d = NAN
+
+    def update(self, bar) -> float:
+        r = self._rsi.update(bar)
+        lo, hi = self._lo.update(r), self._hi.update(r)
+        rng = hi - lo
+        if rng == 0:
+            rng += sys.float_info.epsilon
+        self.value = self._k.update(_div(100.0 * (r - lo), rng))
+        self.d = self._d.update(self.value)
+        return self.value
+
+
+# ---------- Supertrend / PSAR（递推用 seq_kernels 的 *_resume 逐根接着算，结果与整段计算逐位一致） ----------
+class Supertrend(_Indicator):
+    """ta_kernels.supertrend：value 为方向（前 length 根为 NaN，同 pandas_ta），另有 trend；ATR 的 epsilon 口径同 TrueRange"""
+
+    def __init__(self, length: int = 7, multiplier: float = 3.0):
+        self.length = int(length)
+        self.multiplier = float(multiplier)
+        self._atr = WilderATR(self.length)
+        self._state = None
+        self._n = 0
+        self.trend = NAN
+
+    def update(self, bar) -> float:
+        cols = ([_px(bar, "high")], [_px(bar, "low")], [_px(bar, "close")], [self._atr.update(bar)])
+        if self._state is None:
+            out, self._state = seq.supertrend_run(*cols, self.multiplier)
+        else:
+            out, self._state = seq.supertrend_resume(self._state, *cols)
+        self._n += 1
+        self.trend = float(out[0][0]) if self._n > 1 else NAN
+        self.value = float(out[1][0]) if self._n > self.length else NAN
+        return self.value
+
+
+class PSAR(_Indicator):
+    """ta_kernels.psar：value 为多头 SAR（PSARl，空头段为 NaN），另有 short；起始方向由前两根决定，第二根起才有状态"""
+
+    def __init__(self, af0: float = 0.02, max_af: float = 0.2):
+        self.af0 = float(af0)
+        self.max_af = float(max_af)
+        self._first = None  # 首根的 (high, low, close)
+        self._state = None
+        self.short = NAN
+
+    def update(self, bar) -> float:
+        h, l, c = _px(bar, "high"), _px(bar, "low"), _px(bar, "close")
+        if self._state is not None:
+            out, self._state = seq.psar_resume(self._state, [h], [l])
+        elif self._first is None:
+            self._first = (h, l, c)
+            self.value = self.short = NAN
+            return self.value
+        else:
+            (h0, l0, c0) = self._first
+            out, self._state = seq.psar_run([h0, h], [l0, l], [c0, c], self.af0, self.max_af)
+            out = [o[1:] for o in out]
+        self.value, self.short = float(out[0][0]), float(out[1][0])
+        return self.value
+
+
+# ---------- 锚定 VWAP ----------
+class AnchoredVWAP(_Indicator):
+    """
+    ta_kernels.anchored_vwap 的逐根版本：维护当前锚点周期内的 Σ(典型价×量) 与 Σ量，跨周期清零，每根 O(1)。
+    bar 需带 ts_ms（或 ts，epoch 毫秒）；累加方式与 pandas groupby.cumsum 相同（Kahan 补偿），结果逐位一致。
+    """
+
+    def __init__(self, anchor: str = "D"):
+        self.anchor = anchor
+        self._step = anchor_step_ms(anchor)
+        self._key = None
+        self._pv = [0.0, 0.0]  # [累计, 补偿]
+        self._v = [0.0, 0.0]
+
+    @staticmethod
+    def _add(acc, x) -> float:
+        if x != x:
+            return NAN
+        y = x - acc[1]
+        t = acc[0] + y
+        acc[1] = t - acc[0] - y
+        acc[0] = t
+        return t
+
+    def update(self, bar) -> float:
+        ts = int(bar.get("ts_ms", bar.get("ts")))
+        key = ts // self._step if self._step else 0
+        if key != self._key:
+            self._key = key
+            self._pv = [0.0, 0.0]
+            self._v = [0.0, 0.0]
+        vol = _px(bar, "volume")
+        tp = (_px(bar, "high") + _px(bar, "low") + _px(bar, "close")) / 3.0
+        cum_pv = self._add(self._pv, tp * vol)
+        cum_v = self._add(self._v, vol)
+        self.value = cum_pv / cum_v if cum_v != 0 else NAN
+        return self.value
+
+
+# ---------- 更高周期K线（HTF）增量聚合 ----------
+_DAY_MS = 86_400_000
+
+
+class HTFBars:
+    """
+    把基础周期K线增量聚合成更高周期，分桶与 df.resample(rule, label="right", closed="right") 一致：
+      1D：(前一日 00:00, 当日 00:00]；1W：按自然日归到当周周日（W-SUN）。
+    同时维护 HTF 收盘价的 SMA（已完成的 HTF K线逐根喂入；查询时把正在形成的那根试算进去）。
+    时间戳为墙上时间的 epoch 毫秒，必须严格递增。
+    """
+
+    def __init__(self, rule: str, sma_lengths=(20, 60)):
+        self.rule = str(rule).upper()
+        if self.rule not in ("1D", "1W"):
+            raise ValueError(f"unsupported HTF rule: {rule}")
+        self.bars = []      # 已完成的 HTF K线：(label_ms, open, high, low, close, volume)
+        self._cur = None    # 正在形成的 [label_ms, open, high, low, close, volume]
+        self._smas = {int(n): SMA(n) for n in sma_lengths}
+        self.last_ts = None
+
+    def label(self, ts_ms: int) -> int:
+        if self.rule == "1D":
+            return -(-ts_ms // _DAY_MS) * _DAY_MS
+        day = ts_ms // _DAY_MS
+        return (day + 6 - (day + 3) % 7) * _DAY_MS  # 1970-01-01 是周四
+
+    def update(self, ts_ms: int, o, h, l, c, v=0.0):
+        ts_ms = int(ts_ms)
+        if self.last_ts is not None and ts_ms <= self.last_ts:
+            raise ValueError("HTFBars needs strictly increasing timestamps")
+        self.last_ts = ts_ms
+        lab = self.label(ts_ms)
+        cur = self._cur
+        if cur is None or cur[0] != lab:
+            if cur is not None:
+                self._close(cur)
+            cur = self._cur = [lab, NAN, NAN, NAN, NAN, 0.0]
+        # 与 resample 的 first / max / min / last / sum 一致（跳过 NaN）
+        if cur[1] != cur[1]:
+            cur[1] = o
+        if h == h and not h <= cur[2]:
+            cur[2] = h
+        if l == l and not l >= cur[3]:
+            cur[3] = l
+        if c == c:
+            cur[4] = c
+        if v == v:
+            cur[5] += v
+
+    @staticmethod
+    def _valid(bar) -> bool:
+        return all(x == x for x in bar[1:5])
+
+    def _close(self, bar):
+        if self._valid(bar):
+            self.bars.append(tuple(bar))
+            for sma in self._smas.values():
+                sma.update(bar[4])
+
+    def __len__(self) -> int:
+        return len(self.bars) + (self._cur is not None and self._valid(self._cur))
+
+    def sma(self) -> dict:
+        """HTF 收盘价 SMA 的末值（含正在形成的那根）：{length: value}"""
+        cur = self._cur
+        if cur is None or not self._valid(cur):
+            return {n: s.value for n, s in self._smas.items()}
+        return {n: s.fork().update(cur[4]) for n, s in self._smas.items()}
+
+
+class IndicatorSet:
+    """一组同步推进的流式指标：IndicatorSet(ema55=EMA(55), adx=ADX(14)).seed(history)"""
+
+    def __init__(self, **indicators):
+        self.indicators = dict(indicators)
+        self.last_bar = None
+
+    def seed(self, history):
+        for bar in history:
+            self.update(bar)
+        return self.snapshot()
+
+    def update(self, bar) -> dict:
+        for ind in self.indicators.values():
+            ind.update(bar)
+        self.last_bar = bar
+        return self.snapshot()
+
+    def snapshot(self) -> dict:
+        return {name: ind.value for name, ind in self.indicators.items()}
+
+    def __getitem__(self, name):
+        return self.indicators[name]
@@ -0,0 +1,543 @@
+# ta_kernels.py — 纯 NumPy 指标内核：输入/输出都是 float64 数组，沿最后一维计算（支持 symbols×bars 的二维输入）
+# 公式与 pandas_ta 0.4.71b0（requirements 锁定的版本）对齐：rma/ema/atr 的种子、true_range 的首根与 epsilon、
+# bbands 的样本标准差、macd 列顺序、supertrend / psar 的首根处理等都照搬；
+# 热路径不再构造中间 DataFrame；pandas_ta 兼容层（ta_compat）与 validate_against_pandas_ta 用于校验。
+# 数值与 pandas_ta 相差 ~1e-12 量级（EWM 用分块闭式解、滚动统计用窗口直接求）；
+# 两条线恰好相等的饱和区（如 StochRSI 的 K/D 同为 100）交叉判断可能因此不同。
+import math
+import sys
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+import seq_kernels as seq
+
+_EPS = sys.float_info.epsilon
+_MAX_LOG = 50.0  # 分块闭式解时 w^-L 的上限 e^50，保证精度
+_MAD_CHUNK = 4096  # rolling_mad 每块的窗口元素数
+
+
+# ---------- 基础工具 ----------
+def _arr(x) -> np.ndarray:
+    a = np.asarray(x, dtype=np.float64)
+    return np.ascontiguousarray(a)
+
+
+def _shift(x, n=1):
+    out = np.full_like(x, np.nan)
+    if n < x.shape[-1]:
+        out[..., n:] = x[..., :-n]
+    return out
+
+
+def _div(a, b):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return a / b
+
+
+def _alpha(span=None, alpha=None) -> float:
+    # 与 pandas get_center_of_mass → alpha = 1/(1+com) 的换算一致
+    com = (float(span) - 1) / 2.0 if span is not None else (1.0 - alpha) / alpha
+    return 1.0 / (1.0 + com)
+
+
+def _linrec(b, w: float):
+    """z_t = w*z_{t-1} + b_t（z_{-1}=0），沿最后一维；分块闭式解（cumsum）避免 Python 循环"""
+    n = b.shape[-1]
+    if n == 0 or w == 0:
+        return b.copy()
+    L = max(1, int(_MAX_LOG / -math.log(w))) if w < 1 else n
+    out = np.empty_like(b)
+    carry = np.zeros(b.shape[:-1])
+    for s in range(0, n, L):
+        blk = b[..., s:s + L]
+        p = w ** np.arange(blk.shape[-1], dtype=np.float64)
+        z = p * (np.cumsum(blk / p, axis=-1) + (w * carry)[..., None])
+        out[..., s:s + blk.shape[-1]] = z
+        carry = z[..., -1]
+    return out
+
+
+def _ewm_loop(x, a: float, adjust: bool, minp: int):
+    """pandas ewm 内核的逐根实现（区间内有 NaN 且 adjust=False 时走这里）"""
+    x2 = np.atleast_2d(x)
+    out = np.full_like(x2, np.nan)
+    new_wt = 1.0 if adjust else a
+    fac = 1.0 - a
+    for r in range(x2.shape[0]):
+        vals = x2[r].tolist()
+        if not vals:
+            continue
+        w = vals[0]; nobs = int(w == w); old = 1.0
+        row = out[r]
+        row[0] = w if nobs >= minp else np.nan
+        for i in range(1, len(vals)):
+            cur = vals[i]; obs = cur == cur; nobs += obs
+            if w == w:
+                old *= fac
+                if obs:
+                    if w != cur:
+                        w = (old * w + new_wt * cur) / (old + new_wt)
+                    old = old + new_wt if adjust else 1.0
+            elif obs:
+                w = cur
+            row[i] = w if nobs >= minp else np.nan
+    return out.reshape(x.shape)
+
+
+def ewm_mean(x, span=None, alpha=None, adjust=True, min_periods=0):
+    """等价于 pandas Series.ewm(span|alpha, adjust, min_periods).mean()"""
+    x = _arr(x)
+    a = _alpha(span, alpha)
+    w = 1.0 - a
+    minp = max(int(min_periods), 1)
+    valid = ~np.isnan(x)
+    nobs = np.cumsum(valid, axis=-1)
+    if adjust:
+        num = _linrec(np.where(valid, x, 0.0), w)
+        den = _linrec(valid.astype(np.float64), w)
+        y = _div(num, den)
+    else:
+        started = nobs > 0
+        if np.any(started & ~valid):
+            return _ewm_loop(x, a, adjust, minp)
+        first = started & ~_shift(started.astype(np.float64), 1).astype(bool)
+        first[..., 0] = started[..., 0]
+        b = np.where(first, x, np.where(valid, a * x, 0.0))
+        y = _linrec(b, w)
+    y[nobs < minp] = np.nan
+    return y
+
+
+def ema_span(x, span):
+    """strategies.py 口径：close.ewm(span=span).mean()"""
+    return ewm_mean(x, span=span)
+
+
+def rma(x, length):
+    """pandas_ta.rma：ewm(alpha=1/length, adjust=False)，没有 min_periods（从第一个有效值起就有值）"""
+    return ewm_mean(x, alpha=1.0 / length, adjust=False)
+
+
+def ema(x, length, start=None):
+    """pandas_ta.ema：x[start:start+length] 的均值作种子，之后 ewm(span, adjust=False)"""
+    x = _arr(x)
+    n = x.shape[-1]
+    x2 = np.atleast_2d(x)
+    starts = np.zeros(x2.shape[0], dtype=int) if start is None else np.broadcast_to(start, x2.shape[0])
+    y = np.full_like(x2, np.nan)
+    for r, s in enumerate(starts):
+        s = int(s)
+        if s + length > n:
+            continue
+        seed = x2[r, s:s + length]
+        ok = ~np.isnan(seed)
+        y[r, s + length - 1] = np.where(ok, seed, 0.0).sum() / ok.sum() if ok.any() else np.nan
+        y[r, s + length:] = x2[r, s + length:]
+    return ewm_mean(y.reshape(x.shape), span=length, adjust=False)
+
+
+def _windows(x, length):
+    return sliding_window_view(x, length, axis=-1)
+
+
+def _rolling(x, length, fn):
+    x = _arr(x)
+    out = np.full_like(x, np.nan)
+    if 0 < length <= x.shape[-1]:
+        out[..., length - 1:] = fn(_windows(x, length))
+    return out
+
+
+def _convolve_mean(w):
+    # 逐列累加 x/length：与 pandas_ta.sma 的 numba convolve 求和顺序相同，结果逐位一致
+    k = 1.0 / w.shape[-1]
+    out = w[..., 0] * k
+    for j in range(1, w.shape[-1]):
+        out = out + w[..., j] * k
+    return out
+
+
+def sma(x, length):
+    """pandas_ta.sma（min_periods=length）；与 rolling(length).mean() 相差 ~1e-15"""
+    return _rolling(x, length, _convolve_mean)
+
+
+def rolling_std(x, length, ddof=1):
+    return _rolling(x, length, lambda w: w.std(axis=-1, ddof=ddof))
+
+
+def _rolling_extreme(x, length, acc):
+    # van Herk / Gil-Werman：按 length 分块，块内做前缀、后缀累积极值，
+    # 窗口 [i, i+length-1] 恰好 = 后缀[i] ∪ 前缀[i+length-1]，与窗口长度无关的 O(n)。
+    # 极值是精确运算，结果与逐窗口求值逐位相同；窗口内有 NaN 时同样为 NaN（min_periods=length）。
+    x = _arr(x)
+    out = np.full_like(x, np.nan)
+    n = x.shape[-1]
+    if not 0 < length <= n:
+        return out
+    pad = -n % length
+    xp = np.concatenate([x, np.repeat(x[..., -1:], pad, axis=-1)], axis=-1) if pad else x
+    blocks = xp.reshape(x.shape[:-1] + (-1, length))
+    pre = acc.accumulate(blocks, axis=-1).reshape(xp.shape)
+    suf = acc.accumulate(blocks[..., ::-1], axis=-1)[..., ::-1].reshape(xp.shape)
+    out[..., length - 1:] = acc(suf[..., :n - length + 1], pre[..., length - 1:n])
+    return out
+
+
+def rolling_max(x, length):
+    """rolling(length).max()（min_periods=length）"""
+    return _rolling_extreme(x, length, np.maximum)
+
+
+def rolling_min(x, length):
+    """rolling(length).min()（min_periods=length）"""
+    return _rolling_extreme(x, length, np.minimum)
+
+
+def _first_valid(x):
+    valid = ~np.isnan(np.atleast_2d(x))
+    return np.where(valid.any(axis=-1), valid.argmax(axis=-1), x.shape[-1])
+
+
+def _non_zero_range(a, b):
+    # pandas_ta.non_zero_range：整段只要有一个 0，就给整段加 epsilon
+    d = a - b
+    if d.ndim == 1:
+        return d + _EPS if np.any(d == 0) else d
+    return d + np.where(np.any(d == 0, axis=-1, keepdims=True), _EPS, 0.0)
+
+
+# ---------- 波动/趋势 ----------
+def true_range(high, low, close, ta_style=True, prenan=False):
+    """
+    ta_style=True：pandas_ta.true_range（high-low 带 epsilon）；False：strategies._atr 的 TR。
+    首根没有前收盘，两种口径都取 |high-low|；prenan=True 时首根为 NaN（pandas_ta 的 prenan）。
+    """
+    high, low, close = _arr(high), _arr(low), _arr(close)
+    hl = _non_zero_range(high, low) if ta_style else high - low
+    pc = _shift(close)
+    tr = np.fmax(np.fmax(np.abs(hl), np.abs(high - pc)), np.abs(low - pc))
+    if prenan:
+        tr[..., :1] = np.nan
+    return tr
+
+
+def atr(high, low, close, length=14, prenan=False):
+    """pandas_ta.atr（mamode=rma, presma）：前 length 根 TR 的均值作种子（之前为 NaN），之后 rma"""
+    tr = true_range(high, low, close, prenan=prenan)
+    if tr.shape[-1] < length:
+        return np.full_like(tr, np.nan)
+    head = tr[..., :length]
+    ok = ~np.isnan(head)
+    seed = _div(np.where(ok, head, 0.0).sum(axis=-1), ok.sum(axis=-1))
+    tr[..., :length - 1] = np.nan
+    tr[..., length - 1] = seed
+    return rma(tr, length)
+
+
+def atr_sma(high, low, close, length=14):
+    """strategies._atr：TR 的简单均值，返回 (atr, atrp%)"""
+    a = sma(true_range(high, low, close, ta_style=False), length)
+    return a, _div(a, _arr(close)) * 100.0
+
+
+def _zero(x):
+    return np.where(np.abs(x) < _EPS, 0.0, x)
+
+
+def adx(high, low, close, length=14, scalar=100.0):
+    """pandas_ta.adx → (ADX, DMP, DMN)；ATR 取 prenan（首根 TR 为 NaN），ADXR 见 TACompat.adx"""
+    high, low = _arr(high), _arr(low)
+    atr_ = atr(high, low, close, length, prenan=True)
+    up = high - _shift(high)
+    dn = _shift(low) - low
+    pos = _zero(np.where((up > dn) & (up > 0), up, up * 0.0))
+    neg = _zero(np.where((dn > up) & (dn > 0), dn, dn * 0.0))
+    k = _div(scalar, atr_)
+    dmp = k * rma(pos, length)
+    dmn = k * rma(neg, length)
+    dx = _div(scalar * np.abs(dmp - dmn), dmp + dmn)
+    return rma(dx, length), dmp, dmn
+
+
+def rsi(close, length=14, scalar=100.0):
+    close = _arr(close)
+    diff = close - _shift(close)
+    pos = np.where(diff < 0, 0.0, diff)
+    neg = np.where(diff > 0, 0.0, diff)
+    pa, na = rma(pos, length), rma(neg, length)
+    return _div(scalar * pa, pa + np.abs(na))
+
+
+def macd(close, fast=12, slow=26, signal=9):
+    """返回顺序与 pandas_ta 列顺序一致：(MACD, MACDh, MACDs)"""
+    m = ema(close, fast) - ema(close, slow)
+    s = ema(m, signal, start=_first_valid(m))
+    return m, m - s, s
+
+
+def bbands(close, length=5, std=2.0, ddof=1):
+    """pandas_ta.bbands（mamode=sma, ddof=1）→ (lower, mid, upper)"""
+    mid = sma(close, length)
+    dev = std * rolling_std(close, length, ddof=ddof)
+    return mid - dev, mid, mid + dev
+
+
+def kc(high, low, close, length=20, scalar=2.0):
+    """pandas_ta.kc（mamode=ema, tr=True）→ (lower, basis, upper)"""
+    basis = ema(close, length)
+    band = ema(true_range(high, low, close), length)
+    return basis - scalar * band, basis, basis + scalar * band
+
+
+def donchian(high, low, lower_length=20, upper_length=20):
+    """→ (lower, mid, upper)"""
+    lower = rolling_min(low, lower_length)
+    upper = rolling_max(high, upper_length)
+    return lower, 0.5 * (lower + upper), upper
+
+
+def stochrsi(close, length=14, rsi_length=14, k=3, d=3):
+    """pandas_ta.stochrsi（mamode=sma）→ (k, d)，取值 0~100"""
+    r = rsi(close, rsi_length)
+    lo, hi = rolling_min(r, length), rolling_max(r, length)
+    stoch = _div(100 * (r - lo), _non_zero_range(hi, lo))
+    sk = sma(stoch, k)
+    return sk, sma(sk, d)
+
+
+def rolling_mad(x, length, mean=None):
+    """
+    rolling(length).apply(|x-mean|.mean())，按窗口向量化。
+    mean 可传入同窗口的 sma(x, length)（CCI 本来就要算）省掉一次窗口求均值；
+    窗口分块处理，|x-mean| 的临时数组控制在缓存大小内，不随 n×length 膨胀。
+    """
+    x = _arr(x)
+    out = np.full_like(x, np.nan)
+    if not 0 < length <= x.shape[-1]:
+        return out
+    win = _windows(x, length)
+    mean = win.mean(axis=-1) if mean is None else _arr(mean)[..., length - 1:]
+    res = out[..., length - 1:]
+    step = max(1, _MAD_CHUNK // length)
+    buf = np.empty(win.shape[:-2] + (min(step, win.shape[-2]), length))
+    for s in range(0, win.shape[-2], step):
+        w = win[..., s:s + step, :]
+        b = buf[..., :w.shape[-2], :]
+        np.subtract(w, mean[..., s:s + step, None], out=b)
+        np.abs(b, out=b)
+        res[..., s:s + step] = b.mean(axis=-1)
+    return out
+
+
+def cci(high, low, close, length=14, c=0.015):
+    tp = (_arr(high) + _arr(low) + _arr(close)) / 3.0
+    mean = sma(tp, length)
+    return _div(tp - mean, c * rolling_mad(tp, length, mean))
+
+
+# ---------- 递推类（逐根循环，二维时逐行；psar / supertrend / ha 的循环在 seq_kernels） ----------
+def group_cumsum(x, keys):
+    """
+    groupby(keys).cumsum()，keys 已排序（同组连续）。与 pandas 逐位一致
+    （pandas 用 Kahan 补偿累加，np.cumsum 的结果会差最后几位）。
+    """
+    x = _arr(x)
+    keys = np.asarray(keys)
+    new_group = np.r_[True, keys[1:] != keys[:-1]] if len(keys) else np.zeros(0, dtype=bool)
+    if x.ndim == 1:
+        return seq.group_cumsum(x, new_group)
+    return np.stack([seq.group_cumsum(row, new_group) for row in x])
+
+
+def anchored_vwap(high, low, close, volume, keys):
+    """
+    锚定 VWAP：每个锚点周期（keys 相同的连续段）内 Σ(典型价×量) / Σ量，周期边界清零；
+    与 groupby(keys).cumsum() 的写法逐位一致，累计量为 0 时为 NaN。
+    """
+    vol = _arr(volume)
+    cum_v = group_cumsum(vol, keys)
+    cum_v[cum_v == 0] = np.nan
+    return group_cumsum((_arr(high) + _arr(low) + _arr(close)) / 3.0 * vol, keys) / cum_v
+
+
+def _per_row(fn, *arrays, n_out):
+    arrays = [_arr(a) for a in arrays]
+    if arrays[0].ndim == 1:
+        return fn(*arrays)
+    outs = [np.empty_like(arrays[0]) for _ in range(n_out)]
+    for r in range(arrays[0].shape[0]):
+        for o, v in zip(outs, fn(*[a[r] for a in arrays])):
+            o[r] = v
+    return tuple(outs)
+
+
+def _supertrend_1d(high, low, close, length, multiplier):
+    trend, d, long, short = seq.supertrend_run(high, low, close, atr(high, low, close, length), multiplier)[0]
+    # pandas_ta 在循环之后把首根趋势线与前 length 根方向置为 NaN
+    trend[:1] = np.nan
+    d[:length] = np.nan
+    return trend, d, long, short
+
+
+def supertrend(high, low, close, length=7, multiplier=3.0):
+    """pandas_ta.supertrend → (trend, direction, long, short)"""
+    return _per_row(lambda h, l, c: _supertrend_1d(h, l, c, length, multiplier), high, low, close, n_out=4)
+
+
+def _psar_1d(high, low, close, af0, max_af):
+    return seq.psar_run(high, low, close, af0, max_af)[0]
+
+
+def psar(high, low, close=None, af0=None, af=None, max_af=None):
+    """pandas_ta.psar → (long, short, af, reversal)"""
+    af = float(af) if af and af > 0 else 0.02
+    af0 = float(af0) if af0 and af0 > 0 else af
+    max_af = float(max_af) if max_af and max_af > 0 else 0.2
+    if close is None:
+        return _per_row(lambda h, l: _psar_1d(h, l, None, af0, max_af), high, low, n_out=4)
+    return _per_row(lambda h, l, c: _psar_1d(h, l, c, af0, max_af), high, low, close, n_out=4)
+
+
+def _ha_1d(open_, high, low, close):
+    return seq.ha_run(open_, high, low, close)[0]
+
+
+def ha(open_, high, low, close):
+    """pandas_ta.ha → (HA_open, HA_high, HA_low, HA_close)"""
+    return _per_row(_ha_1d, open_, high, low, close, n_out=4)
+
+
+# ---------- pandas_ta 兼容层（返回与 pandas_ta 同名列的 DataFrame，用于对照校验） ----------
+class TACompat:
+    """用法同 pandas_ta：from ta_kernels import ta_compat as ta; ta.adx(h, l, c, length=14)"""
+
+    @staticmethod
+    def _frame(ref, cols: dict):
+        import pandas as pd
+        return pd.DataFrame(cols, index=ref.index)
+
+    @staticmethod
+    def _series(ref, values, name=None):
+        import pandas as pd
+        return pd.Series(values, index=ref.index, name=name)
+
+    def ema(self, close, length=10, **kw):
+        return self._series(close, ema(close, length), f"EMA_{length}")
+
+    def rsi(self, close, length=14, **kw):
+        return self._series(close, rsi(close, length), f"RSI_{length}")
+
+    def atr(self, high, low, close, length=14, **kw):
+        return self._series(close, atr(high, low, close, length), f"ATRr_{length}")
+
+    def adx(self, high, low, close, length=14, adxr_length=2, **kw):
+        a, p, n = adx(high, low, close, length)
+        adxr = 0.5 * (a + _shift(a, adxr_length))
+        return self._frame(close, {f"ADX_{length}": a, f"ADXR_{length}_{adxr_length}": adxr,
+                                   f"DMP_{length}": p, f"DMN_{length}": n})
+
+    def macd(self, close, fast=12, slow=26, signal=9, **kw):
+        m, h, s = macd(close, fast, slow, signal)
+        p = f"_{fast}_{slow}_{signal}"
+        return self._frame(close, {f"MACD{p}": m, f"MACDh{p}": h, f"MACDs{p}": s})
+
+    def bbands(self, close, length=5, lower_std=2.0, upper_std=2.0, ddof=1, **kw):
+        # 同 pandas_ta：上下轨倍数是 lower_std / upper_std，std= 落进 **kw 不起作用
+        c = _arr(close)
+        mid, dev = sma(c, length), rolling_std(c, length, ddof=ddof)
+        lo, up = mid - float(lower_std) * dev, mid + float(upper_std) * dev
+        ulr = _non_zero_range(up, lo)
+        p = f"_{length}_{float(lower_std)}_{float(upper_std)}"
+        return self._frame(close, {f"BBL{p}": lo, f"BBM{p}": mid, f"BBU{p}": up,
+                                   f"BBB{p}": _div(100 * ulr, mid), f"BBP{p}": _div(_non_zero_range(c, lo), ulr)})
+
+    def kc(self, high, low, close, length=20, scalar=2, **kw):
+        lo, basis, up = kc(high, low, close, length, scalar)
+        p = f"e_{length}_{scalar}"
+        return self._frame(close, {f"KCL{p}": lo, f"KCB{p}": basis, f"KCU{p}": up})
+
+    def donchian(self, high, low, lower_length=20, upper_length=20, **kw):
+        lo, mid, up = donchian(high, low, lower_length, upper_length)
+        p = f"_{lower_length}_{upper_length}"
+        return self._frame(high, {f"DCL{p}": lo, f"DCM{p}": mid, f"DCU{p}": up})
+
+    def stochrsi(self, close, length=14, rsi_length=14, k=3, d=3, **kw):
+        sk, sd = stochrsi(close, length, rsi_length, k, d)
+        p = f"_{length}_{rsi_length}_{k}_{d}"
+        return self._frame(close, {f"STOCHRSIk{p}": sk, f"STOCHRSId{p}": sd})
+
+    def cci(self, high, low, close, length=14, c=0.015, **kw):
+        return self._series(close, cci(high, low, close, length, c), f"CCI_{length}_{c}")
+
+    def supertrend(self, high, low, close, length=7, multiplier=3.0, **kw):
+        t, d, lo, sh = supertrend(high, low, close, length, multiplier)
+        p = f"_{length}_{multiplier}"
+        return self._frame(close, {f"SUPERT{p}": t, f"SUPERTd{p}": d, f"SUPERTl{p}": lo, f"SUPERTs{p}": sh})
+
+    def psar(self, high, low, close=None, af0=None, af=None, max_af=None, **kw):
+        lo, sh, a, r = psar(high, low, close, af0, af, max_af)
+        af_ = float(af) if af and af > 0 else 0.02
+        af0_ = float(af0) if af0 and af0 > 0 else af_
+        max_ = float(max_af) if max_af and max_af > 0 else 0.2
+        p = f"_{af0_}_{max_}"
+        return self._frame(high, {f"PSARl{p}": lo, f"PSARs{p}": sh, f"PSARaf{p}": a, f"PSARr{p}": r.astype(int)})
+
+    def ha(self, open_, high, low, close, **kw):
+        o, h, l, c = ha(open_, high, low, close)
+        return self._frame(close, {"HA_open": o, "HA_high": h, "HA_low": l, "HA_close": c})
+
+
+ta_compat = TACompat()
+
+
+def pandas_ta_cases(df) -> dict:
+    """
+    与 pandas_ta 对照的调用：{名称: m -> m.指标(...)}，m 传 pandas_ta 或 ta_compat。
+    不含 cci：0.4.71b0 的 cci 写成了 tp - mean / (c * mad)（运算符优先级错误），内核按标准公式计算。
+    """
+    o, h, l, c = df["open"], df["high"], df["low"], df["close"]
+    return {
+        "ema": (lambda m: m.ema(c, length=20)),
+        "rsi": (lambda m: m.rsi(c, length=14)),
+        "atr": (lambda m: m.atr(h, l, c, length=14)),
+        "adx": (lambda m: m.adx(h, l, c, length=14)),
+        "macd": (lambda m: m.macd(c, fast=12, slow=26, signal=9)),
+        "bbands": (lambda m: m.bbands(c, length=20, std=2.0)),
+        "kc": (lambda m: m.kc(h, l, c, length=20, scalar=2.0)),
+        "donchian": (lambda m: m.donchian(h, l, lower_length=20, upper_length=20)),
+        "stochrsi": (lambda m: m.stochrsi(c, length=14, rsi_length=14, k=3, d=3)),
+        "supertrend": (lambda m: m.supertrend(h, l, c, length=10, multiplier=3.0)),
+        "psar": (lambda m: m.psar(h, l, c, af=0.02, max_af=0.2)),
+        "ha": (lambda m: m.ha(o, h, l, c)),
+    }
+
+
+def validate_against_pandas_ta(df, rtol=1e-9, atol=1e-9) -> dict:
+    """
+    用真实 pandas_ta 逐列对照内核结果：{指标列: {"max_abs": .., "nan_mismatch": .., "ok": bool}}
+    未安装 pandas_ta 时返回 {"skipped": "..."}。
+    """
+    try:
+        import pandas_ta as ta
+    except Exception as e:
+        return {"skipped": f"pandas_ta unavailable: {e}"}
+    cases = pandas_ta_cases(df)
+    report = {}
+    for name, call in cases.items():
+        try:
+            ref, got = call(ta), call(ta_compat)
+        except Exception as e:
+            report[name] = {"ok": False, "error": str(e)}
+            continue
+        ref_cols = [ref] if not hasattr(ref, "columns") else [ref[col] for col in ref.columns]
+        got_cols = [got] if not hasattr(got, "columns") else [got[col] for col in got.columns]
+        for r, g in zip(ref_cols, got_cols):
+            a, b = np.asarray(r, dtype=float), np.asarray(g, dtype=float)
+            nan_mis = int(np.sum(np.isnan(a) != np.isnan(b)))
+            both = ~np.isnan(a) & ~np.isnan(b)
+            max_abs = float(np.max(np.abs(a[both] - b[both]))) if both.any() else 0.0
+            ok = nan_mis == 0 and bool(np.allclose(a[both], b[both], rtol=rtol, atol=atol))
+            report[f"{name}:{r.name}"] = {"max_abs": max_abs, "nan_mismatch": nan_mis, "ok": ok}
+    return report
@@ -0,0 +1,90 @@
+# test_correlation.py — 增量相关矩阵（RollingCorrelation / CorrelationBook）对照 pandas 整段重算
+#   pytest -q test_correlation.py
+import numpy as np
+import pandas as pd
+import pytest
+
+from correlation import CorrelationBook, RollingCorrelation, aligned_log_returns
+
+STEP = 4 * 3_600_000
+W = 50
+
+
+def _frames(n=600, symbols="ABCDE", seed=0):
+    rng = np.random.default_rng(seed)
+    idx = np.arange(n, dtype=np.int64) * STEP
+    common = rng.normal(0, 0.01, n)
+    return {s: pd.DataFrame({"close": 100 * np.exp(np.cumsum(common * k / 4 + rng.normal(0, 0.01, n)))}, index=idx)
+            for k, s in enumerate(symbols)}
+
+
+def _reference(frames, window=W):
+    return aligned_log_returns(frames).iloc[-window:].corr().to_numpy()
+
+
+def _upto(frames, end, start=0):
+    return {s: df.iloc[start:end] for s, df in frames.items()}
+
+
+@pytest.mark.parametrize("window", [2, 7, W])
+def test_rolling_matches_pandas(window):
+    rets = aligned_log_returns(_frames(n=400))
+    rc = RollingCorrelation(rets.shape[1], window)
+    for k, row in enumerate(rets.to_numpy(), start=1):
+        got = rc.update(row)
+        if k < window:
+            assert got is None
+        else:
+            np.testing.assert_allclose(got, rets.iloc[k - window:k].corr().to_numpy(), rtol=1e-9, atol=1e-9)
+
+
+def test_book_growing_and_rolling():
+    frames, book = _frames(), CorrelationBook()
+    first = book.matrix(_upto(frames, 20), W)
+    assert first["matrix"] is None and first["bars"] == 19
+    for end in list(range(W + 1, 120)) + list(range(120, 600, 7)):
+        res = book.matrix(_upto(frames, end, max(0, end - 400)), W)
+        np.testing.assert_allclose(res["matrix"], _reference(_upto(frames, end)), rtol=1e-9, atol=1e-9)
+        assert res["time"] == (end - 1) * STEP
+    # 一直走增量：累计喂入根数 = 全部收益率根数
+    assert res["bars"] == end - 1
+    # 同一根K线上重复请求返回缓存结果
+    assert book.matrix(_upto(frames, end, end - 100), W) is res
+
+
+def test_book_rebuilds_on_symbol_change():
+    frames, book = _frames(symbols="ABCDEF"), CorrelationBook()
+    book.matrix(_upto({s: frames[s] for s in "ABCDE"}, 200), W)
+    res = book.matrix(_upto(frames, 201), W)
+    assert res["symbols"] == list("ABCDEF") and res["bars"] == W
+    np.testing.assert_allclose(res["matrix"], _reference(_upto(frames, 201)), rtol=1e-9, atol=1e-9)
+    res = book.matrix(_upto({s: frames[s] for s in "ACE"}, 202), W)
+    assert res["symbols"] == list("ACE") and res["bars"] == W
+    np.testing.assert_allclose(res["matrix"], _reference(_upto({s: frames[s] for s in "ACE"}, 202)),
+                               rtol=1e-9, atol=1e-9)
+
+
+def test_book_rebuilds_on_missing_bar():
+    frames, book = _frames(), CorrelationBook()
+    book.matrix(_upto(frames, 200), W)
+    cur = _upto(frames, 205)
+    cur["C"] = cur["C"].drop(index=202 * STEP)
+    res = book.matrix(cur, W)
+    assert res["bars"] == W
+    np.testing.assert_allclose(res["matrix"], _reference(cur), rtol=1e-9, atol=1e-9)
+    # 之后对齐的新K线照常增量
+    nxt = {s: pd.concat([cur[s], frames[s].iloc[205:207]]) for s in frames}
+    res = book.matrix(nxt, W)
+    assert res["bars"] == W + 2
+    np.testing.assert_allclose(res["matrix"], _reference(nxt), rtol=1e-9, atol=1e-9)
+
+
+@pytest.mark.parametrize("bad", [0.0, -1.0, np.nan])
+def test_book_rebuilds_on_invalid_price(bad):
+    frames, book = _frames(), CorrelationBook()
+    book.matrix(_upto(frames, 200), W)
+    cur = {s: df.copy() for s, df in _upto(frames, 204).items()}
+    cur["B"].iloc[202, 0] = bad
+    res = book.matrix(cur, W)
+    assert res["bars"] == W
+    np.testing.assert_allclose(res["matrix"], _reference(cur), rtol=1e-9, atol=1e-9)
@@ -0,0 +1,43 @@
+# test_golden.py — golden.py 的 pytest 入口：内置合成数据 + GOLDEN_DATA（缺省 golden_data/）里的录制数据 × 全部已注册引擎；
+# TOP15、基础策略与 pandas_ta 的参考结果取 golden_data/reference/ 下录制好的结果（改写前的实现），不需要安装 pandas_ta
+#   pytest -q test_golden.py
+import os
+
+import pytest
+
+import golden
+
+DATASETS = golden.datasets(os.environ.get("GOLDEN_DATA", golden.GOLDEN_DATA))
+
+
+def _assert_rows(rows):
+    checked = [r for r in rows if "skipped" not in r]
+    if not checked:
+        pytest.skip("; ".join(sorted({r["skipped"] for r in rows})))
+    bad = [golden.format_row(r) for r in checked if not r["ok"]]
+    assert not bad, "\n" + "\n".join(bad)
+
+
+@pytest.mark.parametrize("ds", [ds for ds in DATASETS if ds.name.startswith("synthetic-")], ids=lambda ds: ds.name)
+def test_synthetic_sets_have_recorded_reference(ds):
+    assert ds.fixture is not None, f"missing {golden.REFERENCE_DIR}/{ds.name}.json, record it with golden.py --record"
+    assert ds.fixture["digest"] == golden.digest(ds.df)
+    labels = {golden._label(n, cfg) for n in golden.S.STRATEGY_REGISTRY for cfg in golden.CONFIGS}
+    assert labels <= set(ds.fixture.get("base", {})), "base strategies not recorded, re-record with --baseline-strategies"
+
+
+@pytest.mark.parametrize("engine", list(golden.ENGINES))
+@pytest.mark.parametrize("ds", DATASETS, ids=lambda ds: ds.name)
+def test_strategy_engine_matches_reference(ds, engine):
+    _assert_rows(golden.check_strategies(ds, engine))
+
+
+@pytest.mark.parametrize("engine", list(golden.INDICATOR_ENGINES))
+@pytest.mark.parametrize("ds", DATASETS, ids=lambda ds: ds.name)
+def test_indicator_engine_matches_reference(ds, engine):
+    _assert_rows(golden.check_indicators(ds, engine))
+
+
+@pytest.mark.parametrize("ds", DATASETS, ids=lambda ds: ds.name)
+def test_compact_cache_matches_float64(ds):
+    _assert_rows(golden.check_compact(ds))
@@ -0,0 +1,99 @@
+# test_planner.py — planner 声明的 warmup 之前不会出现完整信号（含止损/止盈），plan() 的排序 / 剔除 / 历史长度
+#   pytest -q test_planner.py
+import numpy as np
+import pytest
+
+import golden
+import planner
+import strategies as S
+import strategies_top15 as T
+
+SETS = [golden.synthetic(tf, n, seed, gaps) for tf, n, seed, gaps in [
+    ("4h", 400, 11, 0.0), ("4h", 400, 12, 0.03), ("1d", 300, 13, 0.0), ("1w", 300, 14, 0.0),
+]]
+
+
+def _complete(frame):
+    sig = frame["signal"].to_numpy()
+    levels = np.isfinite(frame[["entry", "sl", "tp"]].to_numpy(dtype=float)).all(axis=1)
+    return (sig != 0) & levels
+
+
+@pytest.mark.parametrize("ds", SETS, ids=lambda ds: ds.name)
+@pytest.mark.parametrize("name", list(T.REGISTRY))
+def test_top15_no_signal_before_warmup(name, ds):
+    need = planner.warmup(name)
+    full = _complete(T.run_strategy(name, ds.df))
+    # 整段计算的第 i 行 = 前 i+1 根K线上的结果
+    assert not full[:need - 1].any(), f"{name}: complete signal at bar {np.flatnonzero(full)[0]} < warmup {need}"
+    # 刚好 warmup-1 根时 last_only 也给不出完整信号
+    last = T.run_strategy(name, ds.df.iloc[:need - 1], last_only=True)
+    assert not _complete(last).any()
+
+
+@pytest.mark.parametrize("name, params", [
+    ("ema_adx", {"slow": 80}), ("rsi_reversion", {"ema_len": 30}), ("stochrsi", {"rsi_len": 7}),
+    ("supertrend", {"length": 20}), ("adx_di", {"length": 30}),
+])
+def test_top15_warmup_follows_params(name, params):
+    need = planner.warmup(name, params)
+    assert need != planner.warmup(name)
+    for ds in SETS:
+        full = _complete(T.run_strategy(name, ds.df, **params))
+        assert not full[:need - 1].any()
+
+
+@pytest.mark.parametrize("ds", SETS[:2], ids=lambda ds: ds.name)
+@pytest.mark.parametrize("cfg", golden.CONFIGS, ids=lambda cfg: cfg.name)
+@pytest.mark.parametrize("name", list(S.STRATEGY_REGISTRY))
+def test_base_no_signal_before_warmup(name, cfg, ds):
+    need = planner.warmup(name)
+    fn = S.STRATEGY_REGISTRY[name]
+    assert all(fn(ds.symbol, ds.df.iloc[:n], ds.tf, cfg=cfg) is None for n in range(1, need))
+    series = _complete(S.SERIES_REGISTRY[name](ds.symbol, ds.df, ds.tf, cfg=cfg))
+    assert not series[:need - 1].any()
+
+
+def test_warmup_values():
+    assert {n: planner.warmup(n) for n in [*S.STRATEGY_REGISTRY, *T.REGISTRY]} == {
+        "vegas_tunnel": 160, "chan_simplified": 80, "macd": 220,
+        "ema_adx": 50, "macd_plus": 34, "rsi_reversion": 200, "bb_mean": 20, "bb_squeeze": 20, "donchian": 20,
+        "supertrend": 14, "keltner_break": 20, "ichimoku_kijun": 26, "psar_trend": 50, "stochrsi": 19,
+        "cci_reversion": 20, "adx_di": 14, "heikin_ema": 50, "vwap_pullback": 14,
+    }
+    with pytest.raises(KeyError):
+        planner.warmup("nope")
+
+
+def test_plan_order_skip_and_history():
+    names = [*S.STRATEGY_REGISTRY, *T.REGISTRY, "nope", "donchian"]
+    p = planner.plan(names, bars=100)
+    # 按 cost 从低到高，同成本保持调用方顺序；重复的名字只保留一次
+    assert p["order"] == [
+        "bb_squeeze", "donchian", "supertrend", "keltner_break", "psar_trend", "cci_reversion", "heikin_ema",
+        "chan_simplified", "ema_adx", "macd_plus", "bb_mean", "ichimoku_kijun", "stochrsi", "adx_di",
+        "vwap_pullback",
+    ]
+    assert p["skipped"] == {
+        "vegas_tunnel": "needs 160 bars, have 100",
+        "macd": "needs 220 bars, have 100",
+        "rsi_reversion": "needs 200 bars, have 100",
+        "nope": "unknown strategy",
+    }
+    assert p["history"] == 220
+    assert p["warmup"]["vegas_tunnel"] == 160 and "nope" not in p["warmup"]
+    # 共用的指标只列一次，记下用到它的（可运行的）策略
+    assert p["indicators"][("ta.atr", 14)] == [n for n in p["order"] if n in T.REGISTRY]
+    assert p["indicators"][("ta.bbands", 20, 2.0)] == ["bb_squeeze", "bb_mean"]
+    assert ("ewm_span", "close", 55) not in p["indicators"]
+
+
+def test_plan_without_bars_runs_everything():
+    p = planner.plan(["macd", "supertrend", "vegas_tunnel"])
+    assert p["order"] == ["supertrend", "macd", "vegas_tunnel"]
+    assert p["skipped"] == {} and p["history"] == 220
+    # 历史恰好够 warmup 时可运行，少一根即剔除
+    assert planner.plan(["macd"], bars=220)["order"] == ["macd"]
+    assert planner.plan(["macd"], bars=219)["order"] == []
+    assert planner.plan(["ema_adx"], bars=79, params={"ema_adx": {"slow": 80}})["skipped"] == {
+        "ema_adx": "needs 80 bars, have 79"}
@@ -0,0 +1,85 @@
+# test_regime.py — 市场形态：Panel 批量特征与逐币种 features() 逐位一致，squeeze（布林带宽 vs ATR%）判为震荡，结果按帧复用
+#   pytest -q test_regime.py
+import numpy as np
+import pytest
+
+import golden
+import regime
+from indicator_cache import IndicatorCache
+
+
+def _frames():
+    frames = {f"S{i}": golden.synthetic("4h", 400, 20 + i).df for i in range(4)}
+    frames["GAPS"] = golden.synthetic("4h", 300, 9, 0.03).df  # 时间轴不同：单独一个 Panel
+    frames["SHORT"] = frames["S0"].iloc[:30]                   # 不够 EMA 长度 → unknown
+    holed = frames["S1"].copy()
+    holed.iloc[100, holed.columns.get_loc("close")] = np.nan   # 含 NaN → 逐币种路径
+    frames["HOLED"] = holed
+    return frames
+
+
+FRAMES = _frames()
+
+
+def _same(a, b):
+    assert a.keys() == b.keys()
+    for k in a:
+        assert a[k] == b[k] or (np.isnan(a[k]) and np.isnan(b[k])), k
+
+
+@pytest.mark.parametrize("rules", [None, {"adx_len": 10, "ema_len": 20, "slope_bars": 3, "bb_std": 1.5}])
+def test_panel_features_match_per_symbol(rules):
+    feats = regime.frames_features(FRAMES, rules)
+    assert list(feats) == list(FRAMES)
+    for s, df in FRAMES.items():
+        _same(feats[s], regime.features(df, rules))
+    if rules is None:
+        assert np.isnan(feats["SHORT"]["slope"])  # 30 根不够 EMA50
+
+
+def test_leftovers_use_indicator_cache():
+    cache = IndicatorCache()
+    feats = regime.frames_features(FRAMES, cache=cache)
+    _same(feats["HOLED"], regime.features(FRAMES["HOLED"]))
+    # 只有对不齐 Panel 的币种走逐币种缓存
+    assert {k[0] for k in cache.keys()} == {"HOLED"}
+
+
+def _feat(**kw):
+    base = {"adx": 40.0, "dmp": 30.0, "dmn": 10.0, "atrp": 2.0, "bbw": 12.0, "slope": 1.0}
+    return {**base, **kw}
+
+
+def test_classify_rules():
+    feats = {
+        "up": _feat(),
+        "down": _feat(dmp=10.0, dmn=30.0, slope=-1.0),
+        "weak": _feat(adx=15.0),
+        "flat": _feat(slope=0.2),
+        "mixed": _feat(dmp=10.0, dmn=30.0),            # 斜率向上但 -DI 占优
+        "squeeze": _feat(bbw=5.0),                     # 布林带宽 < 3 × ATR%：ADX 再高也是震荡
+        "squeeze_down": _feat(dmp=10.0, dmn=30.0, slope=-1.0, atrp=4.0, bbw=11.0),
+        "nan_bbw": _feat(bbw=np.nan),
+        "nan_atrp": _feat(atrp=np.nan),
+    }
+    assert regime.classify(feats) == {
+        "up": "trend_up", "down": "trend_down", "weak": "range", "flat": "range", "mixed": "range",
+        "squeeze": "range", "squeeze_down": "range", "nan_bbw": "unknown", "nan_atrp": "unknown",
+    }
+    # 阈值可覆盖
+    assert regime.classify({"squeeze": _feat(bbw=5.0)}, {"squeeze_kc": 2.0}) == {"squeeze": "trend_up"}
+    assert regime.classify({}) == {}
+
+
+def test_engine_reuses_until_frames_change():
+    engine = regime.RegimeEngine(IndicatorCache())
+    names = ["ema_adx", "bb_mean", "donchian"]
+    first = engine.regimes(FRAMES, "4H", names)
+    assert engine.regimes(FRAMES, "4h", names)["S0"]["features"] is first["S0"]["features"]
+    for s, r in first.items():
+        assert r["regime"] == regime.classify({s: regime.features(FRAMES[s])})[s]
+        assert r["strategies"] == regime.strategies_for(r["regime"], names)
+    moved = {**FRAMES, "S2": FRAMES["S2"].iloc[:-1]}
+    again = engine.regimes(moved, "4h", names)
+    assert again["S0"]["features"] is not first["S0"]["features"]
+    _same(again["S2"]["features"], regime.features(moved["S2"]))
@@ -0,0 +1,175 @@
+# test_scheduler.py — 按K线收盘的调度（醒来时间 / 重试次数）与快照仓库（版本号 / ETag）
+#   pytest -q test_scheduler.py
+import json
+import threading
+import warnings
+from datetime import datetime, timezone
+
+import pytest
+
+from ohlcv import anchor_step_ms
+from scheduler import BarCloseScheduler, SnapshotStore, bar_open_ms, last_closed_ms, next_close_ms, tf_ms
+
+H4 = 4 * 3600
+BAR = 1_700_006_400  # 某根4h K线的开盘时间（秒，UTC 对齐）
+SETTLE = 5.0
+RETRY = 15.0
+
+
+class Clock:
+    def __init__(self, now):
+        self.now = float(now)
+
+    def __call__(self):
+        return self.now
+
+
+def _scheduler(job=None, max_retries=3, now=BAR):
+    clock = Clock(now)
+    sched = BarCloseScheduler({"4h": job or (lambda tf, bar_ms: True)}, settle=SETTLE, retry=RETRY,
+                              max_retries=max_retries, clock=clock)
+    return sched, clock
+
+
+def test_bar_alignment():
+    assert BAR % H4 == 0
+    now_ms = (BAR + 100) * 1000
+    assert bar_open_ms(now_ms, "4h") == BAR * 1000
+    assert next_close_ms(now_ms, "4h") == (BAR + H4) * 1000
+    assert last_closed_ms(now_ms, "4h") == (BAR - H4) * 1000
+    # 周线从周一 00:00 UTC 开盘
+    week_open = bar_open_ms(now_ms, "1w")
+    opened = datetime.fromtimestamp(week_open / 1000, tz=timezone.utc)
+    assert opened.weekday() == 0 and (opened.hour, opened.minute) == (0, 0)
+    assert week_open <= now_ms < week_open + tf_ms("1w")
+    with pytest.raises(ValueError):
+        tf_ms("bogus")
+
+
+@pytest.mark.parametrize("anchor, step", [
+    ("D", 86_400_000), ("1d", 86_400_000), ("4h", H4 * 1000), ("4H", H4 * 1000), ("1H", 3_600_000),
+    ("15min", 900_000), ("15m", 900_000), ("30s", 30_000),
+    ("1w", None), ("W", None), ("W-SUN", None), ("M", None), ("1M", None), ("MS", None),
+    ("bogus", None), ("", None), ("0h", None), (None, None),
+])
+def test_anchor_step_ms(anchor, step):
+    # 大小写归一、W / M 与认不出的写法直接返回 None，不经过 pandas 已弃用的别名解析
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        assert anchor_step_ms(anchor) == step
+
+
+@pytest.mark.parametrize("offset, due", [
+    (100, BAR + H4 + SETTLE),       # K线中途 → 本根收盘 + settle
+    (H4 - 1, BAR + H4 + SETTLE),    # 收盘前 1 秒
+    (2, BAR + SETTLE),              # 刚收盘还在 settle 内 → 本次收盘 + settle
+    (SETTLE, BAR + H4 + SETTLE),    # settle 刚过 → 下一根
+])
+def test_wake_time(offset, due):
+    sched, _ = _scheduler()
+    assert sched._next_due("4h", BAR + offset, True) == due
+    assert sched._retries["4h"] == 0
+
+
+def test_retry_count_and_reset():
+    sched, _ = _scheduler(max_retries=3)
+    now = BAR + SETTLE
+    for n in (1, 2, 3):
+        assert sched._next_due("4h", now, False) == now + RETRY
+        assert sched._retries["4h"] == n
+        now += RETRY
+    # 超过 max_retries：放弃这根，等下一根收盘
+    assert sched._next_due("4h", now, False) == BAR + H4 + SETTLE
+    assert sched._retries["4h"] == 0
+    # 成功后计数清零
+    sched._next_due("4h", now, False)
+    assert sched._next_due("4h", now, True) == BAR + H4 + SETTLE
+    assert sched._retries["4h"] == 0
+
+
+def test_retry_never_passes_next_close():
+    sched, _ = _scheduler()
+    now = BAR + H4 - 3  # 离下一根收盘 3 秒，重试不晚于下一根收盘 + settle
+    assert sched._next_due("4h", now, False) == BAR + H4 + SETTLE
+
+
+def test_zero_retries_waits_for_next_close():
+    sched, _ = _scheduler(max_retries=0)
+    assert sched._next_due("4h", BAR + SETTLE, False) == BAR + H4 + SETTLE
+    assert sched._retries["4h"] == 0
+
+
+def test_run_passes_last_closed_bar_and_counts_failures():
+    calls, results = [], [False, RuntimeError("boom"), None]
+
+    def job(tf, bar_ms):
+        calls.append((tf, bar_ms))
+        r = results.pop(0)
+        if isinstance(r, Exception):
+            raise r
+        return r
+
+    sched, _ = _scheduler(job)
+    now = BAR + SETTLE + 1
+    assert sched._run("4h", now) is False
+    st = sched._stats["4h"]
+    assert st["lastError"] == "bar not available yet" and st["lastBar"] is None
+    assert sched._run("4h", now) is False
+    assert st["lastError"] == "RuntimeError: boom"
+    assert sched._run("4h", now) is True  # 返回 None 也算成功
+    assert calls == [("4h", (BAR - H4) * 1000)] * 3
+    assert (st["runs"], st["failures"], st["lastError"], st["lastBar"]) == (3, 2, None, (BAR - H4) * 1000)
+    # settle 之内仍按上一根算（交易所可能还没给出刚收盘的K线）
+    sched._run("4h", BAR + 2)
+    assert calls[-1] == ("4h", (BAR - 2 * H4) * 1000)
+
+
+def test_loop_runs_on_start_and_trigger():
+    ran = threading.Event()
+    calls = []
+
+    def job(tf, bar_ms):
+        calls.append(bar_ms)
+        ran.set()
+
+    sched = BarCloseScheduler({"4h": job}, settle=SETTLE)
+    try:
+        sched.start()
+        assert ran.wait(5)
+        ran.clear()
+        sched.trigger("4h")
+        assert ran.wait(5)
+        status = sched.status()["timeframes"]["4h"]
+        assert status["runs"] >= 2 and status["failures"] == 0 and status["nextRun"]
+    finally:
+        sched.stop()
+    assert not sched.running
+
+
+def test_snapshot_versions_and_etag():
+    store = SnapshotStore()
+    a1 = store.publish("a", "4h", BAR * 1000, [{"symbol": "BTC"}], 1.5, extra={"config": "a", "lagging": ["ETH"]})
+    b1 = store.publish("b", "4h", BAR * 1000, [])
+    a2 = store.publish("a", "4h", (BAR + H4) * 1000, [{"symbol": "BTC"}, {"symbol": "ETH"}])
+    # 版本号全局递增，ETag 随版本变化
+    assert (a1.version, b1.version, a2.version) == (1, 2, 3)
+    assert (a1.etag, b1.etag, a2.etag) == ("a-1", "b-2", "a-3")
+    assert store.get("a") is a2 and store.get("b") is b1 and store.get("c") is None
+    assert store.info()["a"] == a2.info() and a2.info()["items"] == 2
+
+    body = json.loads(a1.body)
+    assert body["version"] == 1 and body["bar"] == BAR * 1000
+    assert body["items"] == [{"symbol": "BTC"}]
+    assert body["config"] == "a" and body["lagging"] == ["ETH"]
+
+
+def test_snapshot_is_immutable():
+    items = [{"symbol": "BTC", "signal": "BUY"}]
+    snap = SnapshotStore().publish("a", "4h", BAR * 1000, items)
+    items[0]["signal"] = "SELL"  # 发布后改源数据不影响快照
+    assert snap.items[0]["signal"] == "BUY"
+    with pytest.raises(AttributeError):
+        snap.version = 99
+    with pytest.raises(TypeError):
+        snap.items[0]["signal"] = "SELL"
+    assert json.loads(snap.body)["items"][0]["signal"] == "BUY"
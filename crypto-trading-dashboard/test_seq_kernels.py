@@ -0,0 +1,113 @@
+# test_seq_kernels.py — 递推内核 *_resume 从保存的状态接着算，须与 *_run 整段计算逐位一致（含 NaN K线）
+#   pytest -q test_seq_kernels.py
+import numpy as np
+import pytest
+
+import seq_kernels as seq
+import ta_kernels as K
+
+N = 800
+CUTS = [1, 2, 50, 300, 799]
+
+
+def _ohlc(n=N, seed=0, nan_frac=0.0):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+    open_ = np.r_[close[0], close[:-1]]
+    high = np.maximum(open_, close) * (1 + rng.uniform(0, 0.01, n))
+    low = np.minimum(open_, close) * (1 - rng.uniform(0, 0.01, n))
+    if nan_frac:
+        holes = rng.random(n) < nan_frac
+        holes[:3] = False
+        for a in (open_, high, low, close):
+            a[holes] = np.nan
+    return open_, high, low, close
+
+
+def _assert_same(full, parts):
+    for f, p in zip(full, zip(*parts)):
+        np.testing.assert_array_equal(np.concatenate(p), f)
+
+
+def _split(arrays, cuts):
+    bounds = [0, *cuts, len(arrays[0])]
+    return [[a[s:e] for a in arrays] for s, e in zip(bounds, bounds[1:])]
+
+
+@pytest.mark.parametrize("nan_frac", [0.0, 0.03])
+@pytest.mark.parametrize("cut", CUTS)
+def test_psar_resume_matches_run(cut, nan_frac):
+    _, high, low, close = _ohlc(seed=1, nan_frac=nan_frac)
+    full, _ = seq.psar_run(high, low, close, 0.02, 0.2)
+    head, state = seq.psar_run(high[:cut], low[:cut], close[:cut], 0.02, 0.2)
+    tail, _ = seq.psar_resume(state, high[cut:], low[cut:])
+    _assert_same(full, [head, tail])
+
+
+@pytest.mark.parametrize("nan_frac", [0.0, 0.03])
+@pytest.mark.parametrize("cut", CUTS)
+def test_supertrend_resume_matches_run(cut, nan_frac):
+    _, high, low, close = _ohlc(seed=2, nan_frac=nan_frac)
+    atr = K.atr(high, low, close, 10)
+    full, _ = seq.supertrend_run(high, low, close, atr, 3.0)
+    head, state = seq.supertrend_run(high[:cut], low[:cut], close[:cut], atr[:cut], 3.0)
+    tail, _ = seq.supertrend_resume(state, high[cut:], low[cut:], close[cut:], atr[cut:])
+    _assert_same(full, [head, tail])
+
+
+@pytest.mark.parametrize("nan_frac", [0.0, 0.03])
+@pytest.mark.parametrize("cut", CUTS)
+def test_ha_resume_matches_run(cut, nan_frac):
+    arrays = _ohlc(seed=3, nan_frac=nan_frac)
+    full, _ = seq.ha_run(*arrays)
+    head, state = seq.ha_run(*(a[:cut] for a in arrays))
+    tail, _ = seq.ha_resume(state, *(a[cut:] for a in arrays))
+    _assert_same(full, [head, tail])
+
+
+def test_chained_resume_bar_by_bar():
+    # 逐根 / 小段接着算（实时路径的用法），状态在各段之间传递
+    open_, high, low, close = _ohlc(seed=4, nan_frac=0.02)
+    atr = K.atr(high, low, close, 10)
+    cuts = [5, 6, 7, 100, 101, 400, 650]
+    parts = _split([open_, high, low, close, atr], cuts)
+
+    full, _ = seq.psar_run(high, low, close)
+    out, state = [], None
+    for o, h, l, c, a in parts:
+        res, state = seq.psar_run(h, l, c) if state is None else seq.psar_resume(state, h, l)
+        out.append(res)
+    _assert_same(full, out)
+
+    full, _ = seq.supertrend_run(high, low, close, atr, 3.0)
+    out, state = [], None
+    for o, h, l, c, a in parts:
+        res, state = seq.supertrend_run(h, l, c, a, 3.0) if state is None else seq.supertrend_resume(state, h, l, c, a)
+        out.append(res)
+    _assert_same(full, out)
+
+    full, _ = seq.ha_run(open_, high, low, close)
+    out, state = [], None
+    for o, h, l, c, a in parts:
+        res, state = seq.ha_run(o, h, l, c) if state is None else seq.ha_resume(state, o, h, l, c)
+        out.append(res)
+    _assert_same(full, out)
+
+
+def test_resume_does_not_mutate_state():
+    _, high, low, close = _ohlc(seed=5)
+    _, state = seq.psar_run(high[:300], low[:300], close[:300])
+    saved = dict(state)
+    a, _ = seq.psar_resume(state, high[300:], low[300:])
+    b, _ = seq.psar_resume(state, high[300:], low[300:])
+    assert state == saved
+    _assert_same(a, [b])
+
+
+def test_resume_without_state_raises():
+    with pytest.raises(ValueError):
+        seq.psar_resume(None, [1.0], [0.5])
+    with pytest.raises(ValueError):
+        seq.supertrend_resume(None, [1.0], [0.5], [0.7], [0.1])
+    with pytest.raises(ValueError):
+        seq.ha_resume(None, [1.0], [1.0], [0.5], [0.7])
@@ -0,0 +1,169 @@
+# test_strategy_budget.py — StrategyBudget：超时放弃、busy、被放弃的调用跑完后的结果、同一 frame 才 reuse、p50/p99
+# 慢策略用 Event 卡住，何时“跑完”由测试控制
+#   pytest -q test_strategy_budget.py
+import threading
+import time
+
+import pytest
+
+import strategy_budget
+from strategy_budget import StrategyBudget
+
+BUDGET_MS = 200  # 快的调用远小于它；慢的调用卡在 Event 上，必然超时
+
+
+class Slow:
+    """调用后一直等到 release()，返回 value；calls 记录实际被调用的次数"""
+
+    def __init__(self, value):
+        self.value = value
+        self.calls = 0
+        self._go = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        assert self._go.wait(10)
+        return self.value
+
+    def release(self):
+        self._go.set()
+
+
+def _drain(budget, name, timeout=5.0):
+    """等被放弃的调用跑完（running 归零）"""
+    end = time.monotonic() + timeout
+    while budget.stats()[name]["running"]:
+        assert time.monotonic() < end, "abandoned call did not finish"
+        time.sleep(0.005)
+
+
+@pytest.fixture
+def budget_factory():
+    made = []
+
+    def make(**kw):
+        b = StrategyBudget(budget_ms=BUDGET_MS, **kw)
+        made.append(b)
+        return b
+
+    yield make
+    for b in made:
+        b._pool.shutdown(wait=False, cancel_futures=True)
+
+
+def test_skip_timeout_then_busy(budget_factory):
+    budget = budget_factory(on_timeout="skip")
+    assert budget.run("s", "BTC", lambda: "fresh", frame=1) == ("fresh", "ok")
+    slow = Slow("late")
+    assert budget.run("s", "BTC", slow, frame=1) == (None, "timeout")
+    # 被放弃的调用还在跑：不再派新调用，skip 模式不出结果（即使同一 frame 有成功的结果）
+    other = Slow("never")
+    assert budget.run("s", "BTC", other, frame=1) == (None, "busy")
+    assert other.calls == 0
+    st = budget.stats()["s"]
+    assert (st["ok"], st["timeout"], st["busy"], st["reused"], st["running"]) == (1, 1, 1, 0, 1)
+    slow.release()
+    _drain(budget, "s")
+    assert budget.run("s", "BTC", lambda: "next", frame=2) == ("next", "ok")
+    st = budget.stats()["s"]
+    assert (st["ok"], st["running"], st["samples"]) == (2, 0, 3)  # 被放弃的调用跑完后耗时照常记录
+
+
+def test_busy_is_per_strategy(budget_factory):
+    budget = budget_factory()
+    slow = Slow(1)
+    assert budget.run("a", "BTC", slow, frame=1) == (None, "timeout")
+    assert budget.run("b", "BTC", lambda: 2, frame=1) == (2, "ok")
+    assert budget.run("a", "ETH", lambda: 3, frame=1) == (None, "busy")
+    slow.release()
+    _drain(budget, "a")
+
+
+def test_reuse_same_frame_only(budget_factory):
+    budget = budget_factory(on_timeout="reuse")
+    assert budget.run("s", "BTC", lambda: "bar1", frame=1) == ("bar1", "ok")
+    slow = Slow("late")
+    # 同一根K线：沿用上一次成功的结果
+    assert budget.run("s", "BTC", slow, frame=1) == ("bar1", "reused")
+    # busy 时同样只复用同一 frame / 同一 key 的结果
+    assert budget.run("s", "BTC", Slow("x"), frame=1) == ("bar1", "reused")
+    assert budget.run("s", "BTC", Slow("x"), frame=2) == (None, "busy")
+    assert budget.run("s", "ETH", Slow("x"), frame=1) == (None, "busy")
+    st = budget.stats()["s"]
+    assert (st["ok"], st["timeout"], st["busy"], st["reused"]) == (1, 1, 3, 2)
+    slow.release()
+    _drain(budget, "s")
+
+
+def test_abandoned_completion_becomes_last_result(budget_factory):
+    budget = budget_factory(on_timeout="reuse")
+    slow = Slow("late")
+    assert budget.run("s", "BTC", slow, frame=7) == (None, "timeout")  # 还没有任何成功的结果
+    slow.release()
+    _drain(budget, "s")
+    # 跑完的结果记为该 frame 的上一次结果：同一根K线再超时时可复用，别的K线不行
+    again = Slow("y")
+    assert budget.run("s", "BTC", again, frame=7) == ("late", "reused")
+    again.release()
+    _drain(budget, "s")
+    assert budget._last[("s", "BTC")] == (7, "y")
+    slow2 = Slow("z")
+    assert budget.run("s", "BTC", slow2, frame=8) == (None, "timeout")
+    slow2.release()
+    _drain(budget, "s")
+
+
+def test_abandoned_error_keeps_previous_result(budget_factory):
+    budget = budget_factory(on_timeout="reuse")
+    assert budget.run("s", "BTC", lambda: "good", frame=1) == ("good", "ok")
+    go = threading.Event()
+
+    def boom():
+        go.wait(10)
+        raise RuntimeError("late failure")
+
+    assert budget.run("s", "BTC", boom, frame=1) == ("good", "reused")
+    go.set()
+    _drain(budget, "s")
+    assert budget._last[("s", "BTC")] == (1, "good")
+
+
+def test_errors_are_counted_and_raised(budget_factory):
+    budget = budget_factory()
+
+    def bad():
+        raise ValueError("nope")
+
+    with pytest.raises(ValueError):
+        budget.run("s", "BTC", bad)
+    inline = StrategyBudget(budget_ms=0)
+    with pytest.raises(ValueError):
+        inline.run("s", "BTC", bad)
+    assert budget.stats()["s"]["error"] == 1 and inline.stats()["s"]["error"] == 1
+
+
+def test_overrides_and_invalid_mode():
+    b = StrategyBudget(budget_ms=100, overrides={"slow": 0})
+    assert b.budget("slow") == 0 and b.budget("other") == 100
+    # 预算为 0 的策略在调用线程里执行
+    assert b.run("slow", "BTC", threading.current_thread) == (threading.current_thread(), "ok")
+    with pytest.raises(ValueError):
+        StrategyBudget(on_timeout="retry")
+
+
+def test_stats_percentiles(monkeypatch):
+    # 每次调用耗时 1, 2, …, 100 ms
+    ticks = iter(t / 1000.0 for d in range(1, 101) for t in (0.0, d))
+    monkeypatch.setattr(strategy_budget.time, "perf_counter", lambda: next(ticks))
+    b = StrategyBudget(budget_ms=0)
+    for _ in range(100):
+        b.run("s", "BTC", lambda: None)
+    st = b.stats()["s"]
+    assert (st["samples"], st["ok"], st["p50_ms"], st["p99_ms"], st["max_ms"]) == (100, 100, 50.5, 99.01, 100.0)
+
+    ticks = iter(t / 1000.0 for d in range(1, 101) for t in (0.0, d))
+    w = StrategyBudget(budget_ms=0, window=50)
+    for _ in range(100):
+        w.run("s", "BTC", lambda: None)
+    st = w.stats()["s"]
+    assert (st["samples"], st["ok"], st["p50_ms"], st["max_ms"]) == (50, 100, 75.5, 100.0)
@@ -0,0 +1,117 @@
+# test_strategy_config.py — 请求级 StrategyConfig：STRICT / RELAXED 在多个线程里并发求值（共用一份指标缓存），
+# 结果与单线程逐个求值一致，且两种配置的结果按各自的 key 分别缓存、互不覆盖
+#   pytest -q test_strategy_config.py
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+import golden
+import strategies as S
+from indicator_cache import IndicatorCache, indicator_scope
+
+DS = golden.synthetic("4h", 1500, 2)
+CONFIGS = (S.STRICT, S.RELAXED)
+NAMES = list(S.STRATEGY_REGISTRY)
+
+
+def _prefixes(n=12):
+    """两种配置下结果不同的K线（取前 n 个），各截成一个前缀帧"""
+    diff = set()
+    for name, fn in S.SERIES_REGISTRY.items():
+        strict, relaxed = (fn(DS.symbol, DS.df, DS.tf, cfg=cfg)["signal"].to_numpy() for cfg in CONFIGS)
+        diff.update(np.flatnonzero(strict != relaxed).tolist())
+    return [DS.df.iloc[:i + 1] for i in sorted(diff)[:n]]
+
+
+PREFIXES = _prefixes()
+
+
+def _serial():
+    """单线程、不走缓存的结果：{(前缀序号, 配置名, 策略名): 结果}"""
+    return {(j, cfg.name, n): S.STRATEGY_REGISTRY[n](DS.symbol, df, DS.tf, cfg=cfg)
+            for j, df in enumerate(PREFIXES) for cfg in CONFIGS for n in NAMES}
+
+
+def test_configs_differ_on_chosen_bars():
+    expected = _serial()
+    assert len(PREFIXES) >= 4
+    assert any(expected[(j, "strict", n)] != expected[(j, "relaxed", n)] for j in range(len(PREFIXES)) for n in NAMES)
+
+
+def test_concurrent_strict_and_relaxed_match_serial():
+    expected = _serial()
+    cache = IndicatorCache()
+    start = threading.Barrier(8)
+    tasks = [(j, cfg, n, mode) for j in range(len(PREFIXES)) for cfg in CONFIGS for n in NAMES
+             for mode in ("cfg", "scope", "variants")] * 3
+    random.Random(0).shuffle(tasks)
+
+    def run(task):
+        j, cfg, n, mode = task
+        df = PREFIXES[j]
+        with indicator_scope(cache, DS.symbol, DS.tf):
+            if mode == "cfg":
+                res = S.evaluate(n, DS.symbol, df, DS.tf, cfg)
+            elif mode == "scope":
+                # 不传 cfg：取当前线程的 config_scope
+                with S.config_scope(cfg):
+                    res = S.evaluate(n, DS.symbol, df, DS.tf)
+            else:
+                res = S.evaluate_variants(DS.symbol, df, DS.tf, [n], configs=CONFIGS)[cfg.name][n]
+        return task, res
+
+    def worker(chunk):
+        start.wait()
+        return [run(t) for t in chunk]
+
+    chunks = [tasks[i::8] for i in range(8)]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = [r for rs in pool.map(worker, chunks) for r in rs]
+
+    assert len(results) == len(tasks)
+    for (j, cfg, n, mode), res in results:
+        assert res == expected[(j, cfg.name, n)], (j, cfg.name, n, mode)
+
+    # 每个前缀 × 策略，两种配置的结果各有一条缓存、key 不同
+    keys = cache.keys()
+    for df in PREFIXES:
+        for n in NAMES:
+            hits = {k[3][3] for k in keys if k[3][:3] == (n, "result", DS.tf) and k[2][0] == len(df)}
+            assert hits == {S.STRICT.key, S.RELAXED.key}
+    assert S.STRICT.key != S.RELAXED.key
+
+
+def test_cached_results_are_copies():
+    cache = IndicatorCache()
+    df = PREFIXES[0]
+    with indicator_scope(cache, DS.symbol, DS.tf):
+        first = {cfg.name: {n: S.evaluate(n, DS.symbol, df, DS.tf, cfg) for n in NAMES} for cfg in CONFIGS}
+        for results in first.values():
+            for res in results.values():
+                if res:
+                    res["entry"] = -1.0  # 调用方改返回值不影响缓存
+        again = S.evaluate_variants(DS.symbol, df, DS.tf, NAMES, configs=CONFIGS)
+    assert again == {cfg.name: {n: S.STRATEGY_REGISTRY[n](DS.symbol, df, DS.tf, cfg=cfg) for n in NAMES}
+                     for cfg in CONFIGS}
+
+
+def test_config_is_immutable_and_scoped():
+    with pytest.raises(AttributeError):
+        S.STRICT.relax = True
+    seen = {}
+
+    def check(cfg):
+        with S.config_scope(cfg):
+            threading.Event().wait(0.01)
+            seen[cfg.name] = S.current_config()
+
+    threads = [threading.Thread(target=check, args=(cfg,)) for cfg in CONFIGS]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert seen == {"strict": S.STRICT, "relaxed": S.RELAXED}
+    assert S.current_config() is S.STRICT
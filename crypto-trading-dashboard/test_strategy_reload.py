@@ -0,0 +1,77 @@
+# test_strategy_reload.py — strategy_reload.reload_strategies：改一个策略的默认参数，
+# 只有它算改动（并移出批量路径），只失效它用到的指标 spec，调用方模块改指向新模块
+#   pytest -q test_strategy_reload.py
+import importlib.util
+import os
+import shutil
+import sys
+
+import pytest
+
+import golden
+import preview
+import regime
+import strategy_reload
+from indicator_cache import IndicatorCache, indicator_scope
+from strategy_budget import StrategyBudget
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+@pytest.fixture
+def app_copy(tmp_path, monkeypatch):
+    """策略模块拷到 tmp_path，热加载改从拷贝读取（find_spec 取已加载模块的 __spec__）；结束后恢复原模块与各调用方的引用"""
+    olds = {name: sys.modules[name] for name in strategy_reload.MODULES}
+    for name, mod in olds.items():
+        path = shutil.copy(os.path.join(APP_DIR, f"{name}.py"), tmp_path)
+        monkeypatch.setattr(mod, "__spec__", importlib.util.spec_from_file_location(name, path))
+    yield tmp_path
+    news = {name: sys.modules[name] for name in strategy_reload.MODULES}
+    sys.modules.update(olds)
+    strategy_reload._rebind(news, olds)
+    strategy_reload._BATCH_OFF.clear()
+
+
+def _edit(path, old, new):
+    src = path.read_text(encoding="utf-8")
+    assert src.count(old) == 1
+    path.write_text(src.replace(old, new), encoding="utf-8")
+
+
+def test_reload_changes_only_edited_strategy(app_copy):
+    import strategies_top15 as T
+
+    ds = golden.synthetic("4h", 400, seed=1)
+    cache = IndicatorCache()
+    with indicator_scope(cache, ds.symbol, ds.tf):
+        for fn in T.REGISTRY.values():
+            fn(ds.df)
+    cci_entries = sum(key[3][0] == "ta.cci" for key in cache.keys())
+    assert cci_entries and cci_entries < len(cache.keys())
+    budget = StrategyBudget(budget_ms=0, on_timeout="reuse")
+    budget.run("cci_reversion", ds.symbol, lambda: 1)
+    budget.run("ema_adx", ds.symbol, lambda: 2)
+
+    _edit(app_copy / "strategies_top15.py",
+          "def strat_cci(df, length=20, lo=-100,", "def strat_cci(df, length=20, lo=-120,")
+    before = len(cache.keys())
+    res = strategy_reload.reload_strategies(cache=cache, budget=budget)
+
+    assert res["changed"] == ["cci_reversion"]
+    assert res["batch_off"] == ["cci_reversion"]
+    assert res["kinds"] == ["ta.cci"]
+    assert res["invalidated"] == cci_entries
+    assert len(cache.keys()) == before - cci_entries
+
+    new = sys.modules["strategies_top15"]
+    assert new is not T
+    assert os.path.dirname(new.__file__) == str(app_copy)
+    assert regime.T is new and preview.T is new
+    assert new.strat_cci.__defaults__[1] == -120
+    assert "cci_reversion" not in sys.modules["strategies_batch"].BATCH_REGISTRY
+    assert set(budget._last) == {("ema_adx", ds.symbol)}
+
+
+def test_reload_without_edits_changes_nothing(app_copy):
+    res = strategy_reload.reload_strategies(cache=IndicatorCache())
+    assert res["changed"] == [] and res["batch_off"] == [] and res["kinds"] == []
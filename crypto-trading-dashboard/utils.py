@@ -1,6 +1,8 @@
 import math
 import pandas as pd
 
+from ohlcv import canonical_ohlcv
+
 def fmt_price(v):
     if v is None or (isinstance(v,(int,float)) and (not math.isfinite(v) or v==0)):
         return "—"
@@ -12,7 +14,6 @@ def fmt_price(v):
 def to_ohlcv_df(raw):
     """
     raw: [ [ts, open, high, low, close, vol], ... ]
+    返回 canonical frame（int64 毫秒索引 + float64 只读列，见 ohlcv.py）；K线时间用 ohlcv.bar_time 取
     """
-    df = pd.DataFrame(raw, columns=["ts","open","high","low","close","volume"])
-    df["ts"] = pd.to_datetime(df["ts"], unit="ms")
-    return df
+    return canonical_ohlcv(raw)